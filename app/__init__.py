@@ -3,6 +3,9 @@
 from flask import Flask
 from .config import load_config
 from . import extensions
+from . import db
+from . import metrics
+from . import tracing
 from .middleware.error_handlers import register_error_handlers
 
 # Import blueprints
@@ -17,6 +20,12 @@ def create_app():
 
     # Initialize extensions (Celery binding, Supabase, Firebase, etc.)
     extensions.init_app(app)
+    # Tracing OpenTelemetry (opsional, TRACING_ENABLED) sebelum hook lain
+    tracing.init_app(app)
+    # Session DB per request/task ditutup otomatis di teardown app context
+    db.init_app(app)
+    # /metrics (Prometheus) + timing request
+    metrics.init_app(app)
 
     # Register blueprints DENGAN url_prefix yang jelas
     app.register_blueprint(face_bp, url_prefix="/api/face")
@@ -29,11 +38,17 @@ def create_app():
 
     @app.get("/health")
     def health():
-        from .extensions import get_supabase
+        from .db import pool_stats, session_stats
+        from .db.query_stats import query_totals
+        from .extensions import firebase_stats, get_supabase
         return {
             "ok": True,
             "engine": app.config.get("MODEL_NAME"),
             "supabase": bool(get_supabase()),
+            "firebase": firebase_stats(),
+            "db_pool": pool_stats(),
+            "db_sessions": session_stats(),
+            "db_queries": query_totals(),
             "bucket": app.config.get("SUPABASE_BUCKET"),
         }
 
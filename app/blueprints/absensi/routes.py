@@ -12,9 +12,10 @@ from ...utils.geo import haversine_m
 from ...utils.timez import now_local, today_local_date
 from ...services.face_service import verify_user
 from ...services.notification_service import send_notification
-from ...db import get_session
+from ...services.location_index import get_cached_location
+from ...services.schedule_cache import resolve_schedule
+from ...db import get_db, mark_written
 from ...db.models import (
-    Location,
     Absensi,
     AbsensiStatus,
     AgendaKerja,
@@ -24,8 +25,6 @@ from ...db.models import (
     Role,
     User,
     Catatan,
-    ShiftKerja,
-    PolaKerja,
     Istirahat,
 )
 
@@ -39,7 +38,7 @@ absensi_bp = Blueprint("absensi", __name__)
 
 # ---------- helpers ----------
 
-def _get_radius(loc: Location) -> int:
+def _get_radius(loc) -> int:
     r = loc.radius if loc and loc.radius is not None else current_app.config.get("DEFAULT_GEOFENCE_RADIUS", 100)
     try:
         return int(r)
@@ -47,6 +46,24 @@ def _get_radius(loc: Location) -> int:
         return 100
 
 
+def _check_geofence(loc_id: str, lat: float, lng: float):
+    """
+    Validasi lokasi & geofence dari cache lokasi (tanpa session DB bila cache segar).
+    Return (jarak_m atau None, response error atau None).
+    """
+    if not loc_id:
+        return None, None
+    loc = get_cached_location(loc_id)
+    if loc is None or loc.deleted:
+        return None, error("Lokasi tidak ditemukan", 404)
+    # FIX: urutan haversine_m adalah (lat1, lon1, lat2, lon2)
+    dist = haversine_m(lat, lng, loc.latitude, loc.longitude)
+    radius = _get_radius(loc)
+    if dist > radius:
+        return dist, error(f"Di luar geofence (jarak {int(dist)} m > radius {int(radius)} m)", 400)
+    return dist, None
+
+
 def _extract_agenda_kerja_ids(req) -> list[str]:
     """
     Ambil banyak field 'agenda_kerja_id' (multipart), bersihkan & unikkan.
@@ -202,37 +219,29 @@ def checkin():
     if f is None:
         return error("field 'image' wajib ada", 400)
 
-    with get_session() as s:
-        # Validasi lokasi & geofence (ringan)
-        loc = s.get(Location, loc_id) if loc_id else None
-        if loc_id and loc is None:
-            return error("Lokasi tidak ditemukan", 404)
-
-        dist = None
-        if loc:
-            # FIX: urutan haversine_m adalah (lat1, lon1, lat2, lon2)
-            dist = haversine_m(lat, lng, float(loc.latitude), float(loc.longitude))
-            radius = _get_radius(loc)
-            if dist > radius:
-                return error(f"Di luar geofence (jarak {int(dist)} m > radius {int(radius)} m)", 400)
-
-        # Verifikasi wajah (ringan)
-        try:
-            v = verify_user(user_id, f, metric=metric, threshold=threshold)
-            if not v.get("match", False):
-                return error("Verifikasi wajah gagal. Tidak dapat check-in.", 400)
-        except Exception as e:
-            return error(f"Gagal melakukan verifikasi wajah: {str(e)}", 500)
-
-        # Precheck duplikat agar balasan cepat bila sudah check-in
-        today = today_local_date()
-        already = (
-            s.query(Absensi)
-            .filter(Absensi.id_user == user_id, Absensi.tanggal == today)
-            .one_or_none()
-        )
-        if already:
-            return error("Check-in duplikat untuk tanggal ini (sudah check-in).", 409)
+    # Validasi lokasi & geofence (in-memory, sebelum membuka session)
+    dist, err = _check_geofence(loc_id, lat, lng)
+    if err is not None:
+        return err
+
+    s = get_db()
+    # Verifikasi wajah (ringan)
+    try:
+        v = verify_user(user_id, f, metric=metric, threshold=threshold)
+        if not v.get("match", False):
+            return error("Verifikasi wajah gagal. Tidak dapat check-in.", 400)
+    except Exception as e:
+        return error(f"Gagal melakukan verifikasi wajah: {str(e)}", 500)
+
+    # Precheck duplikat agar balasan cepat bila sudah check-in
+    today = today_local_date()
+    already = (
+        s.query(Absensi)
+        .filter(Absensi.id_user == user_id, Absensi.tanggal == today)
+        .one_or_none()
+    )
+    if already:
+        return error("Check-in duplikat untuk tanggal ini (sudah check-in).", 409)
 
     # Susun payload untuk background task
     payload = {
@@ -289,37 +298,30 @@ def checkout():
     if f is None:
         return error("field 'image' wajib ada", 400)
 
-    with get_session() as s:
-        today = today_local_date()
-        rec = (
-            s.query(Absensi)
-            .filter(Absensi.id_user == user_id, Absensi.tanggal == today)
-            .one_or_none()
-        )
-
-        if rec is None:
-            return error("Belum ada check-in untuk hari ini.", 404)
-
-        loc = s.get(Location, loc_id) if loc_id else None
-        if loc_id and loc is None:
-            return error("Lokasi tidak ditemukan", 404)
+    # Validasi lokasi & geofence (in-memory, sebelum membuka session)
+    dist, err = _check_geofence(loc_id, lat, lng)
+    if err is not None:
+        return err
+
+    s = get_db()
+    today = today_local_date()
+    rec = (
+        s.query(Absensi)
+        .filter(Absensi.id_user == user_id, Absensi.tanggal == today)
+        .one_or_none()
+    )
 
-        dist = None
-        if loc:
-            # FIX: urutan haversine_m adalah (lat1, lon1, lat2, lon2)
-            dist = haversine_m(lat, lng, float(loc.latitude), float(loc.longitude))
-            radius = _get_radius(loc)
-            if dist > radius:
-                return error(f"Di luar geofence (jarak {int(dist)} m > radius {int(radius)} m)", 400)
+    if rec is None:
+        return error("Belum ada check-in untuk hari ini.", 404)
 
-        try:
-            v = verify_user(user_id, f, metric=metric, threshold=threshold)
-            if not v.get("match", False):
-                return error("Verifikasi wajah gagal. Tidak dapat check-out.", 400)
-        except Exception as e:
-            return error(f"Gagal melakukan verifikasi wajah: {str(e)}", 500)
+    try:
+        v = verify_user(user_id, f, metric=metric, threshold=threshold)
+        if not v.get("match", False):
+            return error("Verifikasi wajah gagal. Tidak dapat check-out.", 400)
+    except Exception as e:
+        return error(f"Gagal melakukan verifikasi wajah: {str(e)}", 500)
 
-        absensi_id = rec.id_absensi  # diperlukan worker untuk update baris yang sama
+    absensi_id = rec.id_absensi  # diperlukan worker untuk update baris yang sama
 
     # Payload checkout untuk worker
     payload = {
@@ -357,36 +359,36 @@ def absensi_status():
     if not user_id:
         return error("user_id wajib ada", 400)
 
-    with get_session() as s:
-        today = today_local_date()
-        rec = (
-            s.query(Absensi)
-            .filter(Absensi.id_user == user_id, Absensi.tanggal == today)
-            .one_or_none()
-        )
-
-        if rec is None:
-            return ok(mode="checkin", today=str(today), jam_masuk=None, jam_pulang=None, linked_agenda_ids=[])
+    s = get_db(readonly=True, user_id=user_id)
+    today = today_local_date()
+    rec = (
+        s.query(Absensi)
+        .filter(Absensi.id_user == user_id, Absensi.tanggal == today)
+        .one_or_none()
+    )
 
-        linked_ids = _agendas_payload_for_absensi(s, rec.id_absensi, id_only=True)
+    if rec is None:
+        return ok(mode="checkin", today=str(today), jam_masuk=None, jam_pulang=None, linked_agenda_ids=[])
 
-        if rec.jam_pulang is None:
-            return ok(
-                mode="checkout",
-                today=str(today),
-                jam_masuk=rec.jam_masuk.isoformat() if rec.jam_masuk else None,
-                jam_pulang=None,
-                linked_agenda_ids=linked_ids,
-            )
+    linked_ids = _agendas_payload_for_absensi(s, rec.id_absensi, id_only=True)
 
+    if rec.jam_pulang is None:
         return ok(
-            mode="done",
+            mode="checkout",
             today=str(today),
             jam_masuk=rec.jam_masuk.isoformat() if rec.jam_masuk else None,
-            jam_pulang=rec.jam_pulang.isoformat() if rec.jam_pulang else None,
+            jam_pulang=None,
             linked_agenda_ids=linked_ids,
         )
 
+    return ok(
+        mode="done",
+        today=str(today),
+        jam_masuk=rec.jam_masuk.isoformat() if rec.jam_masuk else None,
+        jam_pulang=rec.jam_pulang.isoformat() if rec.jam_pulang else None,
+        linked_agenda_ids=linked_ids,
+    )
+
 
 # --- FITUR ISTIRAHAT ---
 
@@ -401,76 +403,66 @@ def start_istirahat():
     if lat is None or lng is None:
         return error("Koordinat latitude dan longitude wajib ada", 400)
 
-    with get_session() as s:
-        try:
-            today = today_local_date()
-            absensi = (
-                s.query(Absensi)
-                .filter(Absensi.id_user == user_id, Absensi.tanggal == today)
-                .one_or_none()
-            )
-
-            if absensi is None or absensi.jam_masuk is None:
-                return error("Anda harus check-in terlebih dahulu sebelum memulai istirahat", 400)
-            if absensi.jam_pulang is not None:
-                return error("Tidak dapat memulai istirahat setelah check-out", 400)
-
-            existing_break = (
-                s.query(Istirahat)
-                .filter(Istirahat.id_absensi == absensi.id_absensi, Istirahat.end_istirahat.is_(None))
-                .first()
-            )
-            if existing_break:
-                return error("Anda sudah dalam sesi istirahat", 409)
-
-            now_local_dt = now_local()
-            now_dt = now_local_dt.replace(tzinfo=None)
-
-            jadwal_kerja = (
-                s.query(ShiftKerja)
-                .join(PolaKerja)
-                .filter(
-                    ShiftKerja.id_user == user_id,
-                    ShiftKerja.tanggal_mulai <= today,
-                    ShiftKerja.tanggal_selesai >= today,
-                )
-                .first()
-            )
-
-            if jadwal_kerja and jadwal_kerja.polaKerja:
-                pola = jadwal_kerja.polaKerja
-                if pola.jam_istirahat_mulai and pola.jam_istirahat_selesai:
-                    jam_mulai_seharusnya = pola.jam_istirahat_mulai.time()
-                    jam_selesai_seharusnya = pola.jam_istirahat_selesai.time()
-                    jam_sekarang = now_local_dt.time()
-
-                    if not (jam_mulai_seharusnya <= jam_sekarang <= jam_selesai_seharusnya):
-                        return error(
-                            f"Waktu istirahat hanya diizinkan antara {jam_mulai_seharusnya.strftime('%H:%M')} dan {jam_selesai_seharusnya.strftime('%H:%M')}",
-                            403,
-                        )
-
-            new_break = Istirahat(
-                id_user=user_id,
-                id_absensi=absensi.id_absensi,
-                tanggal_istirahat=today,
-                start_istirahat=now_dt,
-                start_istirahat_latitude=lat,
-                start_istirahat_longitude=lng,
-            )
-            s.add(new_break)
-            s.commit()
-            s.refresh(new_break)
-
-            return ok(
-                message="Sesi istirahat dimulai",
-                id_istirahat=new_break.id_istirahat,
-                start_istirahat=new_break.start_istirahat.isoformat(),
-            )
-
-        except Exception as e:
-            s.rollback()
-            return error(f"Terjadi kesalahan: {str(e)}", 500)
+    s = get_db()
+    try:
+        today = today_local_date()
+        absensi = (
+            s.query(Absensi)
+            .filter(Absensi.id_user == user_id, Absensi.tanggal == today)
+            .one_or_none()
+        )
+
+        if absensi is None or absensi.jam_masuk is None:
+            return error("Anda harus check-in terlebih dahulu sebelum memulai istirahat", 400)
+        if absensi.jam_pulang is not None:
+            return error("Tidak dapat memulai istirahat setelah check-out", 400)
+
+        existing_break = (
+            s.query(Istirahat)
+            .filter(Istirahat.id_absensi == absensi.id_absensi, Istirahat.end_istirahat.is_(None))
+            .first()
+        )
+        if existing_break:
+            return error("Anda sudah dalam sesi istirahat", 409)
+
+        now_local_dt = now_local()
+        now_dt = now_local_dt.replace(tzinfo=None)
+
+        pola = resolve_schedule(s, user_id, today)
+        if pola:
+            if pola.jam_istirahat_mulai and pola.jam_istirahat_selesai:
+                jam_mulai_seharusnya = pola.jam_istirahat_mulai.time()
+                jam_selesai_seharusnya = pola.jam_istirahat_selesai.time()
+                jam_sekarang = now_local_dt.time()
+
+                if not (jam_mulai_seharusnya <= jam_sekarang <= jam_selesai_seharusnya):
+                    return error(
+                        f"Waktu istirahat hanya diizinkan antara {jam_mulai_seharusnya.strftime('%H:%M')} dan {jam_selesai_seharusnya.strftime('%H:%M')}",
+                        403,
+                    )
+
+        new_break = Istirahat(
+            id_user=user_id,
+            id_absensi=absensi.id_absensi,
+            tanggal_istirahat=today,
+            start_istirahat=now_dt,
+            start_istirahat_latitude=lat,
+            start_istirahat_longitude=lng,
+        )
+        s.add(new_break)
+        mark_written(s, user_id)
+        s.commit()
+        s.refresh(new_break)
+
+        return ok(
+            message="Sesi istirahat dimulai",
+            id_istirahat=new_break.id_istirahat,
+            start_istirahat=new_break.start_istirahat.isoformat(),
+        )
+
+    except Exception as e:
+        s.rollback()
+        return error(f"Terjadi kesalahan: {str(e)}", 500)
 
 
 @absensi_bp.post("/istirahat/end")
@@ -484,43 +476,44 @@ def end_istirahat():
     if lat is None or lng is None:
         return error("Koordinat latitude dan longitude wajib ada", 400)
 
-    with get_session() as s:
-        try:
-            today = today_local_date()
-            absensi = (
-                s.query(Absensi)
-                .filter(Absensi.id_user == user_id, Absensi.tanggal == today)
-                .one_or_none()
-            )
+    s = get_db()
+    try:
+        today = today_local_date()
+        absensi = (
+            s.query(Absensi)
+            .filter(Absensi.id_user == user_id, Absensi.tanggal == today)
+            .one_or_none()
+        )
 
-            if absensi is None:
-                return error("Absensi hari ini tidak ditemukan", 404)
+        if absensi is None:
+            return error("Absensi hari ini tidak ditemukan", 404)
 
-            current_break = (
-                s.query(Istirahat)
-                .filter(Istirahat.id_absensi == absensi.id_absensi, Istirahat.end_istirahat.is_(None))
-                .one_or_none()
-            )
+        current_break = (
+            s.query(Istirahat)
+            .filter(Istirahat.id_absensi == absensi.id_absensi, Istirahat.end_istirahat.is_(None))
+            .one_or_none()
+        )
 
-            if current_break is None:
-                return error("Tidak ada sesi istirahat yang sedang berjalan", 404)
+        if current_break is None:
+            return error("Tidak ada sesi istirahat yang sedang berjalan", 404)
 
-            now_dt = now_local().replace(tzinfo=None)
-            current_break.end_istirahat = now_dt
-            current_break.end_istirahat_latitude = lat
-            current_break.end_istirahat_longitude = lng
+        now_dt = now_local().replace(tzinfo=None)
+        current_break.end_istirahat = now_dt
+        current_break.end_istirahat_latitude = lat
+        current_break.end_istirahat_longitude = lng
 
-            s.commit()
+        mark_written(s, user_id)
+        s.commit()
 
-            return ok(
-                message="Sesi istirahat selesai",
-                id_istirahat=current_break.id_istirahat,
-                end_istirahat=now_dt.isoformat(),
-            )
+        return ok(
+            message="Sesi istirahat selesai",
+            id_istirahat=current_break.id_istirahat,
+            end_istirahat=now_dt.isoformat(),
+        )
 
-        except Exception as e:
-            s.rollback()
-            return error(f"Terjadi kesalahan: {str(e)}", 500)
+    except Exception as e:
+        s.rollback()
+        return error(f"Terjadi kesalahan: {str(e)}", 500)
 
 
 @absensi_bp.get("/istirahat/status")
@@ -529,53 +522,53 @@ def istirahat_status():
     if not user_id:
         return error("user_id wajib ada", 400)
 
-    with get_session() as s:
-        today = today_local_date()
-
-        def serialize_istirahat(b: Istirahat):
-            data = {
-                "id_istirahat": b.id_istirahat,
-                "tanggal_istirahat": b.tanggal_istirahat.isoformat(),
-                "start_istirahat": b.start_istirahat.isoformat(),
-                "start_istirahat_latitude": float(b.start_istirahat_latitude) if b.start_istirahat_latitude is not None else None,
-                "start_istirahat_longitude": float(b.start_istirahat_longitude) if b.start_istirahat_longitude is not None else None,
-                "end_istirahat": None,
-                "end_istirahat_latitude": None,
-                "end_istirahat_longitude": None,
-                "duration_seconds": None,
-            }
-            if b.end_istirahat:
-                data["end_istirahat"] = b.end_istirahat.isoformat()
-                data["end_istirahat_latitude"] = float(b.end_istirahat_latitude) if b.end_istirahat_latitude is not None else None
-                data["end_istirahat_longitude"] = float(b.end_istirahat_longitude) if b.end_istirahat_longitude is not None else None
-                data["duration_seconds"] = int((b.end_istirahat - b.start_istirahat).total_seconds())
-            return data
-
-        all_breaks_today = (
-            s.query(Istirahat)
-            .join(Absensi)
-            .filter(Absensi.id_user == user_id, Istirahat.tanggal_istirahat == today)
-            .order_by(Istirahat.start_istirahat.asc())
-            .all()
-        )
+    s = get_db(readonly=True, user_id=user_id)
+    today = today_local_date()
+
+    def serialize_istirahat(b: Istirahat):
+        data = {
+            "id_istirahat": b.id_istirahat,
+            "tanggal_istirahat": b.tanggal_istirahat.isoformat(),
+            "start_istirahat": b.start_istirahat.isoformat(),
+            "start_istirahat_latitude": float(b.start_istirahat_latitude) if b.start_istirahat_latitude is not None else None,
+            "start_istirahat_longitude": float(b.start_istirahat_longitude) if b.start_istirahat_longitude is not None else None,
+            "end_istirahat": None,
+            "end_istirahat_latitude": None,
+            "end_istirahat_longitude": None,
+            "duration_seconds": None,
+        }
+        if b.end_istirahat:
+            data["end_istirahat"] = b.end_istirahat.isoformat()
+            data["end_istirahat_latitude"] = float(b.end_istirahat_latitude) if b.end_istirahat_latitude is not None else None
+            data["end_istirahat_longitude"] = float(b.end_istirahat_longitude) if b.end_istirahat_longitude is not None else None
+            data["duration_seconds"] = int((b.end_istirahat - b.start_istirahat).total_seconds())
+        return data
+
+    all_breaks_today = (
+        s.query(Istirahat)
+        .join(Absensi)
+        .filter(Absensi.id_user == user_id, Istirahat.tanggal_istirahat == today)
+        .order_by(Istirahat.start_istirahat.asc())
+        .all()
+    )
 
-        active_break = None
-        history = []
-        total_duration = 0
+    active_break = None
+    history = []
+    total_duration = 0
 
-        for b in all_breaks_today:
-            serialized = serialize_istirahat(b)
-            history.append(serialized)
-            if b.end_istirahat is None:
-                active_break = serialized
-            else:
-                total_duration += serialized["duration_seconds"]
+    for b in all_breaks_today:
+        serialized = serialize_istirahat(b)
+        history.append(serialized)
+        if b.end_istirahat is None:
+            active_break = serialized
+        else:
+            total_duration += serialized["duration_seconds"]
 
-        status = "active" if active_break else "inactive"
+    status = "active" if active_break else "inactive"
 
-        return ok(
-            status=status,
-            active_break=active_break,
-            history=history,
-            total_duration_seconds=total_duration,
-        )
+    return ok(
+        status=status,
+        active_break=active_break,
+        history=history,
+        total_duration_seconds=total_duration,
+    )
@@ -8,8 +8,8 @@ from sqlalchemy.exc import IntegrityError
 
 from ...utils.responses import ok, error
 from ...services.face_service import verify_user, enroll_user_task
-from ...services.storage.supabase_storage import list_objects, signed_url
-from ...db import get_session
+from ...services.storage import list_objects, signed_url
+from ...db import get_db
 from ...db.models import Device, User
 from ...utils.timez import now_local
 
@@ -50,56 +50,56 @@ def enroll():
         return error("Semua file 'images' kosong/invalid", 400)
 
     try:
-        with get_session() as s:
-            # Validasi user
-            user = s.execute(select(User).where(User.id_user == user_id)).scalar_one_or_none()
-            if user is None:
-                return error(f"User dengan id_user '{user_id}' tidak ditemukan.", 404)
-
-            user_name = user.nama_pengguna or "User"
-
-            # Enqueue task Celery (non-blocking)
-            enroll_user_task.delay(user_id, user_name, images_data)
-
-            # Catat / update device
-            now_naive_utc = now_local().replace(tzinfo=None)
-            device = None
-            if device_identifier:
-                device = s.execute(
-                    select(Device).where(
-                        Device.id_user == user_id,
-                        Device.device_identifier == device_identifier
-                    )
-                ).scalar_one_or_none()
-
-            if device is None:
-                device = Device(
-                    id_user=user_id,
-                    device_label=device_label or None,
-                    platform=platform or None,
-                    os_version=os_version or None,
-                    app_version=app_version or None,
-                    device_identifier=device_identifier or None,
-                    last_seen=now_naive_utc,
-                    fcm_token=fcm_token or None,
-                    fcm_token_updated_at=now_naive_utc if fcm_token else None
+        s = get_db()
+        # Validasi user
+        user = s.execute(select(User).where(User.id_user == user_id)).scalar_one_or_none()
+        if user is None:
+            return error(f"User dengan id_user '{user_id}' tidak ditemukan.", 404)
+
+        user_name = user.nama_pengguna or "User"
+
+        # Enqueue task Celery (non-blocking)
+        enroll_user_task.delay(user_id, user_name, images_data)
+
+        # Catat / update device
+        now_naive_utc = now_local().replace(tzinfo=None)
+        device = None
+        if device_identifier:
+            device = s.execute(
+                select(Device).where(
+                    Device.id_user == user_id,
+                    Device.device_identifier == device_identifier
                 )
-                s.add(device)
-            else:
-                device.device_label = device_label or device.device_label
-                device.platform = platform or device.platform
-                device.os_version = os_version or device.os_version
-                device.app_version = app_version or device.app_version
-                device.last_seen = now_naive_utc
-                if fcm_token and fcm_token != (device.fcm_token or ""):
-                    device.fcm_token = fcm_token
-                    device.fcm_token_updated_at = now_naive_utc
-
-            try:
-                s.commit()
-            except IntegrityError as e:
-                s.rollback()
-                current_app.logger.warning(f"Gagal menyimpan device untuk user {user_id}: {e}")
+            ).scalar_one_or_none()
+
+        if device is None:
+            device = Device(
+                id_user=user_id,
+                device_label=device_label or None,
+                platform=platform or None,
+                os_version=os_version or None,
+                app_version=app_version or None,
+                device_identifier=device_identifier or None,
+                last_seen=now_naive_utc,
+                fcm_token=fcm_token or None,
+                fcm_token_updated_at=now_naive_utc if fcm_token else None
+            )
+            s.add(device)
+        else:
+            device.device_label = device_label or device.device_label
+            device.platform = platform or device.platform
+            device.os_version = os_version or device.os_version
+            device.app_version = app_version or device.app_version
+            device.last_seen = now_naive_utc
+            if fcm_token and fcm_token != (device.fcm_token or ""):
+                device.fcm_token = fcm_token
+                device.fcm_token_updated_at = now_naive_utc
+
+        try:
+            s.commit()
+        except IntegrityError as e:
+            s.rollback()
+            current_app.logger.warning(f"Gagal menyimpan device untuk user {user_id}: {e}")
 
         # Respon cepat; proses heavy dikerjakan Celery
         return ok(message="Registrasi wajah berhasil di proses sistem", user_id=user_id, images=len(images_data))
@@ -1,10 +1,13 @@
 # app/blueprints/location/routes.py
 from __future__ import annotations
 
+import base64
+import json
+
 from flask import Blueprint, request, current_app
 from ...utils.responses import ok, error
-from ...utils.geo import haversine_m
-from ...db import get_session
+from ...services.location_index import get_location_index
+from ...db import get_db
 from ...db.models import Location, User
 
 # Penting: JANGAN menaruh prefix "/api/location" di sini.
@@ -23,38 +26,69 @@ def _serialize(loc: Location):
     }
 
 
+def _encode_cursor(key) -> str:
+    raw = json.dumps(list(key), separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    name, loc_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    return (str(name), str(loc_id))
+
+
 @location_bp.get("/")
 def list_locations():
-    """List + search + pagination: GET /api/location?q=&page=&page_size="""
+    """
+    List + search + pagination: GET /api/location?q=&match=&cursor=&page=&page_size=
+
+    Dilayani dari snapshot lokasi in-memory (tabel kecil, jarang berubah):
+    - urutan (nama_kantor ternormalisasi, id_location), keyset via cursor (next_cursor)
+    - match=contains (default, seperti ILIKE %q%) atau match=prefix (bisect)
+    - total dihitung dari snapshot, tanpa COUNT(*) ke DB
+    ?page= tetap didukung untuk klien lama.
+    """
     q = (request.args.get("q") or "").strip()
+    match = (request.args.get("match") or "contains").strip().lower()
+    cursor = (request.args.get("cursor") or "").strip()
     page = request.args.get("page", type=int, default=1)
     page_size = request.args.get("page_size", type=int, default=20)
     page = 1 if not page or page < 1 else page
     page_size = 20 if not page_size or page_size < 1 else min(page_size, 100)
+    if match not in ("contains", "prefix"):
+        return error("match harus 'contains' atau 'prefix'", 400)
+
+    after = None
+    if cursor:
+        try:
+            after = _decode_cursor(cursor)
+        except Exception:
+            return error("cursor tidak valid", 400)
 
-    with get_session() as s:
-        qry = s.query(Location).filter(Location.deleted_at.is_(None))
-        if q:
-            like = f"%{q}%"
-            # ILIKE untuk PostgreSQL; untuk MySQL bisa diakali dengan lower()
-            qry = qry.filter(Location.nama_kantor.ilike(like))
-        total = qry.count()
-        items = (
-            qry.order_by(Location.nama_kantor.asc())
-            .offset((page - 1) * page_size)
-            .limit(page_size)
-            .all()
-        )
-        return ok(total=total, page=page, page_size=page_size, items=[_serialize(l) for l in items])
+    index = get_location_index()
+    items, total, next_key = index.search(
+        q,
+        mode=match,
+        limit=page_size,
+        after=after,
+        offset=0 if after is not None else (page - 1) * page_size,
+    )
+    return ok(
+        total=total,
+        page=None if after is not None else page,
+        page_size=page_size,
+        next_cursor=_encode_cursor(next_key) if next_key else None,
+        items=[e.to_dict() for e in items],
+    )
 
 
 @location_bp.get("/<loc_id>")
 def get_location(loc_id: str):
-    with get_session() as s:
-        loc = s.get(Location, loc_id)
-        if loc is None or loc.deleted_at is not None:
-            return error("Lokasi tidak ditemukan", 404)
-        return ok(**_serialize(loc))
+    s = get_db(readonly=True)
+    loc = s.get(Location, loc_id)
+    if loc is None or loc.deleted_at is not None:
+        return error("Lokasi tidak ditemukan", 404)
+    return ok(**_serialize(loc))
 
 
 @location_bp.get("/nearest")
@@ -68,20 +102,13 @@ def nearest_location():
     if lat is None or lng is None:
         return error("lat & lng wajib ada", 400)
 
-    with get_session() as s:
-        locs = s.query(Location).filter(Location.deleted_at.is_(None)).all()
-        pairs = []
-        for l in locs:
-            d = haversine_m(lng, lat, float(l.longitude), float(l.latitude))
-            pairs.append((l, d))
-        pairs.sort(key=lambda x: x[1])
-        if radius_m is not None:
-            pairs = [p for p in pairs if p[1] <= float(radius_m)]
-        picked = pairs[:limit]
-        return ok(
-            count=len(picked),
-            items=[{**_serialize(l), "distanceMeters": float(d)} for l, d in picked],
-        )
+    s = get_db(readonly=True)
+    index = get_location_index(s)
+    picked = index.nearest(lat, lng, k=limit, radius_m=radius_m)
+    return ok(
+        count=len(picked),
+        items=[{**e.to_dict(), "distanceMeters": float(d)} for e, d in picked],
+    )
 
 
 @location_bp.get("/my")
@@ -90,11 +117,11 @@ def my_location():
     user_id = (request.args.get("user_id") or "").strip()
     if not user_id:
         return error("user_id wajib ada", 400)
-    with get_session() as s:
-        u = s.get(User, user_id)
-        if u is None or not u.id_location:
-            return ok(item=None)
-        loc = s.get(Location, u.id_location)
-        if loc is None or loc.deleted_at is not None:
-            return ok(item=None)
-        return ok(item=_serialize(loc))
+    s = get_db(readonly=True, user_id=user_id)
+    u = s.get(User, user_id)
+    if u is None or not u.id_location:
+        return ok(item=None)
+    loc = s.get(Location, u.id_location)
+    if loc is None or loc.deleted_at is not None:
+        return ok(item=None)
+    return ok(item=_serialize(loc))
@@ -5,11 +5,19 @@ from __future__ import annotations
 from flask import Blueprint, request, current_app
 from sqlalchemy import select
 
-from ...db import get_session
+from ...db import get_db, mark_written
 from ...db.models import Device, Notification
 from ...utils.responses import ok, error
 from ...utils.auth_utils import token_required, get_user_id_from_auth
 from ...utils.timez import now_local
+from ...services.notification_inbox import (
+    list_notifications,
+    mark_read,
+    mark_unread_dirty,
+    parse_before,
+    parse_status,
+    unread_count,
+)
 
 # Penting: JANGAN menaruh prefix "/api/notifications" di sini.
 # Prefix dipasang saat register_blueprint() di create_app():
@@ -36,83 +44,133 @@ def register_device():
     if not fcm_token:
         return error("Field 'fcm_token' wajib ada", 400)
 
-    with get_session() as s:
-        device = None
-        if device_identifier:
-            device = (
-                s.execute(
-                    select(Device).where(
-                        Device.id_user == user_id,
-                        Device.device_identifier == device_identifier,
-                    )
+    s = get_db()
+    device = None
+    if device_identifier:
+        device = (
+            s.execute(
+                select(Device).where(
+                    Device.id_user == user_id,
+                    Device.device_identifier == device_identifier,
                 )
-                .scalar_one_or_none()
             )
+            .scalar_one_or_none()
+        )
 
-        now_naive_utc = now_local().replace(tzinfo=None)
-
-        if device:
-            # Update device
-            device.fcm_token = fcm_token
-            device.fcm_token_updated_at = now_naive_utc
-            device.last_seen = now_naive_utc
-            device.platform = payload.get("platform")
-            device.os_version = payload.get("os_version")
-            device.app_version = payload.get("app_version")
-            device.device_label = payload.get("device_label")
-            msg = "Token perangkat diperbarui"
-        else:
-            # Create new device
-            device = Device(
-                id_user=user_id,
-                fcm_token=fcm_token,
-                device_identifier=device_identifier,
-                platform=payload.get("platform"),
-                os_version=payload.get("os_version"),
-                app_version=payload.get("app_version"),
-                device_label=payload.get("device_label"),
-                fcm_token_updated_at=now_naive_utc,
-                last_seen=now_naive_utc,
-            )
-            s.add(device)
-            msg = "Perangkat berhasil didaftarkan"
+    now_naive_utc = now_local().replace(tzinfo=None)
+
+    if device:
+        # Update device
+        device.fcm_token = fcm_token
+        device.fcm_token_updated_at = now_naive_utc
+        device.last_seen = now_naive_utc
+        device.platform = payload.get("platform")
+        device.os_version = payload.get("os_version")
+        device.app_version = payload.get("app_version")
+        device.device_label = payload.get("device_label")
+        msg = "Token perangkat diperbarui"
+    else:
+        # Create new device
+        device = Device(
+            id_user=user_id,
+            fcm_token=fcm_token,
+            device_identifier=device_identifier,
+            platform=payload.get("platform"),
+            os_version=payload.get("os_version"),
+            app_version=payload.get("app_version"),
+            device_label=payload.get("device_label"),
+            fcm_token_updated_at=now_naive_utc,
+            last_seen=now_naive_utc,
+        )
+        s.add(device)
+        msg = "Perangkat berhasil didaftarkan"
 
-        s.commit()
-        s.refresh(device)
+    s.commit()
+    s.refresh(device)
 
-        return ok(message=msg, device_id=device.id_device)
+    return ok(message=msg, device_id=device.id_device)
 
 
 @notif_bp.get("/")
 @token_required
 def get_notifications():
     """
-    Mengambil daftar notifikasi untuk pengguna yang terautentikasi.
+    Mengambil daftar notifikasi untuk pengguna yang terautentikasi (keyset pagination).
     Endpoint akhir: GET /api/notifications
+    Query: limit (default NOTIF_PAGE_SIZE, maks NOTIF_PAGE_MAX), cursor (dari next_cursor),
+           status (unread|read|archived)
     """
     user_id = get_user_id_from_auth()
-    with get_session() as s:
-        notifications = (
-            s.execute(
-                select(Notification)
-                .where(Notification.id_user == user_id)
-                .order_by(Notification.created_at.desc())
-            )
-            .scalars()
-            .all()
+    cfg = current_app.config
+    try:
+        limit = int(request.args.get("limit", cfg.get("NOTIF_PAGE_SIZE", 20)))
+    except ValueError:
+        return error("limit harus berupa angka", 400)
+    try:
+        status = parse_status(request.args.get("status"))
+    except ValueError as e:
+        return error(str(e), 400)
+    limit = max(1, min(limit, int(cfg.get("NOTIF_PAGE_MAX", 100))))
+
+    s = get_db(readonly=True, user_id=user_id)
+    try:
+        items, next_cursor = list_notifications(
+            s, user_id, limit=limit, cursor=request.args.get("cursor") or None, status=status
         )
+    except ValueError as e:
+        return error(str(e), 400)
 
-        def to_dict(n: Notification):
-            return {
-                "id_notification": n.id_notification,
-                "title": n.title,
-                "body": n.body,
-                "created_at": n.created_at.isoformat(),
-                "read_at": n.read_at.isoformat() if n.read_at else None,
-                "status": n.status.value if n.status else None,
-            }
+    return ok(items=items, next_cursor=next_cursor, limit=limit)
 
-        return ok(items=[to_dict(n) for n in notifications])
+
+@notif_bp.get("/unread-count")
+@token_required
+def get_unread_count():
+    """
+    Jumlah notifikasi belum dibaca (untuk badge), dari cache Redis bila ada.
+    Endpoint akhir: GET /api/notifications/unread-count
+    """
+    user_id = get_user_id_from_auth()
+    s = get_db(readonly=True, user_id=user_id)
+    return ok(unread_count=unread_count(s, user_id))
+
+
+@notif_bp.put("/read")
+@token_required
+def mark_many_as_read():
+    """
+    Menandai banyak notifikasi sebagai 'read' dalam satu UPDATE.
+    Endpoint akhir: PUT /api/notifications/read
+    Body (JSON): { ids: [id_notification, ...] }  atau  { all: true, before?: ISO datetime }
+    """
+    user_id = get_user_id_from_auth()
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return error("JSON body tidak valid", 400)
+
+    ids = payload.get("ids")
+    mark_all = payload.get("all") is True
+    if mark_all == (ids is not None):
+        return error("Isi salah satu: 'ids' (list) atau 'all': true", 400)
+
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+            return error("Field 'ids' harus berupa list string", 400)
+        max_ids = int(current_app.config.get("NOTIF_PAGE_MAX", 100))
+        if len(ids) > max_ids:
+            return error(f"Maksimal {max_ids} id per request; gunakan 'all' untuk sisanya", 400)
+
+    try:
+        before = parse_before(payload.get("before"))
+    except ValueError as e:
+        return error(str(e), 400)
+
+    s = get_db()
+    updated = mark_read(s, user_id, ids=None if mark_all else list(dict.fromkeys(ids)), before=before)
+    mark_written(s, user_id)
+    s.commit()
+
+    return ok(message="Notifikasi ditandai sebagai sudah dibaca", updated=updated)
 
 
 @notif_bp.put("/<string:notification_id>/read")
@@ -123,27 +181,29 @@ def mark_as_read(notification_id: str):
     Endpoint akhir: PUT /api/notifications/<notification_id>/read
     """
     user_id = get_user_id_from_auth()
-    with get_session() as s:
-        result = (
-            s.query(Notification)
-            .filter(
-                Notification.id_notification == notification_id,
-                Notification.id_user == user_id,
-            )
-            .one_or_none()
+    s = get_db()
+    result = (
+        s.query(Notification)
+        .filter(
+            Notification.id_notification == notification_id,
+            Notification.id_user == user_id,
         )
+        .one_or_none()
+    )
+
+    if not result:
+        return error("Notifikasi tidak ditemukan atau Anda tidak punya akses", 404)
+
+    if not result.read_at:
+        result.read_at = now_local().replace(tzinfo=None)
+        # Jika kolom status bertipe Enum, pastikan assignment sesuai tipe Enum
+        try:
+            result.status = getattr(result.__class__.status.type.enum_class, "read")  # type: ignore
+        except Exception:
+            # fallback bila status berupa string
+            result.status = "read"  # type: ignore
+        mark_unread_dirty(s, [user_id])
+        mark_written(s, user_id)
+        s.commit()
 
-        if not result:
-            return error("Notifikasi tidak ditemukan atau Anda tidak punya akses", 404)
-
-        if not result.read_at:
-            result.read_at = now_local().replace(tzinfo=None)
-            # Jika kolom status bertipe Enum, pastikan assignment sesuai tipe Enum
-            try:
-                result.status = getattr(result.__class__.status.type.enum_class, "read")  # type: ignore
-            except Exception:
-                # fallback bila status berupa string
-                result.status = "read"  # type: ignore
-            s.commit()
-
-        return ok(message="Notifikasi ditandai sebagai sudah dibaca")
+    return ok(message="Notifikasi ditandai sebagai sudah dibaca")
@@ -9,24 +9,110 @@ load_dotenv()
 class BaseConfig:
     # Nilai default atau placeholder
     DATABASE_URL = ''
+    # Replika baca (dipisah koma); kosong = semua query ke DATABASE_URL
+    DATABASE_READ_URLS = ''
+    # Lama bacaan user diarahkan ke primary setelah ia menulis (detik)
+    DB_READ_YOUR_WRITES_SECONDS = 5
+    # Pool koneksi per proses. Total koneksi maksimum ke MySQL kira-kira:
+    #   (worker gunicorn + child/thread Celery) x (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    # dan harus di bawah max_connections server.
+    DB_POOL_SIZE = 5
+    DB_MAX_OVERFLOW = 10
+    DB_POOL_TIMEOUT = 30
+    DB_POOL_RECYCLE = 1800
+    DB_POOL_PRE_PING = True
+    DB_POOL_USE_LIFO = True
+    # Session get_db() yang hidup lebih lama dari ini di-log (detik)
+    DB_SESSION_WARN_SECONDS = 2.0
+    # Query lebih lambat dari ini di-log dengan bentuk parameternya (ms, 0 = mati)
+    DB_SLOW_QUERY_MS = 200
+    # Request/task dengan jumlah statement di atas ini di-log sebagai warning
+    DB_QUERY_COUNT_WARN = 50
+    # Header X-DB-Query-Count / X-DB-Time-ms (selalu aktif saat debug)
+    DB_QUERY_HEADERS = False
+    # GET /metrics (Prometheus); butuh paket prometheus_client
+    METRICS_ENABLED = True
+    # Tracing OpenTelemetry: exporter otlp | file | console
+    TRACING_ENABLED = False
+    TRACING_EXPORTER = 'otlp'
+    TRACING_FILE = 'traces.jsonl'
+    TRACING_SAMPLE_RATIO = 1.0
+    OTEL_SERVICE_NAME = 'api-absensi'
     TIMEZONE = 'Asia/Makassar'
     DEFAULT_GEOFENCE_RADIUS = 100
+    # Interval cek versi tabel location untuk index spasial in-memory (detik)
+    LOCATION_INDEX_TTL = 60
+    # Jeda minimum cek ulang saat id lokasi tidak ada di cache (detik)
+    LOCATION_CACHE_MISS_REFRESH = 5
+    # Cache jadwal kerja (shift + pola) per user/tanggal untuk check-in & istirahat
+    SCHEDULE_CACHE_TTL = 300
+    SCHEDULE_VERSION_CHECK = 30
+    SCHEDULE_CACHE_MAX_ENTRIES = 50000
     SUPABASE_URL = ""
     SUPABASE_SERVICE_ROLE_KEY = ""
     SUPABASE_BUCKET = "e-hrm"
     MODEL_NAME = "buffalo_l"
+    # Batas thread onnxruntime per proses (0 = default ORT / semua core)
+    FACE_ORT_INTRA_OP_THREADS = 0
+    FACE_ORT_INTER_OP_THREADS = 0
     SIGNED_URL_EXPIRES = 604800
+    # Backend storage: supabase | local (filesystem, untuk dev/benchmark)
+    STORAGE_BACKEND = 'supabase'
+    STORAGE_LOCAL_DIR = 'storage_local'
+    STORAGE_LOCAL_BASE_URL = ''
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
     JSON_SORT_KEYS = False
     
     # Konfigurasi Celery
     CELERY_BROKER_URL = 'redis://localhost:6379/0'
     CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+    # Nama queue per jenis beban kerja (lihat init_celery di extensions.py)
+    CELERY_FACE_QUEUE = 'face'
+    CELERY_ABSENSI_QUEUE = 'absensi'
+    CELERY_NOTIFICATIONS_QUEUE = 'notifications'
+    CELERY_DEFAULT_QUEUE = 'default'
+    CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+    # Outbox notifikasi
+    NOTIF_OUTBOX_BATCH_SIZE = 100
+    NOTIF_OUTBOX_MAX_ATTEMPTS = 5
+    NOTIF_OUTBOX_LEASE_SECONDS = 120
+    NOTIF_OUTBOX_POLL_SECONDS = 15
+    NOTIF_TEMPLATE_CACHE_TTL = 60
+    NOTIF_FCM_MAX_WORKERS = 4
+    NOTIF_BULK_DISPATCH_BATCH = 2000
+    NOTIF_TOKEN_FAILURE_THRESHOLD = 3
+    # Transport FCM: 'sdk' (firebase_admin) atau 'http' (FCM v1 async HTTP/2)
+    NOTIF_FCM_TRANSPORT = 'sdk'
+    FCM_API_BASE_URL = 'https://fcm.googleapis.com'
+    FCM_HTTP_CONCURRENCY = 64
+    FCM_RATE_LIMIT_PER_SEC = 0
+    FCM_MAX_RETRIES = 4
+    FCM_HTTP_TIMEOUT = 10
+    FCM_ACCESS_TOKEN_OVERRIDE = None
+
+    # Inbox notifikasi
+    NOTIF_PAGE_SIZE = 20
+    NOTIF_PAGE_MAX = 100
+    NOTIF_UNREAD_CACHE_TTL = 300
+
+    # Retensi notifikasi (0 hari = nonaktif); mode: archive | file | delete
+    NOTIF_RETENTION_DAYS = 180
+    NOTIF_RETENTION_MODE = 'archive'
+    NOTIF_RETENTION_BATCH = 1000
+    NOTIF_RETENTION_MAX_BATCHES = 200
+    NOTIF_RETENTION_HOUR = 2
+    NOTIF_ARCHIVE_DIR = 'archive/notifications'
+
+    # Redis untuk cache (kosong = pakai CELERY_BROKER_URL bila Redis)
+    REDIS_URL = None
 
     # Placeholder untuk Firebase
     FIREBASE_PROJECT_ID = None
     FIREBASE_CLIENT_EMAIL = None
     FIREBASE_PRIVATE_KEY = None
+    # Access token OAuth FCM di-refresh bila sisa masa berlakunya < margin (detik)
+    FIREBASE_TOKEN_REFRESH_MARGIN = 300
 
 class DevConfig(BaseConfig):
     DEBUG = True
@@ -46,17 +132,80 @@ def load_config(app):
     # Ini menimpa nilai default di BaseConfig jika ada di .env.
     app.config.update(
         DATABASE_URL = os.getenv('DATABASE_URL', ''),
+        DATABASE_READ_URLS = os.getenv('DATABASE_READ_URLS', os.getenv('DATABASE_READ_URL', '')),
+        DB_READ_YOUR_WRITES_SECONDS = float(os.getenv('DB_READ_YOUR_WRITES_SECONDS', '5')),
+        DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5')),
+        DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+        DB_POOL_USE_LIFO = os.getenv('DB_POOL_USE_LIFO', 'true').lower() in ('1', 'true', 'yes'),
+        DB_SESSION_WARN_SECONDS = float(os.getenv('DB_SESSION_WARN_SECONDS', '2')),
+        DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '200')),
+        DB_QUERY_COUNT_WARN = int(os.getenv('DB_QUERY_COUNT_WARN', '50')),
+        DB_QUERY_HEADERS = os.getenv('DB_QUERY_HEADERS', 'false').lower() in ('1', 'true', 'yes'),
+        METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+        TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'false').lower() in ('1', 'true', 'yes'),
+        TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', 'otlp'),
+        TRACING_FILE = os.getenv('TRACING_FILE', 'traces.jsonl'),
+        TRACING_SAMPLE_RATIO = float(os.getenv('TRACING_SAMPLE_RATIO', '1.0')),
+        OTEL_SERVICE_NAME = os.getenv('OTEL_SERVICE_NAME', 'api-absensi'),
         TIMEZONE = os.getenv('TIMEZONE', 'Asia/Makassar'),
         DEFAULT_GEOFENCE_RADIUS = int(os.getenv('DEFAULT_GEOFENCE_RADIUS', '100')),
+        LOCATION_INDEX_TTL = float(os.getenv('LOCATION_INDEX_TTL', '60')),
+        LOCATION_CACHE_MISS_REFRESH = float(os.getenv('LOCATION_CACHE_MISS_REFRESH', '5')),
+        SCHEDULE_CACHE_TTL = float(os.getenv('SCHEDULE_CACHE_TTL', '300')),
+        SCHEDULE_VERSION_CHECK = float(os.getenv('SCHEDULE_VERSION_CHECK', '30')),
+        SCHEDULE_CACHE_MAX_ENTRIES = int(os.getenv('SCHEDULE_CACHE_MAX_ENTRIES', '50000')),
         SUPABASE_URL = os.getenv("SUPABASE_URL", ""),
         SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", ""),
+        STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'supabase'),
+        STORAGE_LOCAL_DIR = os.getenv('STORAGE_LOCAL_DIR', 'storage_local'),
+        STORAGE_LOCAL_BASE_URL = os.getenv('STORAGE_LOCAL_BASE_URL', ''),
+        FACE_ORT_INTRA_OP_THREADS = int(os.getenv("FACE_ORT_INTRA_OP_THREADS", "0")),
+        FACE_ORT_INTER_OP_THREADS = int(os.getenv("FACE_ORT_INTER_OP_THREADS", "0")),
         
         # Variabel Celery
         CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0'),
         CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0'),
+        CELERY_FACE_QUEUE = os.getenv('CELERY_FACE_QUEUE', 'face'),
+        CELERY_ABSENSI_QUEUE = os.getenv('CELERY_ABSENSI_QUEUE', 'absensi'),
+        CELERY_NOTIFICATIONS_QUEUE = os.getenv('CELERY_NOTIFICATIONS_QUEUE', 'notifications'),
+        CELERY_DEFAULT_QUEUE = os.getenv('CELERY_DEFAULT_QUEUE', 'default'),
+        CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.getenv('CELERY_WORKER_PREFETCH_MULTIPLIER', '1')),
+
+        # Outbox notifikasi
+        NOTIF_OUTBOX_BATCH_SIZE = int(os.getenv('NOTIF_OUTBOX_BATCH_SIZE', '100')),
+        NOTIF_OUTBOX_MAX_ATTEMPTS = int(os.getenv('NOTIF_OUTBOX_MAX_ATTEMPTS', '5')),
+        NOTIF_OUTBOX_LEASE_SECONDS = int(os.getenv('NOTIF_OUTBOX_LEASE_SECONDS', '120')),
+        NOTIF_OUTBOX_POLL_SECONDS = float(os.getenv('NOTIF_OUTBOX_POLL_SECONDS', '15')),
+        NOTIF_TEMPLATE_CACHE_TTL = float(os.getenv('NOTIF_TEMPLATE_CACHE_TTL', '60')),
+        NOTIF_FCM_MAX_WORKERS = int(os.getenv('NOTIF_FCM_MAX_WORKERS', '4')),
+        NOTIF_BULK_DISPATCH_BATCH = int(os.getenv('NOTIF_BULK_DISPATCH_BATCH', '2000')),
+        NOTIF_TOKEN_FAILURE_THRESHOLD = int(os.getenv('NOTIF_TOKEN_FAILURE_THRESHOLD', '3')),
+        NOTIF_FCM_TRANSPORT = os.getenv('NOTIF_FCM_TRANSPORT', 'sdk'),
+        FCM_API_BASE_URL = os.getenv('FCM_API_BASE_URL', 'https://fcm.googleapis.com'),
+        FCM_HTTP_CONCURRENCY = int(os.getenv('FCM_HTTP_CONCURRENCY', '64')),
+        FCM_RATE_LIMIT_PER_SEC = float(os.getenv('FCM_RATE_LIMIT_PER_SEC', '0')),
+        FCM_MAX_RETRIES = int(os.getenv('FCM_MAX_RETRIES', '4')),
+        FCM_HTTP_TIMEOUT = float(os.getenv('FCM_HTTP_TIMEOUT', '10')),
+        FCM_ACCESS_TOKEN_OVERRIDE = os.getenv('FCM_ACCESS_TOKEN_OVERRIDE') or None,
+
+        # Inbox notifikasi
+        NOTIF_PAGE_SIZE = int(os.getenv('NOTIF_PAGE_SIZE', '20')),
+        NOTIF_PAGE_MAX = int(os.getenv('NOTIF_PAGE_MAX', '100')),
+        NOTIF_UNREAD_CACHE_TTL = int(os.getenv('NOTIF_UNREAD_CACHE_TTL', '300')),
+        NOTIF_RETENTION_DAYS = int(os.getenv('NOTIF_RETENTION_DAYS', '180')),
+        NOTIF_RETENTION_MODE = os.getenv('NOTIF_RETENTION_MODE', 'archive'),
+        NOTIF_RETENTION_BATCH = int(os.getenv('NOTIF_RETENTION_BATCH', '1000')),
+        NOTIF_RETENTION_MAX_BATCHES = int(os.getenv('NOTIF_RETENTION_MAX_BATCHES', '200')),
+        NOTIF_RETENTION_HOUR = int(os.getenv('NOTIF_RETENTION_HOUR', '2')),
+        NOTIF_ARCHIVE_DIR = os.getenv('NOTIF_ARCHIVE_DIR', 'archive/notifications'),
+        REDIS_URL = os.getenv('REDIS_URL') or None,
 
         # Variabel Firebase
         FIREBASE_PROJECT_ID=os.getenv('FIREBASE_PROJECT_ID'),
         FIREBASE_CLIENT_EMAIL=os.getenv('FIREBASE_CLIENT_EMAIL'),
         FIREBASE_PRIVATE_KEY=os.getenv('FIREBASE_PRIVATE_KEY'),
+        FIREBASE_TOKEN_REFRESH_MARGIN=int(os.getenv('FIREBASE_TOKEN_REFRESH_MARGIN', '300')),
     )
\ No newline at end of file
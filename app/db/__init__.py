@@ -1,22 +1,399 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from flask import current_app
+import itertools
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
+from flask import current_app, g
+
+from . import query_stats
+from .. import tracing
+from ..metrics import count_pool_timeout
 
 Base = declarative_base()
 _SessionFactory = None
+_ReadOnlySessionFactory = None
 _engine = None
+_read_engines = None
+_autocommit_binds = {}
+_replica_rr = itertools.count()
+# Worker Celery dengan --pool=threads bisa memanggil get_engine() bersamaan
+_init_lock = threading.Lock()
+log = logging.getLogger(__name__)
+
+# Statistik pool per proses (lihat pool_stats()).
+_pool_counters = {
+    "connects": 0,
+    "checkouts": 0,
+    "checkins": 0,
+    "invalidated": 0,
+    "timeouts": 0,
+    "waits": 0,          # checkout yang harus menunggu > 1 ms
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+    "overflow_max": 0,
+}
+_counters_lock = threading.Lock()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool yang mencatat lama menunggu koneksi dan timeout checkout."""
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except sa_exc.TimeoutError:
+            with _counters_lock:
+                _pool_counters["timeouts"] += 1
+            count_pool_timeout()
+            raise
+        waited = time.perf_counter() - t0
+        with _counters_lock:
+            if waited > 0.001:
+                _pool_counters["waits"] += 1
+            _pool_counters["wait_seconds_total"] += waited
+            _pool_counters["wait_seconds_max"] = max(_pool_counters["wait_seconds_max"], waited)
+            _pool_counters["overflow_max"] = max(_pool_counters["overflow_max"], self.overflow())
+        return conn
+
+
+def _engine_kwargs(url: str, cfg) -> dict:
+    kwargs = {"pool_pre_ping": bool(cfg.get("DB_POOL_PRE_PING", True)), "future": True}
+    if url.startswith("sqlite"):
+        # SQLite memakai SingletonThreadPool/NullPool bawaan; opsi QueuePool tidak berlaku
+        return kwargs
+    kwargs.update(
+        poolclass=TimedQueuePool,
+        pool_size=int(cfg.get("DB_POOL_SIZE", 5)),
+        max_overflow=int(cfg.get("DB_MAX_OVERFLOW", 10)),
+        pool_timeout=float(cfg.get("DB_POOL_TIMEOUT", 30)),
+        pool_recycle=int(cfg.get("DB_POOL_RECYCLE", 1800)),
+        pool_use_lifo=bool(cfg.get("DB_POOL_USE_LIFO", True)),
+    )
+    return kwargs
+
+
+def _count(name: str):
+    def _handler(*args, **kwargs):
+        with _counters_lock:
+            _pool_counters[name] += 1
+    return _handler
+
 
 def get_engine():
     global _engine
     if _engine is None:
-        url = current_app.config.get("DATABASE_URL", "")
-        if not url:
-            raise RuntimeError("DATABASE_URL not configured")
-        _engine = create_engine(url, pool_pre_ping=True, future=True)
+        with _init_lock:
+            if _engine is None:
+                cfg = current_app.config
+                url = cfg.get("DATABASE_URL", "")
+                if not url:
+                    raise RuntimeError("DATABASE_URL not configured")
+                _engine = _create_engine(url, cfg)
     return _engine
 
+
+def _create_engine(url: str, cfg):
+    engine = create_engine(url, **_engine_kwargs(url, cfg))
+    query_stats.instrument(engine, cfg.get("DB_SLOW_QUERY_MS", 200))
+    tracing.instrument_engine(engine)
+    event.listen(engine, "connect", _count("connects"))
+    event.listen(engine, "checkout", _count("checkouts"))
+    event.listen(engine, "checkin", _count("checkins"))
+    event.listen(engine, "invalidate", _count("invalidated"))
+    return engine
+
+
+def _read_urls(cfg) -> list:
+    raw = cfg.get("DATABASE_READ_URLS") or cfg.get("DATABASE_READ_URL") or ""
+    if isinstance(raw, (list, tuple)):
+        return [u for u in raw if u]
+    return [u.strip() for u in str(raw).split(",") if u.strip()]
+
+
+def get_read_engines() -> list:
+    """Engine replika dari DATABASE_READ_URLS; list kosong bila tidak diset."""
+    global _read_engines
+    if _read_engines is None:
+        with _init_lock:
+            if _read_engines is None:
+                cfg = current_app.config
+                _read_engines = [_create_engine(url, cfg) for url in _read_urls(cfg)]
+    return _read_engines
+
+
 def get_session():
     global _SessionFactory
     if _SessionFactory is None:
-        _SessionFactory = sessionmaker(bind=get_engine(), autocommit=False, autoflush=False, future=True)
+        engine = get_engine()
+        with _init_lock:
+            if _SessionFactory is None:
+                _SessionFactory = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
     return _SessionFactory()
+
+
+def _get_readonly_factory():
+    global _ReadOnlySessionFactory
+    if _ReadOnlySessionFactory is None:
+        with _init_lock:
+            if _ReadOnlySessionFactory is None:
+                _ReadOnlySessionFactory = sessionmaker(autoflush=False, expire_on_commit=False, future=True)
+    return _ReadOnlySessionFactory
+
+
+def _autocommit_bind(engine):
+    # AUTOCOMMIT: tiap SELECT selesai tanpa transaksi terbuka yang
+    # menahan snapshot/koneksi sampai request berakhir.
+    bind = _autocommit_binds.get(id(engine))
+    if bind is None:
+        bind = engine.execution_options(isolation_level="AUTOCOMMIT")
+        _autocommit_binds[id(engine)] = bind
+    return bind
+
+
+def _pick_read_engine(user_id=None):
+    """Replika round-robin, kecuali user baru saja menulis (read-your-writes)."""
+    replicas = get_read_engines()
+    if not replicas or (user_id and recently_written(user_id)):
+        return get_engine(), False
+    return replicas[next(_replica_rr) % len(replicas)], True
+
+
+def get_read_session(user_id=None) -> Session:
+    """
+    Session read-only mandiri (bukan per app context) untuk query laporan/
+    snapshot di service; pemanggil wajib menutupnya (pakai `with`).
+    """
+    engine, replica = _pick_read_engine(user_id)
+    s = _get_readonly_factory()(bind=_autocommit_bind(engine))
+    s.info["replica"] = replica
+    event.listen(s, "before_flush", _reject_flush)
+    return s
+
+
+# ---------- Read-your-writes ----------
+#
+# Setelah user menulis (checkin, istirahat, read notifikasi, ...), bacaan
+# user tersebut diarahkan ke primary selama DB_READ_YOUR_WRITES_SECONDS agar
+# lag replikasi tidak membuat status terlihat mundur. Penanda disimpan di
+# Redis (berlaku lintas worker gunicorn/Celery) dengan cadangan dict per proses.
+
+_RYW_KEY = "db:ryw:{}"
+_WRITTEN_KEY = "db_written_users"
+_recent_writes = {}
+
+
+def _ryw_seconds() -> float:
+    try:
+        return float(current_app.config.get("DB_READ_YOUR_WRITES_SECONDS", 5))
+    except RuntimeError:
+        return 5.0
+
+
+def note_write(user_ids) -> None:
+    """Catat bahwa user baru saja menulis ke primary."""
+    if isinstance(user_ids, str):
+        user_ids = [user_ids]
+    user_ids = [u for u in set(user_ids) if u]
+    ttl = _ryw_seconds()
+    if not user_ids or ttl <= 0:
+        return
+    until = time.monotonic() + ttl
+    with _counters_lock:
+        for uid in user_ids:
+            _recent_writes[uid] = until
+        if len(_recent_writes) > 10000:
+            now = time.monotonic()
+            for uid in [u for u, t in _recent_writes.items() if t < now]:
+                _recent_writes.pop(uid, None)
+
+    try:
+        if not get_read_engines():
+            return
+    except RuntimeError:
+        # Di luar app context (skrip): tidak ada replika yang perlu dihindari
+        return
+    from ..extensions import get_redis  # hindari import melingkar
+
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        pipe = r.pipeline(transaction=False)
+        for uid in user_ids:
+            pipe.set(_RYW_KEY.format(uid), 1, px=int(ttl * 1000))
+        pipe.execute()
+    except Exception as e:
+        log.debug(f"Redis set read-your-writes gagal: {e}")
+
+
+def recently_written(user_id: str) -> bool:
+    with _counters_lock:
+        until = _recent_writes.get(user_id)
+    if until is not None and until > time.monotonic():
+        return True
+    from ..extensions import get_redis
+
+    r = get_redis()
+    if r is None:
+        return False
+    try:
+        return bool(r.exists(_RYW_KEY.format(user_id)))
+    except Exception as e:
+        # Ragu: baca dari primary
+        log.debug(f"Redis cek read-your-writes gagal: {e}")
+        return True
+
+
+def mark_written(session: Session, user_ids) -> None:
+    """Jadwalkan note_write() untuk user tersebut setelah session commit."""
+    if isinstance(user_ids, str):
+        user_ids = [user_ids]
+    session.info.setdefault(_WRITTEN_KEY, set()).update(u for u in user_ids if u)
+
+
+@event.listens_for(Session, "after_commit")
+def _note_write_after_commit(session: Session) -> None:
+    written = session.info.pop(_WRITTEN_KEY, None)
+    if written:
+        note_write(written)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written(session: Session) -> None:
+    session.info.pop(_WRITTEN_KEY, None)
+
+
+def _reject_flush(session, flush_context, instances):
+    raise RuntimeError("Session read-only tidak boleh menulis (gunakan get_db() tanpa readonly).")
+
+
+# ---------- Session per app context (request Flask / task Celery) ----------
+#
+# get_db() memberi satu session per app context; teardown_appcontext menutup
+# (dan me-rollback transaksi yang belum di-commit) di akhir request, dan
+# FlaskContextTask mendorong app context per task sehingga batas task Celery
+# juga menjadi batas session. Lama hidup session dicatat (session_stats()) dan
+# yang melebihi DB_SESSION_WARN_SECONDS di-log beserta endpoint/task-nya.
+
+_G_KEYS = {False: "_db_session", True: "_db_session_ro"}
+_session_counters = {"opened": 0, "closed": 0, "rolled_back": 0, "long_held": 0, "seconds_total": 0.0, "seconds_max": 0.0}
+
+
+def get_db(readonly: bool = False, user_id: str = None) -> Session:
+    """
+    Session untuk app context saat ini (dibuat sekali, ditutup otomatis).
+    readonly=True: session AUTOCOMMIT yang menolak flush, untuk route GET;
+    diarahkan ke replika (DATABASE_READ_URLS) kecuali user_id baru saja menulis.
+    """
+    key = _G_KEYS[bool(readonly)]
+    s = g.get(key)
+    if s is None:
+        s = get_read_session(user_id) if readonly else get_session()
+        s.info["opened_at"] = time.perf_counter()
+        s.info["scope"] = query_stats.scope_name()
+        setattr(g, key, s)
+        with _counters_lock:
+            _session_counters["opened"] += 1
+    return s
+
+
+def close_db(exc=None) -> None:
+    """teardown_appcontext: rollback transaksi yang menggantung lalu tutup session."""
+    for key in _G_KEYS.values():
+        s = g.pop(key, None)
+        if s is None:
+            continue
+        held = time.perf_counter() - s.info.get("opened_at", time.perf_counter())
+        rolled_back = False
+        try:
+            # Session read-only AUTOCOMMIT tidak pernah punya perubahan tertunda
+            if key == _G_KEYS[False] and s.in_transaction():
+                s.rollback()
+                rolled_back = True
+        except Exception:
+            log.exception("Gagal rollback session saat teardown")
+        finally:
+            s.close()
+
+        with _counters_lock:
+            _session_counters["closed"] += 1
+            _session_counters["rolled_back"] += int(rolled_back)
+            _session_counters["seconds_total"] += held
+            _session_counters["seconds_max"] = max(_session_counters["seconds_max"], held)
+        try:
+            warn_after = float(current_app.config.get("DB_SESSION_WARN_SECONDS", 2.0))
+        except RuntimeError:
+            warn_after = 2.0
+        if held > warn_after:
+            with _counters_lock:
+                _session_counters["long_held"] += 1
+            log.warning(f"Session DB ditahan {held:.2f}s oleh {s.info.get('scope')} (ambang {warn_after}s)")
+
+
+def session_stats() -> dict:
+    with _counters_lock:
+        return dict(_session_counters)
+
+
+def init_app(app) -> None:
+    """Pasang teardown session per app context dan penghitung query."""
+    app.teardown_appcontext(close_db)
+    query_stats.init_app(app)
+
+
+def dispose_engine(close: bool = False) -> None:
+    """
+    Lepaskan pool koneksi di proses ini. Setelah fork (gunicorn worker, child
+    Celery prefork) panggil dengan close=False: koneksi milik parent tidak
+    ditutup (socket-nya masih dipakai parent), cukup dilupakan sehingga child
+    membuka koneksi baru sendiri.
+    """
+    for engine in [_engine, *(_read_engines or [])]:
+        if engine is None:
+            continue
+        try:
+            engine.dispose(close=close)
+        except TypeError:
+            # SQLAlchemy < 1.4.33 tidak punya argumen close
+            engine.pool = engine.pool.recreate()
+
+
+def _after_fork_in_child() -> None:
+    global _init_lock, _counters_lock
+    # Lock bisa saja sedang dipegang thread lain di parent saat fork
+    _init_lock = threading.Lock()
+    _counters_lock = threading.Lock()
+    for counters in (_pool_counters, _session_counters):
+        for key in counters:
+            counters[key] = 0.0 if isinstance(counters[key], float) else 0
+    _recent_writes.clear()
+    dispose_engine(close=False)
+    log.debug(f"Pool DB di-reset setelah fork (pid={os.getpid()})")
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def pool_stats() -> dict:
+    """Snapshot pool: ukuran/terpakai/overflow saat ini + counter kumulatif proses ini."""
+    with _counters_lock:
+        stats = dict(_pool_counters)
+    stats["pid"] = os.getpid()
+    stats["replicas"] = len(_read_engines or [])
+    engine = _engine
+    pool = getattr(engine, "pool", None)
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=pool.overflow(),
+        )
+    return stats
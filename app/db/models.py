@@ -116,6 +116,13 @@ class NotificationStatus(PyEnum):
     archived = "archived"
 
 
+class OutboxStatus(PyEnum):
+    pending = "pending"
+    sending = "sending"
+    sent = "sent"
+    failed = "failed"
+
+
 # ===== Models =====
 
 class Location(Base):
@@ -696,6 +703,67 @@ class Notification(Base):
     __table_args__ = (
         Index("idx_n_id_user_status_created_at", "id_user", "status", "created_at"),
         Index("idx_n_related_table_related_id", "related_table", "related_id"),
+        # Dipakai job retensi (status read/archived + created_at < cutoff)
+        Index("idx_n_status_created_at", "status", "created_at"),
+    )
+
+
+# BARU: Outbox Notifikasi
+#
+# Setiap Notification yang perlu dikirim sebagai push ditulis juga ke tabel
+# ini dengan status 'pending' di transaksi yang sama dengan perubahan data
+# (misal: check-in). Dispatcher (Celery) mengklaim baris secara batch dengan
+# SELECT ... FOR UPDATE SKIP LOCKED, mengirim FCM di luar transaksi, lalu
+# menandai 'sent' atau menjadwalkan ulang/menandai 'failed'.
+class NotificationOutbox(Base):
+    __tablename__ = "notification_outbox"
+    id_outbox = Column(CHAR(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id_notification = Column(CHAR(36), ForeignKey("notifications.id_notification", ondelete="CASCADE", onupdate="CASCADE"), nullable=False)
+    id_user = Column(CHAR(36), ForeignKey("user.id_user", ondelete="CASCADE", onupdate="CASCADE"), nullable=False)
+    event_trigger = Column(String(64), nullable=False)
+    # Data message FCM yang sudah dirender (JSON string -> dict[str, str])
+    payload_json = Column(Text, nullable=False)
+    status = Column(Enum(OutboxStatus), nullable=False, default=OutboxStatus.pending)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    available_at = Column(DateTime, nullable=False)
+    claimed_at = Column(DateTime)
+    # Token klaim per dispatch; status hanya boleh diubah pemegang lease
+    claimed_by = Column(CHAR(36))
+    sent_at = Column(DateTime)
+
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    notification = relationship("Notification")
+
+    __table_args__ = (
+        Index("idx_no_status_available_at", "status", "available_at"),
+        Index("idx_no_id_notification", "id_notification"),
+    )
+
+
+# BARU: Arsip Notifikasi
+#
+# Notifikasi yang sudah dibaca dan melewati masa retensi dipindahkan ke sini
+# oleh job retensi (notifications.purge_notifications_task) supaya tabel
+# `notifications` dan index-nya tidak terus membesar. Bentuknya ringkas:
+# tanpa data_json/seen_at/updated_at/deleted_at dan tanpa FK ke user.
+class NotificationArchive(Base):
+    __tablename__ = "notifications_archive"
+    id_notification = Column(CHAR(36), primary_key=True)
+    id_user = Column(CHAR(36), nullable=False)
+    title = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    related_table = Column(String(64))
+    related_id = Column(CHAR(36))
+    status = Column(Enum(NotificationStatus), nullable=False)
+    read_at = Column(DateTime)
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("idx_na_id_user_created_at", "id_user", "created_at"),
     )
 
 
@@ -0,0 +1,151 @@
+# app/db/query_stats.py
+"""
+Hitung statement SQL dan waktu DB per app context (request Flask / task
+Celery) lewat event before/after_cursor_execute engine.
+
+- Statement di atas DB_SLOW_QUERY_MS di-log beserta bentuk parameternya
+  (nama/tipe/jumlah baris, bukan nilainya: isinya bisa data pribadi).
+- Ringkasan per request/task di-log saat teardown; jumlah statement di atas
+  DB_QUERY_COUNT_WARN dicatat sebagai warning.
+- Header X-DB-Query-Count / X-DB-Time-ms ditambahkan bila app.debug atau
+  DB_QUERY_HEADERS aktif.
+- query_totals() berisi counter kumulatif proses untuk /health dan metrics.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Dict
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_G_KEY = "_db_query_stats"
+_totals = {"statements": 0, "seconds_total": 0.0, "slow": 0}
+_totals_lock = threading.Lock()
+_summary_hooks = []
+
+
+def _param_shape(parameters: Any, executemany: bool) -> str:
+    if executemany and isinstance(parameters, (list, tuple)):
+        first = _param_shape(parameters[0], False) if parameters else "-"
+        return f"{len(parameters)} x {first}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in sorted(parameters.items())) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(v).__name__ for v in parameters) + ")"
+    return type(parameters).__name__
+
+
+def scope_name() -> str:
+    if has_request_context():
+        # Path mentah tidak dipakai: 404/scan dan id di URL membuat label metrics tak terbatas
+        return f"{request.method} {request.endpoint or 'unmatched'}"
+    return g.get("task_name") or "app-context"
+
+
+def current_stats() -> Dict[str, Any]:
+    """Statistik app context saat ini: {count, seconds, slow}."""
+    if not has_app_context():
+        return {"count": 0, "seconds": 0.0, "slow": 0}
+    st = g.get(_G_KEY) or {"count": 0, "seconds": 0.0, "slow": 0}
+    return {"count": st["count"], "seconds": st["seconds"], "slow": st["slow"]}
+
+
+def query_totals() -> Dict[str, Any]:
+    with _totals_lock:
+        return dict(_totals)
+
+
+def instrument(engine, slow_ms: float) -> None:
+    """Pasang hook penghitung di engine (dipanggil saat engine dibuat)."""
+    slow_s = max(0.0, float(slow_ms)) / 1000.0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("_query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        slow = slow_s > 0 and elapsed >= slow_s
+
+        with _totals_lock:
+            _totals["statements"] += 1
+            _totals["seconds_total"] += elapsed
+            _totals["slow"] += int(slow)
+
+        scope = None
+        if has_app_context():
+            st = g.get(_G_KEY)
+            if st is None:
+                # Nama scope diambil sekarang: saat teardown app context,
+                # request context sudah tidak aktif
+                st = {"count": 0, "seconds": 0.0, "slow": 0, "scope": scope_name()}
+                setattr(g, _G_KEY, st)
+            st["count"] += 1
+            st["seconds"] += elapsed
+            st["slow"] += int(slow)
+            scope = st["scope"]
+
+        if slow:
+            logger.warning(
+                f"Query lambat {elapsed * 1000:.0f} ms ({scope or '-'}): "
+                f"{' '.join(statement.split())[:500]} | params={_param_shape(parameters, executemany)}"
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        # Statement gagal tidak memicu after_cursor_execute; buang waktu
+        # mulainya agar tidak terpasang ke statement berikutnya di koneksi pool ini
+        conn = exception_context.connection
+        starts = conn.info.get("_query_start") if conn is not None else None
+        if starts:
+            starts.pop()
+
+
+def _after_request(response):
+    cfg = current_app.config
+    if current_app.debug or cfg.get("DB_QUERY_HEADERS"):
+        st = current_stats()
+        response.headers["X-DB-Query-Count"] = str(st["count"])
+        response.headers["X-DB-Time-ms"] = f"{st['seconds'] * 1000:.1f}"
+    return response
+
+
+def _log_summary(exc=None) -> None:
+    st = g.pop(_G_KEY, None)
+    if not st:
+        return
+    try:
+        warn_count = int(current_app.config.get("DB_QUERY_COUNT_WARN", 50))
+    except RuntimeError:
+        warn_count = 50
+    msg = f"DB {st['scope']}: {st['count']} statement, {st['seconds'] * 1000:.1f} ms, {st['slow']} lambat"
+    if warn_count and st["count"] > warn_count:
+        logger.warning(msg)
+    else:
+        logger.debug(msg)
+    for hook in _summary_hooks:
+        try:
+            hook(st["scope"], st)
+        except Exception:
+            logger.exception("Hook ringkasan query gagal")
+
+
+def add_summary_hook(fn) -> None:
+    """fn(scope, {count, seconds, slow}) dipanggil di akhir tiap request/task (mis. metrics)."""
+    if fn not in _summary_hooks:
+        _summary_hooks.append(fn)
+
+
+def init_app(app) -> None:
+    app.after_request(_after_request)
+    app.teardown_appcontext(_log_summary)
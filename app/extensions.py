@@ -4,18 +4,25 @@ from __future__ import annotations
 
 import os
 import json
+import threading
+from datetime import datetime
 from typing import Optional
 import logging
 from insightface.app import FaceAnalysis
 
-from flask import Flask, current_app
+from flask import Flask, current_app, g
 from flask_cors import CORS
 from celery import Celery, Task
+from celery.schedules import crontab
+from kombu import Queue
 
 from supabase import create_client, Client
 import firebase_admin
 from firebase_admin import credentials
 
+from .metrics import count_token_refresh
+from .tracing import task_span
+
 # --- Windows + multiprocessing quirk ---
 if os.name == "nt":
     os.environ.setdefault("FORKED_BY_MULTIPROCESSING", "1")
@@ -23,6 +30,7 @@ if os.name == "nt":
 # --- Globals ---
 celery: Celery = Celery(__name__)
 _face_engine: Optional[FaceAnalysis] = None # <-- Kita hanya akan pakai variabel ini
+_face_engine_lock = threading.Lock()
 _supabase: Optional[Client] = None
 _firebase_app: Optional[firebase_admin.App] = None
 log = logging.getLogger(__name__)
@@ -46,9 +54,24 @@ class FlaskContextTask(Task):
                 app_obj = None
 
         if app_obj is not None:
-            with app_obj.app_context():
+            # App context baru per task: session get_db() ditutup saat task selesai
+            with app_obj.app_context(), task_span(self):
+                g.task_name = self.name
                 return self.run(*args, **kwargs)
-        return self.run(*args, **kwargs)
+        with task_span(self):
+            return self.run(*args, **kwargs)
+
+
+def _task_routes(app: Flask) -> dict:
+    """
+    Routing task per jenis beban kerja, supaya enroll (inferensi berat)
+    tidak mengantre di depan penulisan check-in/check-out.
+    """
+    return {
+        "tasks.enroll_user_task": {"queue": app.config.get("CELERY_FACE_QUEUE", "face")},
+        "absensi.*": {"queue": app.config.get("CELERY_ABSENSI_QUEUE", "absensi")},
+        "notifications.*": {"queue": app.config.get("CELERY_NOTIFICATIONS_QUEUE", "notifications")},
+    }
 
 
 def init_celery(app: Flask) -> None:
@@ -56,6 +79,14 @@ def init_celery(app: Flask) -> None:
     broker = app.config.get("CELERY_BROKER_URL")
     backend = app.config.get("CELERY_RESULT_BACKEND")
 
+    default_queue = app.config.get("CELERY_DEFAULT_QUEUE", "default")
+    queue_names = [
+        default_queue,
+        app.config.get("CELERY_FACE_QUEUE", "face"),
+        app.config.get("CELERY_ABSENSI_QUEUE", "absensi"),
+        app.config.get("CELERY_NOTIFICATIONS_QUEUE", "notifications"),
+    ]
+
     celery.conf.update(
         broker_url=broker,
         result_backend=backend,
@@ -64,38 +95,99 @@ def init_celery(app: Flask) -> None:
         result_serializer="json",
         timezone=app.config.get("TIMEZONE", "UTC"),
         enable_utc=False,
+        # Queue terpisah: face (inferensi), absensi (tulis DB), notifications (FCM).
+        # Topologi worker yang disarankan ada di celery_worker.py.
+        task_queues=[Queue(name, routing_key=name) for name in dict.fromkeys(queue_names)],
+        task_default_queue=default_queue,
+        task_routes=_task_routes(app),
+        # Prefetch kecil agar task panjang (enroll) tidak "ditimbun" satu child
+        # sementara child lain menganggur. Bisa dioverride per worker via
+        # --prefetch-multiplier.
+        worker_prefetch_multiplier=int(app.config.get("CELERY_WORKER_PREFETCH_MULTIPLIER", 1)),
+        # Jalankan: celery -A celery_worker:app beat
+        beat_schedule={
+            "notifications-dispatch-outbox": {
+                "task": "notifications.dispatch_outbox_task",
+                "schedule": float(app.config.get("NOTIF_OUTBOX_POLL_SECONDS", 15)),
+            },
+            "notifications-purge-retention": {
+                "task": "notifications.purge_notifications_task",
+                "schedule": crontab(hour=int(app.config.get("NOTIF_RETENTION_HOUR", 2)), minute=30),
+            },
+        },
     )
 
     celery.Task = FlaskContextTask
     FlaskContextTask.flask_app = app
 
+    from .metrics import init_celery_metrics  # hindari import melingkar
+
+    init_celery_metrics()
+
 
 # -------------------------
 # Face engine (insightface)
 # -------------------------
+def _ort_session_options(app=None):
+    """
+    SessionOptions onnxruntime dengan batas thread dari config.
+    Dengan prefork N child di mesin C core, tiap child idealnya memakai ~C/N
+    thread agar tidak saling berebut core (oversubscription).
+    Return None bila tidak ada batas yang di-set (pakai default ORT).
+    """
+    cfg = app.config if app is not None else {}
+    intra = int(cfg.get("FACE_ORT_INTRA_OP_THREADS", 0) or 0)
+    inter = int(cfg.get("FACE_ORT_INTER_OP_THREADS", 0) or 0)
+    if not intra and not inter:
+        return None
+
+    import onnxruntime as ort
+
+    opts = ort.SessionOptions()
+    if intra:
+        opts.intra_op_num_threads = intra
+    if inter:
+        opts.inter_op_num_threads = inter
+    return opts
+
+
 def init_face_engine(app=None):
     """
-    Inisialisasi global face_engine sekali saja.
+    Inisialisasi global face_engine sekali saja (per proses).
     Argumen 'app' opsional agar kompatibel dengan pemanggilan lama/baru.
+    Aman dipanggil dari banyak thread (pool threads): hanya satu yang memuat model.
     """
     global _face_engine  # <-- DIUBAH: Menggunakan _face_engine
     if _face_engine is not None:
         return _face_engine
 
-    try:
-        providers = ["CPUExecutionProvider"]
-        model_name = "buffalo_s"
-        det_size = (640, 640)
-
-        engine = FaceAnalysis(name=model_name, providers=providers)
-        engine.prepare(ctx_id=0, det_size=det_size)
+    with _face_engine_lock:
+        if _face_engine is not None:
+            return _face_engine
 
-        _face_engine = engine  # <-- DIUBAH: Menyimpan ke _face_engine
-        log.info("InsightFace initialized: name=%s providers=%s", model_name, providers)
-        return _face_engine
-    except Exception as e:
-        log.warning("InsightFace init failed: %s", e)
-        return None
+        try:
+            providers = ["CPUExecutionProvider"]
+            model_name = "buffalo_s"
+            det_size = (640, 640)
+
+            kwargs = {}
+            sess_options = _ort_session_options(app)
+            if sess_options is not None:
+                kwargs["sess_options"] = sess_options
+
+            engine = FaceAnalysis(name=model_name, providers=providers, **kwargs)
+            engine.prepare(ctx_id=0, det_size=det_size)
+
+            _face_engine = engine  # <-- DIUBAH: Menyimpan ke _face_engine
+            log.info(
+                "InsightFace initialized: name=%s providers=%s pid=%s intra_op_threads=%s",
+                model_name, providers, os.getpid(),
+                getattr(sess_options, "intra_op_num_threads", "default"),
+            )
+            return _face_engine
+        except Exception as e:
+            log.warning("InsightFace init failed: %s", e)
+            return None
 
 def get_face_engine() -> FaceAnalysis:
     """Lazy getter: kalau belum ada, coba init dari current_app."""
@@ -143,51 +235,199 @@ def get_supabase() -> Optional[Client]:
     return _supabase
 
 
+# -------------------------
+# Redis (cache bersama API & worker)
+# -------------------------
+_redis = None
+_redis_resolved = False
+_redis_lock = threading.Lock()
+
+
+def get_redis():
+    """
+    Client Redis bersama (lazy). URL dari REDIS_URL, atau CELERY_BROKER_URL
+    bila broker-nya Redis. None jika tidak tersedia; pemanggil wajib punya
+    fallback (cache hanya optimasi).
+    """
+    global _redis, _redis_resolved
+    if _redis_resolved:
+        return _redis
+
+    with _redis_lock:
+        if _redis_resolved:
+            return _redis
+        try:
+            cfg = current_app.config
+        except RuntimeError:
+            cfg = {}
+        url = cfg.get("REDIS_URL") or os.getenv("REDIS_URL")
+        if not url:
+            broker = cfg.get("CELERY_BROKER_URL") or ""
+            url = broker if broker.startswith(("redis://", "rediss://")) else None
+        if url:
+            try:
+                import redis
+
+                _redis = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+                log.info("Redis cache client initialized.")
+            except Exception as e:
+                _redis = None
+                log.warning(f"Redis tidak tersedia untuk cache: {e}")
+        _redis_resolved = True
+    return _redis
+
+
 # -------------------------
 # Firebase Admin
 # -------------------------
-def init_firebase(app: Flask) -> None:
-    """Inisialisasi Firebase Admin dari variabel lingkungan."""
-    global _firebase_app
-    if _firebase_app is not None or firebase_admin._apps:
-        return
+# Satu App Firebase per proses (API maupun worker Celery). Kredensial hanya
+# di-resolve sekali: hasil gagal pun di-cache supaya jalur kirim notifikasi
+# tidak memeriksa env/berkas berulang-ulang.
+_firebase_lock = threading.Lock()
+_firebase_resolved = False
+_firebase_token_lock = threading.Lock()
+_firebase_stats = {
+    "initialized": False,
+    "credential_source": None,
+    "token_refreshes": 0,
+    "token_refresh_failures": 0,
+    "token_cache_hits": 0,
+    "token_expires_at": None,
+}
+
+_FIREBASE_DEFAULT_FILES = ("e-hrm-1e3e0-firebase-adminsdk-fbsvc-d9feba4316.json",)
+
+
+def _firebase_setting(name: str, app: Optional[Flask]) -> Optional[str]:
+    if app is not None and app.config.get(name):
+        return app.config.get(name)
+    return os.getenv(name)
+
+
+def _resolve_firebase_credential(app: Optional[Flask]):
+    """Cari kredensial: config/env terpisah -> GOOGLE_APPLICATION_CREDENTIALS -> berkas default."""
+    project_id = _firebase_setting("FIREBASE_PROJECT_ID", app)
+    client_email = _firebase_setting("FIREBASE_CLIENT_EMAIL", app)
+    private_key = _firebase_setting("FIREBASE_PRIVATE_KEY", app)
+
+    log.info(f"Firebase Init Check: project_id is {'present' if project_id else 'missing'}")
+    log.info(f"Firebase Init Check: client_email is {'present' if client_email else 'missing'}")
+    log.info(f"Firebase Init Check: private_key is {'present' if private_key else 'missing'}")
+
+    if all([project_id, client_email, private_key]):
+        cred_dict = {
+            "type": "service_account",
+            "project_id": project_id,
+            "private_key": private_key.replace('\\n', '\n'),
+            "client_email": client_email,
+            "token_uri": "https://oauth2.googleapis.com/token",
+        }
+        return credentials.Certificate(cred_dict), "env"
+
+    cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+    if cred_path:
+        if os.path.exists(cred_path):
+            return credentials.Certificate(cred_path), "GOOGLE_APPLICATION_CREDENTIALS"
+        log.warning(f"GOOGLE_APPLICATION_CREDENTIALS menunjuk ke file yang tidak ada: {cred_path}")
+
+    here = os.path.dirname(__file__)
+    for base in (here, os.path.abspath(os.path.join(here, ".."))):
+        for name in _FIREBASE_DEFAULT_FILES:
+            candidate = os.path.join(base, name)
+            if os.path.exists(candidate):
+                return credentials.Certificate(candidate), candidate
+    return None, None
+
+
+def get_firebase_app(app: Optional[Flask] = None) -> Optional[firebase_admin.App]:
+    """
+    App Firebase default (lazy, thread-safe). None jika kredensial tidak
+    tersedia; percobaan inisialisasi hanya dilakukan sekali per proses.
+    """
+    global _firebase_app, _firebase_resolved
+    if _firebase_resolved:
+        return _firebase_app
+
+    with _firebase_lock:
+        if _firebase_resolved:
+            return _firebase_app
+        if app is None:
+            try:
+                app = current_app._get_current_object()
+            except RuntimeError:
+                app = None
+        try:
+            if firebase_admin._apps:
+                _firebase_app = firebase_admin.get_app()
+                _firebase_stats["credential_source"] = "existing"
+            else:
+                cred, source = _resolve_firebase_credential(app)
+                if cred is not None:
+                    _firebase_app = firebase_admin.initialize_app(cred)
+                    _firebase_stats["credential_source"] = source
+                    log.info(f"Firebase Admin SDK initialized (source={source}).")
+                else:
+                    log.warning("No valid Firebase credentials found; push notification dinonaktifkan.")
+        except Exception as e:
+            _firebase_app = None
+            log.error(f"Error initializing Firebase Admin SDK: {e}", exc_info=True)
+        _firebase_stats["initialized"] = _firebase_app is not None
+        _firebase_resolved = True
+    return _firebase_app
+
+
+def get_fcm_access_token() -> str:
+    """
+    OAuth2 access token untuk FCM HTTP v1, di-cache sampai mendekati
+    kedaluwarsa (FIREBASE_TOKEN_REFRESH_MARGIN detik). Memakai credential
+    yang sama dengan SDK sehingga refresh di satu jalur berlaku untuk keduanya.
+    """
+    fb_app = get_firebase_app()
+    if fb_app is None:
+        raise RuntimeError("Firebase belum terinisialisasi; access token tidak tersedia.")
 
-    cred = None
     try:
-        # Prioritas 1: Menggunakan variabel lingkungan terpisah dari app.config
-        project_id = app.config.get('FIREBASE_PROJECT_ID')
-        client_email = app.config.get('FIREBASE_CLIENT_EMAIL')
-        private_key = app.config.get('FIREBASE_PRIVATE_KEY')
-
-        # === LOGGING UNTUK DEBUGGING ===
-        log.info(f"Firebase Init Check: project_id is {'present' if project_id else 'missing'}")
-        log.info(f"Firebase Init Check: client_email is {'present' if client_email else 'missing'}")
-        log.info(f"Firebase Init Check: private_key is {'present' if private_key else 'missing'}")
-        # ===============================
-
-        if all([project_id, client_email, private_key]):
-            private_key_formatted = private_key.replace('\\n', '\n')
-            cred_dict = {
-                "type": "service_account",
-                "project_id": project_id,
-                "private_key": private_key_formatted,
-                "client_email": client_email,
-                "token_uri": "https://oauth2.googleapis.com/token",
-            }
-            cred = credentials.Certificate(cred_dict)
-            app.logger.info("Memuat kredensial Firebase dari variabel lingkungan.")
-        else:
-            app.logger.warning("Satu atau lebih variabel lingkungan Firebase (PROJECT_ID, CLIENT_EMAIL, PRIVATE_KEY) tidak ditemukan di app.config.")
-
-        # Inisialisasi aplikasi jika kredensial berhasil didapatkan
-        if cred:
-            _firebase_app = firebase_admin.initialize_app(cred)
-            app.logger.info("Firebase Admin SDK initialized.")
-        else:
-            app.logger.warning("No valid Firebase credentials found; Firebase not initialized.")
+        margin = float(current_app.config.get("FIREBASE_TOKEN_REFRESH_MARGIN", 300))
+    except RuntimeError:
+        margin = 300.0
+
+    g_cred = fb_app.credential.get_credential()
+
+    def _fresh() -> bool:
+        expiry = getattr(g_cred, "expiry", None)  # naive UTC (google-auth)
+        if not g_cred.token or expiry is None:
+            return False
+        return (expiry - datetime.utcnow()).total_seconds() > margin
+
+    if _fresh():
+        _firebase_stats["token_cache_hits"] += 1
+        return g_cred.token
+
+    with _firebase_token_lock:
+        if _fresh():
+            _firebase_stats["token_cache_hits"] += 1
+            return g_cred.token
+        try:
+            info = fb_app.credential.get_access_token()  # memaksa refresh
+        except Exception:
+            _firebase_stats["token_refresh_failures"] += 1
+            count_token_refresh(False)
+            raise
+        _firebase_stats["token_refreshes"] += 1
+        count_token_refresh(True)
+        _firebase_stats["token_expires_at"] = info.expiry.isoformat() if info.expiry else None
+        log.info(f"FCM access token di-refresh (berlaku s/d {_firebase_stats['token_expires_at']}).")
+        return info.access_token
 
-    except Exception as e:
-        app.logger.error(f"Error initializing Firebase Admin SDK: {e}", exc_info=True)
+
+def firebase_stats() -> dict:
+    """Snapshot status Firebase + cache access token (untuk /health dan metrics)."""
+    return dict(_firebase_stats)
+
+
+def init_firebase(app: Flask) -> None:
+    """Inisialisasi Firebase Admin dari konfigurasi (idempotent)."""
+    get_firebase_app(app)
 
 
 # -------------------------
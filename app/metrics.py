@@ -0,0 +1,282 @@
+# app/metrics.py
+"""
+Metrics Prometheus (GET /metrics).
+
+- HTTP      : latency per route (blueprint endpoint), method, status
+- Face      : durasi decode dan detect+embed (FaceAnalysis.get)
+- Storage   : latency operasi storage per backend & hasil
+- DB        : pool (ukuran/terpakai/overflow/timeout) dan statement per request/task
+- Celery    : durasi task per state, kedalaman queue broker (Redis)
+- Notifikasi: hasil kirim FCM per kode, hasil outbox, refresh token Firebase
+
+Aman untuk gunicorn multi-worker: bila PROMETHEUS_MULTIPROC_DIR di-set
+(direktori kosong, sama untuk semua worker gunicorn/Celery di host itu),
+/metrics menggabungkan nilai semua proses lewat MultiProcessCollector.
+Tanpa paket prometheus_client semua fungsi di sini menjadi no-op.
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable
+
+from flask import Flask, Response, current_app, request
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+        multiprocess,
+    )
+except ImportError:  # pragma: no cover - paket opsional
+    Counter = Gauge = Histogram = None
+
+ENABLED = Counter is not None
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+_FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+_COUNT_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200, 500)
+
+
+def _gauge(name: str, doc: str, labels: Iterable[str] = (), mode: str = "livesum"):
+    # multiprocess_mode hanya berpengaruh bila PROMETHEUS_MULTIPROC_DIR aktif
+    return Gauge(name, doc, list(labels), multiprocess_mode=mode)
+
+
+if ENABLED:
+    HTTP_LATENCY = Histogram(
+        "http_request_duration_seconds", "Latency request HTTP",
+        ["method", "endpoint", "status"], buckets=_FAST_BUCKETS,
+    )
+    FACE_STAGE = Histogram(
+        "face_stage_duration_seconds", "Durasi tahap pipeline wajah",
+        ["stage"], buckets=_FAST_BUCKETS,
+    )
+    STORAGE_LATENCY = Histogram(
+        "storage_operation_duration_seconds", "Latency operasi storage",
+        ["backend", "op", "outcome"], buckets=_FAST_BUCKETS,
+    )
+    DB_STATEMENTS = Histogram(
+        "db_statements_per_unit", "Jumlah statement SQL per request/task",
+        ["scope"], buckets=_COUNT_BUCKETS,
+    )
+    DB_TIME = Histogram(
+        "db_time_per_unit_seconds", "Total waktu DB per request/task",
+        ["scope"], buckets=_FAST_BUCKETS,
+    )
+    DB_POOL = _gauge("db_pool_connections", "Koneksi pool DB per state", ["state"])
+    DB_POOL_TIMEOUTS = Counter("db_pool_checkout_timeouts", "Checkout pool DB yang timeout")
+    CELERY_TASK = Histogram(
+        "celery_task_duration_seconds", "Durasi task Celery",
+        ["task", "state"], buckets=_SLOW_BUCKETS,
+    )
+    CELERY_QUEUE_DEPTH = _gauge("celery_queue_depth", "Pesan menunggu di queue broker", ["queue"], mode="mostrecent")
+    FCM_SENT = Counter("fcm_messages_total", "Pesan FCM terkirim per hasil", ["transport", "result"])
+    OUTBOX = Counter("notification_outbox_total", "Hasil dispatch outbox notifikasi", ["outcome"])
+    FIREBASE_TOKEN = Counter("firebase_token_refreshes", "Refresh access token Firebase per hasil", ["result"])
+
+
+# ---------- Helper instrumentasi ----------
+
+@contextmanager
+def time_face(stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if ENABLED:
+            FACE_STAGE.labels(stage).observe(time.perf_counter() - t0)
+
+
+def timed_storage(op: str, backend: str = "supabase"):
+    """Decorator: catat latency operasi storage (outcome ok/error)."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            outcome = "error"
+            try:
+                result = fn(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                if ENABLED:
+                    STORAGE_LATENCY.labels(backend, op, outcome).observe(time.perf_counter() - t0)
+        return wrapper
+    return deco
+
+
+def observe_fcm(transport: str, results: Iterable[Any]) -> None:
+    """results: list _SendResult (success, error_code)."""
+    if not ENABLED:
+        return
+    counts: Dict[str, int] = {}
+    for r in results:
+        key = "success" if r.success else (r.error_code or "UNKNOWN")
+        counts[key] = counts.get(key, 0) + 1
+    for key, n in counts.items():
+        FCM_SENT.labels(transport, key).inc(n)
+
+
+def observe_outbox(stats: Dict[str, int]) -> None:
+    if not ENABLED:
+        return
+    for outcome in ("sent", "retry", "failed", "lost"):
+        if stats.get(outcome):
+            OUTBOX.labels(outcome).inc(stats[outcome])
+
+
+def count_pool_timeout() -> None:
+    if ENABLED:
+        DB_POOL_TIMEOUTS.inc()
+
+
+def count_token_refresh(ok: bool) -> None:
+    if ENABLED:
+        FIREBASE_TOKEN.labels("ok" if ok else "failed").inc()
+
+
+def observe_db_unit(scope: str, stats: Dict[str, Any]) -> None:
+    """Hook ringkasan query_stats per request/task."""
+    if not ENABLED:
+        return
+    DB_STATEMENTS.labels(scope).observe(stats["count"])
+    DB_TIME.labels(scope).observe(stats["seconds"])
+
+
+# ---------- Gauge per proses ----------
+
+_gauges_lock = threading.Lock()
+_gauges_at = 0.0
+
+
+def update_process_gauges(force: bool = False) -> None:
+    """Salin pool_stats ke gauge (paling sering sekali per detik)."""
+    global _gauges_at
+    if not ENABLED:
+        return
+    now = time.monotonic()
+    if not force and now - _gauges_at < 1.0:
+        return
+    with _gauges_lock:
+        _gauges_at = now
+    from .db import pool_stats
+
+    ps = pool_stats()
+    for state in ("size", "checked_out", "checked_in", "overflow"):
+        if state in ps:
+            DB_POOL.labels(state).set(ps[state])
+
+
+_broker_client = None
+
+
+def _update_queue_depths(app: Flask) -> None:
+    """Kedalaman queue dibaca langsung dari broker Redis (LLEN per queue)."""
+    global _broker_client
+    broker = str(app.config.get("CELERY_BROKER_URL") or "")
+    if not broker.startswith("redis"):
+        return
+    queues = sorted({
+        app.config.get(name, default)
+        for name, default in (
+            ("CELERY_FACE_QUEUE", "face"),
+            ("CELERY_ABSENSI_QUEUE", "absensi"),
+            ("CELERY_NOTIFICATIONS_QUEUE", "notifications"),
+            ("CELERY_DEFAULT_QUEUE", "default"),
+        )
+    })
+    try:
+        if _broker_client is None:
+            import redis
+
+            _broker_client = redis.Redis.from_url(broker, socket_timeout=0.5, socket_connect_timeout=0.5)
+        for q in queues:
+            CELERY_QUEUE_DEPTH.labels(q).set(_broker_client.llen(q))
+    except Exception as e:
+        logger.debug(f"Gagal membaca kedalaman queue: {e}")
+
+
+# ---------- Flask ----------
+
+def _before_request():
+    request.environ["metrics.start"] = time.perf_counter()
+
+
+def _after_request(response):
+    t0 = request.environ.get("metrics.start")
+    if t0 is not None:
+        endpoint = request.endpoint or "unmatched"
+        HTTP_LATENCY.labels(request.method, endpoint, str(response.status_code)).observe(time.perf_counter() - t0)
+    update_process_gauges()
+    return response
+
+
+def _metrics_view():
+    if not ENABLED:
+        return Response("prometheus_client tidak terpasang\n", status=503, mimetype="text/plain")
+    update_process_gauges(force=True)
+    _update_queue_depths(current_app)
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        data = generate_latest(registry)
+    else:
+        data = generate_latest()
+    return Response(data, mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app: Flask) -> None:
+    """Pasang timing request dan route /metrics (METRICS_ENABLED)."""
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    if not ENABLED:
+        logger.info("prometheus_client tidak terpasang; /metrics tidak aktif.")
+    else:
+        from .db import query_stats
+
+        app.before_request(_before_request)
+        app.after_request(_after_request)
+        query_stats.add_summary_hook(observe_db_unit)
+    app.add_url_rule("/metrics", "metrics", _metrics_view, methods=["GET"])
+
+
+# ---------- Celery ----------
+
+_task_started: Dict[str, float] = {}
+
+
+def init_celery_metrics() -> None:
+    """Hubungkan signal Celery untuk durasi task (dipanggil dari extensions.init_celery)."""
+    if not ENABLED:
+        return
+    from celery import signals
+
+    @signals.task_prerun.connect(weak=False)
+    def _task_prerun(task_id=None, **kwargs):
+        _task_started[task_id] = time.perf_counter()
+
+    @signals.task_postrun.connect(weak=False)
+    def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+        t0 = _task_started.pop(task_id, None)
+        if t0 is not None:
+            CELERY_TASK.labels(getattr(task, "name", "unknown"), state or "UNKNOWN").observe(time.perf_counter() - t0)
+        update_process_gauges()
+
+
+def mark_process_dead(pid: int) -> None:
+    """Dipanggil gunicorn child_exit: buang file metrics gauge live* worker yang mati."""
+    if ENABLED and MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
@@ -12,10 +12,11 @@ import cv2
 from werkzeug.datastructures import FileStorage
 
 from ..extensions import get_face_engine, celery
-from .storage.supabase_storage import upload_bytes, signed_url, download, list_objects
-from ..db import get_session
+from ..metrics import time_face
+from ..tracing import traced
+from .storage import upload_bytes, signed_url, download, list_objects
 from ..db.models import User
-from .notification_service import send_notification
+from ..tasks.notification_tasks import enqueue_notification
 
 
 logger = logging.getLogger(__name__)
@@ -52,6 +53,7 @@ def _is_match(score: float, metric: str, threshold: float) -> bool:
         return False
 
 
+@traced("face.decode_image")
 def decode_image(file_or_bytes: Union[FileStorage, bytes, bytearray, np.ndarray]) -> np.ndarray:
     """Terima FileStorage (Flask upload), bytes (dari Supabase), atau ndarray.
     Return BGR ndarray untuk konsumsi OpenCV/insightface.
@@ -59,10 +61,12 @@ def decode_image(file_or_bytes: Union[FileStorage, bytes, bytearray, np.ndarray]
     if isinstance(file_or_bytes, np.ndarray):
         img = file_or_bytes
     elif isinstance(file_or_bytes, (bytes, bytearray)):
-        img = cv2.imdecode(np.frombuffer(file_or_bytes, np.uint8), cv2.IMREAD_COLOR)
+        with time_face("decode"):
+            img = cv2.imdecode(np.frombuffer(file_or_bytes, np.uint8), cv2.IMREAD_COLOR)
     elif isinstance(file_or_bytes, FileStorage):
         data = file_or_bytes.read()
-        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        with time_face("decode"):
+            img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
     else:
         raise TypeError(f"Tipe tidak didukung untuk decode_image: {type(file_or_bytes)}")
 
@@ -71,11 +75,14 @@ def decode_image(file_or_bytes: Union[FileStorage, bytes, bytearray, np.ndarray]
     return img
 
 
+@traced("face.get_embedding")
 def get_embedding(img: np.ndarray) -> np.ndarray | None:
     """Ambil embedding wajah pertama yang terdeteksi. Return None jika tidak ada wajah."""
     # Pastikan engine ada; lazy init akan berjalan bila belum ada.
     engine = get_face_engine()
-    faces = engine.get(img)  # insightface.FaceAnalysis
+    # FaceAnalysis.get menjalankan deteksi + embedding sekaligus
+    with time_face("detect_embed"):
+        faces = engine.get(img)  # insightface.FaceAnalysis
     if not faces:
         return None
     # Ambil wajah terbesar / yang pertama
@@ -136,18 +143,9 @@ def enroll_user_task(user_id: str, user_name: str, images_data: List[bytes]):
         upload_bytes(emb_key, emb_io.getvalue(), "application/octet-stream")
         logger.info(f"Embedding berhasil disimpan di {emb_key}")
 
-        # Kirim notifikasi sukses
-        try:
-            with get_session() as s:
-                send_notification(
-                    event_trigger="FACE_REGISTRATION_SUCCESS",
-                    user_id=user_id,
-                    dynamic_data={"nama_karyawan": user_name},
-                    session=s,
-                )
-                logger.info(f"Notifikasi sukses dikirim ke user {user_id}")
-        except Exception as e:
-            logger.warning(f"Gagal mengirim notifikasi sukses: {e}", exc_info=True)
+        # Kirim notifikasi sukses (diproses worker queue 'notifications')
+        enqueue_notification("FACE_REGISTRATION_SUCCESS", user_id, {"nama_karyawan": user_name})
+        logger.info(f"Notifikasi sukses di-enqueue untuk user {user_id}")
 
         return {
             "status": "success",
@@ -0,0 +1,284 @@
+# app/services/fcm_transport.py
+"""
+Transport FCM HTTP v1 berbasis httpx.AsyncClient (HTTP/2, koneksi dipakai ulang).
+
+Jalur SDK (messaging.send_each) mengirim satu request HTTP per token secara
+serial di versi tertentu. Transport ini mengirim semua pesan satu batch secara
+konkuren melalui satu client yang hidup sepanjang proses (event loop di thread
+latar), dengan:
+  - batas konkurensi (FCM_HTTP_CONCURRENCY),
+  - rate limit token-bucket (FCM_RATE_LIMIT_PER_SEC, 0 = tanpa batas),
+  - retry dengan full jitter untuk 429/5xx/kesalahan jaringan (menghormati Retry-After).
+
+FCM_API_BASE_URL bisa diarahkan ke server FCM palsu lokal
+(python -m benchmarks.fake_fcm) untuk uji dan benchmark.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+FCM_API_BASE_URL = "https://fcm.googleapis.com"
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+# (success, error_code, error_message)
+SendOutcome = Tuple[bool, Optional[str], Optional[str]]
+
+
+class TokenBucket:
+    """Rate limiter token-bucket untuk asyncio (rate token/detik, kapasitas burst)."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, self.rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self.rate
+            await asyncio.sleep(wait)
+
+
+def _parse_error(resp: httpx.Response) -> Tuple[str, str]:
+    """Ambil kode error FCM (mis. UNREGISTERED) dari body error API v1."""
+    try:
+        err = resp.json().get("error", {}) or {}
+    except ValueError:
+        return f"HTTP_{resp.status_code}", resp.text[:200]
+    for d in err.get("details") or []:
+        if isinstance(d, dict) and d.get("errorCode"):
+            return str(d["errorCode"]), str(err.get("message") or "")
+    return str(err.get("status") or f"HTTP_{resp.status_code}"), str(err.get("message") or "")
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class FcmHttpTransport:
+    """
+    Kirim data message ke FCM HTTP v1. Aman dipakai dari banyak thread;
+    event loop + client dibuat ulang otomatis setelah fork (pid berubah).
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        access_token: Callable[[], str],
+        base_url: str = FCM_API_BASE_URL,
+        concurrency: int = 64,
+        rate_per_sec: float = 0.0,
+        max_retries: int = 4,
+        timeout: float = 10.0,
+        http2: bool = True,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 30.0,
+    ):
+        self.project_id = project_id
+        self.access_token = access_token
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = max(1, int(concurrency))
+        self.rate_per_sec = float(rate_per_sec)
+        self.max_retries = max(0, int(max_retries))
+        self.timeout = float(timeout)
+        self.http2 = http2
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+        self.stats = {"requests": 0, "sent": 0, "failed": 0, "retries": 0}
+
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._bucket: Optional[TokenBucket] = None
+
+    # ---------- event loop latar ----------
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None and self._pid == os.getpid():
+            return self._loop
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="fcm-transport", daemon=True).start()
+                self._loop, self._pid = loop, os.getpid()
+                self._client, self._bucket = None, None
+        return self._loop
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Hanya dipanggil di thread event loop
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            try:
+                self._client = httpx.AsyncClient(http2=self.http2, limits=limits, timeout=self.timeout)
+            except ImportError:
+                logger.warning("Paket 'h2' tidak terpasang; FCM transport memakai HTTP/1.1.")
+                self._client = httpx.AsyncClient(http2=False, limits=limits, timeout=self.timeout)
+        if self._bucket is None:
+            self._bucket = TokenBucket(self.rate_per_sec)
+        return self._client
+
+    def close(self) -> None:
+        loop = self._loop
+        if loop is None or self._pid != os.getpid():
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+        self._loop, self._client, self._bucket = None, None, None
+
+    # ---------- pengiriman ----------
+
+    def send(self, messages: Sequence[Tuple[str, Dict[str, str]]]) -> List[SendOutcome]:
+        """
+        Kirim [(token, data), ...]; blok sampai semua selesai.
+        Return satu SendOutcome per pesan dengan urutan yang sama.
+        """
+        if not messages:
+            return []
+        # Ambil access token di thread pemanggil (bisa memicu refresh OAuth yang blocking)
+        token = self.access_token()
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._send_all(list(messages), token), loop)
+        return future.result()
+
+    async def _send_all(self, messages: List[Tuple[str, Dict[str, str]]], access_token: str) -> List[SendOutcome]:
+        client = self._get_client()
+        url = f"{self.base_url}/v1/projects/{self.project_id}/messages:send"
+        headers = {"Authorization": f"Bearer {access_token}"}
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one(fcm_token: str, data: Dict[str, str]) -> SendOutcome:
+            async with sem:
+                return await self._send_one(client, url, headers, fcm_token, data)
+
+        return list(await asyncio.gather(*(one(t, d) for t, d in messages)))
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        # Full jitter: acak di [0, min(cap, base * 2^attempt)]
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_cap))
+        return delay
+
+    async def _send_one(self, client: httpx.AsyncClient, url: str, headers: Dict[str, str],
+                        fcm_token: str, data: Dict[str, str]) -> SendOutcome:
+        body = {
+            "message": {
+                "token": fcm_token,
+                "data": data,
+                "android": {"priority": "high"},
+                "apns": {"payload": {"aps": {"content-available": 1}}},
+            }
+        }
+        attempt = 0
+        while True:
+            await self._bucket.acquire()
+            self.stats["requests"] += 1
+            status: Optional[int] = None
+            retry_after: Optional[float] = None
+            try:
+                resp = await client.post(url, headers=headers, json=body)
+            except httpx.TransportError as e:
+                code, msg = "UNAVAILABLE", f"{type(e).__name__}: {e}"
+            else:
+                if resp.status_code == 200:
+                    self.stats["sent"] += 1
+                    return True, None, None
+                status = resp.status_code
+                code, msg = _parse_error(resp)
+                retry_after = _retry_after(resp)
+
+            if (status is None or status in RETRYABLE_STATUS) and attempt < self.max_retries:
+                attempt += 1
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+                continue
+
+            self.stats["failed"] += 1
+            return False, code, msg
+
+
+# ---------- singleton per proses ----------
+
+_transport: Optional[FcmHttpTransport] = None
+_transport_key: Optional[tuple] = None
+_transport_lock = threading.Lock()
+
+
+def _firebase_token_provider() -> Callable[[], str]:
+    from ..extensions import get_fcm_access_token  # token OAuth di-cache per proses
+
+    return get_fcm_access_token
+
+
+def _firebase_project_id() -> Optional[str]:
+    from ..extensions import get_firebase_app
+
+    fb_app = get_firebase_app()
+    return fb_app.project_id if fb_app is not None else None
+
+
+def get_http_transport(config) -> FcmHttpTransport:
+    """Transport bersama per proses, dibuat dari app.config (dibuat ulang bila config berubah)."""
+    global _transport, _transport_key
+
+    override = config.get("FCM_ACCESS_TOKEN_OVERRIDE") or None
+    project_id = config.get("FIREBASE_PROJECT_ID") or _firebase_project_id()
+    key = (
+        project_id,
+        config.get("FCM_API_BASE_URL") or FCM_API_BASE_URL,
+        int(config.get("FCM_HTTP_CONCURRENCY", 64)),
+        float(config.get("FCM_RATE_LIMIT_PER_SEC", 0)),
+        int(config.get("FCM_MAX_RETRIES", 4)),
+        float(config.get("FCM_HTTP_TIMEOUT", 10)),
+        bool(override),
+    )
+    if _transport is not None and _transport_key == key:
+        return _transport
+
+    with _transport_lock:
+        if _transport is None or _transport_key != key:
+            if not project_id:
+                raise RuntimeError("FIREBASE_PROJECT_ID tidak diketahui; FCM HTTP transport tidak bisa dipakai.")
+            if _transport is not None:
+                _transport.close()
+            _transport = FcmHttpTransport(
+                project_id=project_id,
+                access_token=(lambda: override) if override else _firebase_token_provider(),
+                base_url=key[1],
+                concurrency=key[2],
+                rate_per_sec=key[3],
+                max_retries=key[4],
+                timeout=key[5],
+            )
+            _transport_key = key
+    return _transport
@@ -0,0 +1,354 @@
+# app/services/location_index.py
+"""
+Index spasial in-memory untuk tabel location.
+
+Lokasi kantor diubah ke titik (x, y, z) di unit sphere lalu disimpan di
+KD-tree 3 dimensi. Jarak chord di sphere naik monoton terhadap jarak
+great-circle, sehingga k-nearest dan query radius bisa dipangkas di tree
+(O(log n) per query) tanpa menghitung haversine ke semua lokasi. Jarak yang
+dikembalikan tetap jarak haversine (haversine_many, tervektorisasi).
+
+Snapshot yang sama juga menjadi cache lokasi per id (termasuk yang sudah
+dihapus, dengan flag deleted) untuk validasi geofence check-in/check-out,
+sehingga validasi tersebut murni in-memory selama cache masih segar.
+
+Index dibangun ulang bila versi tabel (count, max(updated_at),
+max(deleted_at)) berubah, dicek paling sering sekali per
+LOCATION_INDEX_TTL detik, atau setelah invalidate_location_index().
+"""
+
+from __future__ import annotations
+
+import bisect
+import heapq
+import logging
+import math
+import threading
+import time
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..db import get_read_session
+from ..db.models import Location
+from ..utils.geo import haversine_many, meters_to_chord, to_unit_xyz
+
+logger = logging.getLogger(__name__)
+
+
+class LocationEntry(NamedTuple):
+    id_location: str
+    nama_kantor: str
+    latitude: float
+    longitude: float
+    radius: Optional[int]
+    deleted: bool = False
+
+    def to_dict(self) -> dict:
+        return {
+            "id_location": self.id_location,
+            "nama_kantor": self.nama_kantor,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "radius": self.radius,
+        }
+
+
+_Point = Tuple[float, float, float]
+# Batas jumlah hasil pencarian 'contains' yang di-memo per snapshot
+_SEARCH_CACHE_MAX = 256
+
+
+class _KDTree:
+    """KD-tree 3D statis. Node: (index titik, axis, kiri, kanan)."""
+
+    __slots__ = ("points", "root")
+
+    def __init__(self, points: List[_Point]):
+        self.points = points
+        self.root = self._build(list(range(len(points))), 0)
+
+    def _build(self, idxs: List[int], depth: int):
+        if not idxs:
+            return None
+        axis = depth % 3
+        idxs.sort(key=lambda i: self.points[i][axis])
+        mid = len(idxs) // 2
+        return (
+            idxs[mid],
+            axis,
+            self._build(idxs[:mid], depth + 1),
+            self._build(idxs[mid + 1:], depth + 1),
+        )
+
+    def nearest(self, q: _Point, k: int, max_d2: float = math.inf) -> List[Tuple[float, int]]:
+        """k titik terdekat dengan jarak kuadrat <= max_d2; [(d2, idx)] urut naik."""
+        heap: List[Tuple[float, int]] = []  # max-heap lewat nilai negatif
+        points = self.points
+
+        def bound() -> float:
+            return max_d2 if len(heap) < k else min(max_d2, -heap[0][0])
+
+        def visit(node) -> None:
+            if node is None:
+                return
+            idx, axis, left, right = node
+            p = points[idx]
+            d2 = (p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 + (p[2] - q[2]) ** 2
+            if d2 <= bound():
+                if len(heap) < k:
+                    heapq.heappush(heap, (-d2, idx))
+                else:
+                    heapq.heapreplace(heap, (-d2, idx))
+            diff = q[axis] - p[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if diff * diff <= bound():
+                visit(far)
+
+        if k > 0:
+            visit(self.root)
+        return sorted((-nd2, idx) for nd2, idx in heap)
+
+    def within(self, q: _Point, max_d2: float) -> List[Tuple[float, int]]:
+        """Semua titik dengan jarak kuadrat <= max_d2; [(d2, idx)] urut naik."""
+        out: List[Tuple[float, int]] = []
+        points = self.points
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            idx, axis, left, right = node
+            p = points[idx]
+            d2 = (p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 + (p[2] - q[2]) ** 2
+            if d2 <= max_d2:
+                out.append((d2, idx))
+            diff = q[axis] - p[axis]
+            if diff < 0 or diff * diff <= max_d2:
+                stack.append(left)
+            if diff >= 0 or diff * diff <= max_d2:
+                stack.append(right)
+        out.sort()
+        return out
+
+
+def normalize_name(value: str) -> str:
+    """Bentuk pencarian: huruf kecil, tanpa aksen, spasi dirapikan."""
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return " ".join(value.casefold().split())
+
+
+class LocationIndex:
+    """Snapshot lokasi (by_id: semua, tree: hanya yang aktif); immutable setelah dibangun."""
+
+    def __init__(self, entries: List[LocationEntry]):
+        self.by_id: Dict[str, LocationEntry] = {e.id_location: e for e in entries}
+        entries = [e for e in entries if not e.deleted]
+        self.entries = entries
+        # Urutan daftar (nama ternormalisasi, id) untuk keyset pagination & prefix search
+        self._sorted = sorted(entries, key=lambda e: (normalize_name(e.nama_kantor), e.id_location))
+        self._sort_keys = [(normalize_name(e.nama_kantor), e.id_location) for e in self._sorted]
+        self._search_cache: Dict[str, List[int]] = {}
+        self._search_lock = threading.Lock()
+        self._lats = np.fromiter((e.latitude for e in entries), dtype=np.float64, count=len(entries))
+        self._lons = np.fromiter((e.longitude for e in entries), dtype=np.float64, count=len(entries))
+        self._tree = _KDTree([to_unit_xyz(e.latitude, e.longitude) for e in entries])
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _with_distance(self, lat: float, lng: float, hits) -> List[Tuple[LocationEntry, float]]:
+        if not hits:
+            return []
+        idx = np.fromiter((i for _, i in hits), dtype=np.intp, count=len(hits))
+        dist = haversine_many(lat, lng, self._lats[idx], self._lons[idx])
+        return [(self.entries[i], float(d)) for i, d in zip(idx.tolist(), dist.tolist())]
+
+    def distances(self, lat: float, lng: float) -> np.ndarray:
+        """Jarak (meter, float64) dari (lat, lng) ke semua lokasi, urutan = self.entries."""
+        return haversine_many(lat, lng, self._lats, self._lons)
+
+    def nearest(self, lat: float, lng: float, k: int = 1, radius_m: Optional[float] = None) -> List[Tuple[LocationEntry, float]]:
+        """k lokasi terdekat (opsional dalam radius_m); [(entry, jarak_m)] urut naik."""
+        max_d2 = math.inf if radius_m is None else meters_to_chord(float(radius_m)) ** 2
+        hits = self._tree.nearest(to_unit_xyz(lat, lng), k, max_d2)
+        return self._with_distance(lat, lng, hits)
+
+    def within(self, lat: float, lng: float, radius_m: float) -> List[Tuple[LocationEntry, float]]:
+        """Semua lokasi dalam radius_m; [(entry, jarak_m)] urut naik."""
+        hits = self._tree.within(to_unit_xyz(lat, lng), meters_to_chord(float(radius_m)) ** 2)
+        return self._with_distance(lat, lng, hits)
+
+    # ---------- daftar & pencarian nama ----------
+
+    def _matches(self, q: str, mode: str) -> Tuple[int, int, Optional[List[int]]]:
+        """
+        Posisi (di self._sorted) yang cocok: prefix -> rentang [lo, hi) via
+        bisect; contains -> list posisi (di-cache per snapshot).
+        """
+        needle = normalize_name(q)
+        if not needle:
+            return 0, len(self._sorted), None
+        if mode == "prefix":
+            lo = bisect.bisect_left(self._sort_keys, (needle,))
+            hi = bisect.bisect_left(self._sort_keys, (needle + "\uffff",))
+            return lo, hi, None
+
+        hit = self._search_cache.get(needle)
+        if hit is None:
+            hit = [i for i, (name, _) in enumerate(self._sort_keys) if needle in name]
+            with self._search_lock:
+                if len(self._search_cache) >= _SEARCH_CACHE_MAX:
+                    self._search_cache.clear()
+                self._search_cache[needle] = hit
+        return 0, 0, hit
+
+    def search(
+        self,
+        q: str = "",
+        mode: str = "contains",
+        limit: int = 20,
+        after: Optional[Tuple[str, str]] = None,
+        offset: int = 0,
+    ) -> Tuple[List[LocationEntry], int, Optional[Tuple[str, str]]]:
+        """
+        Halaman lokasi aktif urut (nama, id). after = kunci item terakhir
+        halaman sebelumnya (keyset); offset hanya untuk kompatibilitas ?page=.
+        Return (items, total, kunci terakhir bila masih ada halaman berikutnya).
+        """
+        lo, hi, positions = self._matches(q, mode)
+        if positions is None:
+            start = lo
+            if after is not None:
+                start = max(lo, bisect.bisect_right(self._sort_keys, after, lo, hi))
+            start += offset
+            picked = list(range(start, min(hi, start + limit + 1)))
+            total = hi - lo
+        else:
+            start = 0
+            if after is not None:
+                # positions terurut naik, jadi cukup cari posisi global setelah 'after'
+                start = bisect.bisect_left(positions, bisect.bisect_right(self._sort_keys, after))
+            start += offset
+            picked = positions[start:start + limit + 1]
+            total = len(positions)
+
+        has_more = len(picked) > limit
+        picked = picked[:limit]
+        items = [self._sorted[i] for i in picked]
+        next_key = self._sort_keys[picked[-1]] if has_more and picked else None
+        return items, total, next_key
+
+
+# ---------- Cache per proses ----------
+
+_index: Optional[LocationIndex] = None
+_index_version: Optional[tuple] = None
+_index_checked_at = 0.0
+_index_loaded_at = 0.0
+_index_lock = threading.Lock()
+
+
+def _cfg(name: str, default):
+    try:
+        return current_app.config.get(name, default)
+    except RuntimeError:
+        return default
+
+
+def invalidate_location_index() -> None:
+    """Paksa cek versi + rebuild pada akses berikutnya (di proses ini)."""
+    global _index_version, _index_checked_at
+    with _index_lock:
+        _index_version = None
+        _index_checked_at = 0.0
+
+
+def _location_table_version(session: Session) -> tuple:
+    row = session.execute(
+        select(func.count(Location.id_location), func.max(Location.updated_at), func.max(Location.deleted_at))
+    ).one()
+    return tuple(row)
+
+
+def _load_entries(session: Session) -> List[LocationEntry]:
+    rows = session.execute(
+        select(
+            Location.id_location,
+            Location.nama_kantor,
+            Location.latitude,
+            Location.longitude,
+            Location.radius,
+            Location.deleted_at,
+        )
+    ).all()
+    return [
+        LocationEntry(
+            r.id_location,
+            r.nama_kantor,
+            float(r.latitude),
+            float(r.longitude),
+            int(r.radius) if r.radius is not None else None,
+            r.deleted_at is not None,
+        )
+        for r in rows
+    ]
+
+
+def _refresh(session: Session, now: float) -> LocationIndex:
+    global _index, _index_version, _index_checked_at, _index_loaded_at
+    version = _location_table_version(session)
+    # Reload penuh juga dipaksa berkala: updated_at hanya beresolusi detik
+    stale = now - _index_loaded_at > float(_cfg("LOCATION_INDEX_TTL", 60)) * 10
+    if _index is None or version != _index_version or stale:
+        t0 = time.perf_counter()
+        _index = LocationIndex(_load_entries(session))
+        _index_version = version
+        _index_loaded_at = now
+        logger.info(f"Index lokasi dibangun ulang: {len(_index)} lokasi dalam {(time.perf_counter() - t0) * 1000:.1f} ms")
+    _index_checked_at = now
+    return _index
+
+
+def get_location_index(session: Optional[Session] = None) -> LocationIndex:
+    """
+    Snapshot lokasi terkini. Selama cache segar tidak menyentuh DB; bila
+    perlu cek versi dan session tidak diberikan, dibuka session pendek sendiri.
+    """
+    ttl = float(_cfg("LOCATION_INDEX_TTL", 60))
+    now = time.monotonic()
+    if _index is not None and _index_version is not None and now - _index_checked_at < ttl:
+        return _index
+
+    with _index_lock:
+        if _index is not None and _index_version is not None and now - _index_checked_at < ttl:
+            return _index
+        if session is not None:
+            return _refresh(session, now)
+        with get_read_session() as s:
+            return _refresh(s, now)
+
+
+def get_cached_location(loc_id: str) -> Optional[LocationEntry]:
+    """
+    Lokasi per id dari cache (termasuk yang deleted; cek entry.deleted).
+    Id yang belum dikenal memicu cek versi ulang paling sering sekali per
+    LOCATION_CACHE_MISS_REFRESH detik, untuk lokasi yang baru ditambahkan.
+    """
+    global _index_checked_at
+    entry = get_location_index().by_id.get(loc_id)
+    if entry is not None:
+        return entry
+
+    min_gap = float(_cfg("LOCATION_CACHE_MISS_REFRESH", 5))
+    if time.monotonic() - _index_checked_at < min_gap:
+        return None
+    with _index_lock:
+        _index_checked_at = 0.0
+    return get_location_index().by_id.get(loc_id)
@@ -0,0 +1,257 @@
+# app/services/notification_inbox.py
+"""
+Inbox notifikasi per user: daftar dengan keyset pagination dan unread count
+ber-cache.
+
+- Daftar diurutkan (created_at DESC, id_notification DESC); cursor menyimpan
+  pasangan terakhir sehingga halaman berikutnya cukup "WHERE (created_at, id)
+  < cursor" tanpa OFFSET. Dengan filter status, query memakai penuh index
+  idx_n_id_user_status_created_at.
+- unread_count disimpan di Redis (notif:unread:<id_user>, TTL
+  NOTIF_UNREAD_CACHE_TTL) sebagai "<versi>:<jumlah>". Setiap perubahan yang
+  menyentuh status/ jumlah notifikasi user cukup memanggil
+  mark_unread_dirty(session, user_ids); SETELAH commit versi user
+  (notif:unread:ver:<id_user>) dinaikkan dan cache dihapus. Pembaca mencatat
+  versi sebelum menghitung, jadi hitungan lama yang di-SET setelah invalidasi
+  (race baca-vs-commit) tidak pernah dipakai karena versinya sudah usang.
+- Hitung ulang saat cache miss selalu di primary (bukan replika yang bisa
+  tertinggal), dan mark_unread_dirty juga menandai read-your-writes.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import and_, event, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from ..db import get_session, mark_written
+from ..db.models import Notification, NotificationStatus
+from ..extensions import get_redis
+from ..utils.timez import now_local
+
+logger = logging.getLogger(__name__)
+
+_UNREAD_KEY = "notif:unread:{}"
+_VERSION_KEY = "notif:unread:ver:{}"
+_DIRTY_KEY = "notif_unread_dirty"
+
+
+def _cfg(name: str, default: Any) -> Any:
+    try:
+        return current_app.config.get(name, default)
+    except RuntimeError:
+        return default
+
+
+# ---------- Cursor ----------
+
+def encode_cursor(created_at: datetime, id_notification: str) -> str:
+    raw = json.dumps({"t": created_at.isoformat(), "id": id_notification}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """ValueError jika cursor rusak."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return datetime.fromisoformat(data["t"]), str(data["id"])
+    except Exception as e:
+        raise ValueError("cursor tidak valid") from e
+
+
+def parse_status(value: Optional[str]) -> Optional[NotificationStatus]:
+    """ValueError jika status tidak dikenal."""
+    if not value:
+        return None
+    try:
+        return NotificationStatus[value.strip().lower()]
+    except KeyError:
+        raise ValueError(f"status harus salah satu dari: {', '.join(s.name for s in NotificationStatus)}")
+
+
+def _to_dict(n: Notification) -> Dict[str, Any]:
+    return {
+        "id_notification": n.id_notification,
+        "title": n.title,
+        "body": n.body,
+        "created_at": n.created_at.isoformat(),
+        "read_at": n.read_at.isoformat() if n.read_at else None,
+        "status": n.status.value if n.status else None,
+    }
+
+
+def list_notifications(
+    session: Session,
+    user_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    status: Optional[NotificationStatus] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Return (items, next_cursor). next_cursor None berarti halaman terakhir."""
+    q = select(Notification).where(Notification.id_user == user_id, Notification.deleted_at.is_(None))
+    if status is not None:
+        q = q.where(Notification.status == status)
+    if cursor:
+        c_at, c_id = decode_cursor(cursor)
+        q = q.where(
+            or_(
+                Notification.created_at < c_at,
+                and_(Notification.created_at == c_at, Notification.id_notification < c_id),
+            )
+        )
+    q = q.order_by(Notification.created_at.desc(), Notification.id_notification.desc()).limit(limit + 1)
+
+    rows = session.execute(q).scalars().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id_notification) if has_more and rows else None
+    return [_to_dict(n) for n in rows], next_cursor
+
+
+def parse_before(value: Optional[str]) -> Optional[datetime]:
+    """ISO datetime -> waktu lokal naif (seperti kolom created_at). ValueError bila rusak."""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError("before harus berupa datetime ISO 8601")
+    if dt.tzinfo is not None:
+        local_tz = now_local().tzinfo
+        dt = dt.astimezone(local_tz) if local_tz is not None else dt.astimezone()
+    return dt.replace(tzinfo=None)
+
+
+def mark_read(
+    session: Session,
+    user_id: str,
+    ids: Optional[List[str]] = None,
+    before: Optional[datetime] = None,
+) -> int:
+    """
+    Tandai notifikasi unread milik user sebagai read dengan satu UPDATE
+    (ids=None berarti semua, dibatasi created_at <= before bila diisi).
+    Tidak commit; unread count diinvalidasi setelah commit pemanggil.
+    Return jumlah baris yang berubah.
+    """
+    now = now_local().replace(tzinfo=None)
+    stmt = (
+        update(Notification)
+        .where(
+            Notification.id_user == user_id,
+            Notification.status == NotificationStatus.unread,
+            Notification.deleted_at.is_(None),
+        )
+        .values(status=NotificationStatus.read, read_at=func.coalesce(Notification.read_at, now), updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if ids is not None:
+        if not ids:
+            return 0
+        stmt = stmt.where(Notification.id_notification.in_(ids))
+    if before is not None:
+        stmt = stmt.where(Notification.created_at <= before)
+
+    affected = session.execute(stmt).rowcount or 0
+    if affected:
+        mark_unread_dirty(session, [user_id])
+    return affected
+
+
+# ---------- Unread count ----------
+
+def _count_unread(session: Session, user_id: str) -> int:
+    return int(
+        session.execute(
+            select(func.count())
+            .select_from(Notification)
+            .where(
+                Notification.id_user == user_id,
+                Notification.status == NotificationStatus.unread,
+                Notification.deleted_at.is_(None),
+            )
+        ).scalar_one()
+    )
+
+
+def _cache_ttl() -> int:
+    return int(_cfg("NOTIF_UNREAD_CACHE_TTL", 300))
+
+
+def unread_count(session: Session, user_id: str) -> int:
+    r = get_redis()
+    key = _UNREAD_KEY.format(user_id)
+    version = b"0"
+    if r is not None:
+        try:
+            cached, current = r.mget(key, _VERSION_KEY.format(user_id))
+            version = current or b"0"
+            if cached is not None:
+                cached_version, _, value = cached.partition(b":")
+                if cached_version == version:
+                    return int(value)
+        except Exception as e:
+            logger.debug(f"Redis get unread count gagal: {e}")
+            r = None
+
+    if session.info.get("replica"):
+        # Replika bisa tertinggal; angka yang akan di-cache harus dari primary
+        with get_session() as primary:
+            count = _count_unread(primary, user_id)
+    else:
+        count = _count_unread(session, user_id)
+    if r is not None:
+        try:
+            r.set(key, b"%s:%d" % (version, count), ex=_cache_ttl())
+        except Exception as e:
+            logger.debug(f"Redis set unread count gagal: {e}")
+    return count
+
+
+def invalidate_unread_count(user_ids: Iterable[str]) -> None:
+    uids = [uid for uid in set(user_ids) if uid]
+    r = get_redis()
+    if not uids or r is None:
+        return
+    # Versi hidup lebih lama dari cache agar entri lama tidak cocok lagi
+    ver_ttl = 2 * _cache_ttl() + 60
+    try:
+        for i in range(0, len(uids), 1000):
+            pipe = r.pipeline(transaction=False)
+            for uid in uids[i:i + 1000]:
+                pipe.incr(_VERSION_KEY.format(uid))
+                pipe.expire(_VERSION_KEY.format(uid), ver_ttl)
+            pipe.delete(*[_UNREAD_KEY.format(uid) for uid in uids[i:i + 1000]])
+            pipe.execute()
+    except Exception as e:
+        # TTL tetap membatasi umur cache basi
+        logger.warning(f"Gagal invalidasi unread count ({len(uids)} user): {e}")
+
+
+def mark_unread_dirty(session: Session, user_ids: Iterable[str]) -> None:
+    """
+    Jadwalkan invalidasi unread count user tersebut setelah session commit,
+    sekaligus arahkan bacaan mereka ke primary (read-your-writes).
+    """
+    uids = {uid for uid in user_ids if uid}
+    session.info.setdefault(_DIRTY_KEY, set()).update(uids)
+    mark_written(session, uids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if dirty:
+        invalidate_unread_count(dirty)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_DIRTY_KEY, None)
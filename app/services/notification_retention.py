@@ -0,0 +1,185 @@
+# app/services/notification_retention.py
+"""
+Retensi tabel notifications.
+
+Notifikasi berstatus read/archived yang lebih tua dari NOTIF_RETENTION_DAYS
+dipindahkan per batch (NOTIF_RETENTION_BATCH baris, maks
+NOTIF_RETENTION_MAX_BATCHES batch per run) lalu dihapus dari `notifications`
+beserta baris outbox-nya. Mode (NOTIF_RETENTION_MODE):
+  - archive : salin ke tabel ringkas notifications_archive
+  - file    : tulis JSON Lines gzip ke NOTIF_ARCHIVE_DIR, satu file per batch
+              (notifications-<tanggal>-<id terakhir>.jsonl.gz). File ditulis
+              sebagai .tmp sebelum commit dan baru di-rename setelah commit,
+              jadi batch yang commit-nya gagal tidak ikut terarsip dua kali.
+              Path relatif dihitung dari root project, bukan cwd worker.
+  - delete  : hapus tanpa arsip
+
+Pemilihan batch memakai idx_n_status_created_at; setiap batch satu transaksi
+pendek sehingga tidak menahan lock lama di jam sibuk.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import os
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy import delete, insert, select
+
+from ..db import get_session
+from ..db.models import Notification, NotificationArchive, NotificationOutbox, NotificationStatus
+from ..utils.timez import now_local
+
+logger = logging.getLogger(__name__)
+
+RETENTION_MODES = ("archive", "file", "delete")
+_PURGEABLE_STATUSES = (NotificationStatus.read, NotificationStatus.archived)
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _cfg(name: str, default: Any) -> Any:
+    try:
+        return current_app.config.get(name, default)
+    except RuntimeError:
+        return default
+
+
+def _archive_rows(rows: List[Dict[str, Any]], archived_at) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id_notification": r["id_notification"],
+            "id_user": r["id_user"],
+            "title": r["title"],
+            "body": r["body"],
+            "related_table": r["related_table"],
+            "related_id": r["related_id"],
+            "status": r["status"],
+            "read_at": r["read_at"],
+            "created_at": r["created_at"],
+            "archived_at": archived_at,
+        }
+        for r in rows
+    ]
+
+
+def _archive_dir() -> str:
+    directory = _cfg("NOTIF_ARCHIVE_DIR", "archive/notifications")
+    if not os.path.isabs(directory):
+        directory = os.path.join(_PROJECT_ROOT, directory)
+    return os.path.abspath(directory)
+
+
+def _archive_path(directory: str, archived_at, batch_key: str) -> str:
+    return os.path.join(directory, f"notifications-{archived_at:%Y%m%d}-{batch_key}.jsonl.gz")
+
+
+def _write_file(rows: List[Dict[str, Any]], path: str) -> None:
+    """Tulis arsip satu batch ke <path>.tmp (di-rename pemanggil setelah commit)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path + ".tmp", "wt", encoding="utf-8") as fh:
+        for r in rows:
+            fh.write(json.dumps(
+                {
+                    **r,
+                    "status": r["status"].value if r["status"] else None,
+                    "read_at": r["read_at"].isoformat() if r["read_at"] else None,
+                    "created_at": r["created_at"].isoformat() if r["created_at"] else None,
+                    "archived_at": r["archived_at"].isoformat(),
+                },
+                ensure_ascii=False,
+            ))
+            fh.write("\n")
+
+
+def purge_notifications(
+    days: Optional[int] = None,
+    mode: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    max_batches: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Jalankan satu putaran retensi. Return statistik:
+    {mode, cutoff, batches, moved, done} — done False berarti masih ada sisa
+    yang akan diambil run berikutnya.
+    """
+    days = int(_cfg("NOTIF_RETENTION_DAYS", 180) if days is None else days)
+    mode = (mode or _cfg("NOTIF_RETENTION_MODE", "archive")).lower()
+    batch_size = int(batch_size or _cfg("NOTIF_RETENTION_BATCH", 1000))
+    max_batches = int(max_batches or _cfg("NOTIF_RETENTION_MAX_BATCHES", 200))
+
+    if mode not in RETENTION_MODES:
+        raise ValueError(f"NOTIF_RETENTION_MODE harus salah satu dari {RETENTION_MODES}")
+
+    stats: Dict[str, Any] = {"mode": mode, "cutoff": None, "batches": 0, "moved": 0, "done": True}
+    if days <= 0:
+        stats["mode"] = "disabled"
+        return stats
+
+    now = now_local().replace(tzinfo=None)
+    cutoff = now - timedelta(days=days)
+    stats["cutoff"] = cutoff.isoformat()
+    archive_dir = _archive_dir() if mode == "file" else None
+
+    columns = [
+        Notification.id_notification,
+        Notification.id_user,
+        Notification.title,
+        Notification.body,
+        Notification.related_table,
+        Notification.related_id,
+        Notification.status,
+        Notification.read_at,
+        Notification.created_at,
+    ]
+
+    for _ in range(max_batches):
+        with get_session() as s:
+            stmt = (
+                select(*columns)
+                .where(Notification.status.in_(_PURGEABLE_STATUSES), Notification.created_at < cutoff)
+                .order_by(Notification.created_at)
+                .limit(batch_size)
+            )
+            if mode == "delete":
+                rows = [{"id_notification": nid} for nid in s.execute(stmt.with_only_columns(Notification.id_notification)).scalars()]
+            else:
+                rows = [dict(r._mapping) for r in s.execute(stmt)]
+            if not rows:
+                break
+
+            ids = [r["id_notification"] for r in rows]
+            # Path ditentukan sebelum menulis agar .tmp parsial (disk penuh,
+            # error serialisasi) ikut dibersihkan di cabang except
+            path = _archive_path(archive_dir, now, ids[-1]) if mode == "file" else None
+            try:
+                if mode == "archive":
+                    s.execute(insert(NotificationArchive), _archive_rows(rows, now))
+                s.execute(delete(NotificationOutbox).where(NotificationOutbox.id_notification.in_(ids)))
+                s.execute(delete(Notification).where(Notification.id_notification.in_(ids)))
+                if mode == "file":
+                    # Isi arsip sudah aman di disk (.tmp) sebelum baris dihapus,
+                    # tetapi baru dipublikasikan setelah commit berhasil
+                    _write_file(_archive_rows(rows, now), path)
+                s.commit()
+            except Exception:
+                s.rollback()
+                if path is not None and os.path.exists(path + ".tmp"):
+                    os.remove(path + ".tmp")
+                logger.exception(f"Gagal memproses batch retensi notifikasi ({len(ids)} baris)")
+                raise
+            if path is not None:
+                os.replace(path + ".tmp", path)
+
+        stats["batches"] += 1
+        stats["moved"] += len(ids)
+        if len(ids) < batch_size:
+            break
+    else:
+        stats["done"] = False
+
+    logger.info(f"Retensi notifikasi: {stats}")
+    return stats
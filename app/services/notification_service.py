@@ -3,24 +3,55 @@
 from __future__ import annotations
 
 import json
-from datetime import datetime
-from typing import Any, Dict, List
+import random
+import string
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 import logging # <-- Ditambahkan
 
+from flask import current_app
 from firebase_admin import messaging
+from sqlalchemy import and_, case, func, insert, or_, select, update
 from sqlalchemy.orm import Session
 
-# Coba impor initialize_firebase dari extensions; jika tidak ada, pakai app/firebase.py
-try:
-    from ..extensions import initialize_firebase # beberapa branch menamai begini
-except (ImportError, AttributeError):
-    from ..firebase import initialize_firebase # fallback yang ada di repo kamu
-
-from ..db.models import NotificationTemplate, Device, Notification
+from ..extensions import get_firebase_app
+from .notification_inbox import mark_unread_dirty
+from ..db import get_session
+from ..metrics import observe_fcm, observe_outbox
+from ..tracing import traced
+from ..db.models import (
+    NotificationTemplate,
+    Device,
+    Notification,
+    NotificationStatus,
+    NotificationOutbox,
+    OutboxStatus,
+)
+from ..utils.timez import now_local
 
 logger = logging.getLogger(__name__)
+
+# Batas jumlah pesan per panggilan send_each/send_all di FCM
+FCM_BATCH_LIMIT = 500
+
 # ---------- Helpers ----------
 
+def _cfg(name: str, default: Any) -> Any:
+    try:
+        return current_app.config.get(name, default)
+    except RuntimeError:
+        # Di luar app context (mis. skrip) pakai default
+        return default
+
+
+def _now():
+    return now_local().replace(tzinfo=None)
+
+
 def _format_message(template: str, data: Dict[str, Any]) -> str:
     """Ganti placeholder {key} di template dengan data[key] tanpa meledak bila tidak ada."""
     if not template:
@@ -33,201 +64,666 @@ def _format_message(template: str, data: Dict[str, Any]) -> str:
         return template
 
 
-def _send_multicast_compat(message: messaging.MulticastMessage, tokens: List[str]):
-    """
-    Kirim multicast dengan kompatibilitas lintas versi firebase_admin.
+# ---------- Template cache ----------
+#
+# Template hanya berubah saat scripts/seed_notifications.py dijalankan (atau
+# diedit admin). Semua template aktif dimuat sekali ke memori; versi tabel
+# (max(updated_at), count) dicek paling sering sekali per
+# NOTIF_TEMPLATE_CACHE_TTL detik, sehingga event bervolume tinggi seperti
+# SUCCESS_CHECK_IN tidak lagi query notification_templates tiap kali.
+
+_formatter = string.Formatter()
+
+
+def _template_fields(template: str) -> frozenset:
+    """Nama placeholder root di template str.format, mis. '{a.b} {c}' -> {'a', 'c'}."""
+    fields = set()
+    try:
+        for _, field_name, _, _ in _formatter.parse(template or ""):
+            if field_name:
+                fields.add(field_name.split(".", 1)[0].split("[", 1)[0])
+    except ValueError:
+        # Template rusak (kurung tidak seimbang); render akan fallback ke teks mentah
+        pass
+    return frozenset(fields)
+
+
+class _CachedTemplate:
+    """Snapshot NotificationTemplate yang sudah di-parse (lepas dari session)."""
+
+    __slots__ = ("event_trigger", "title_template", "body_template", "title_fields", "body_fields")
+
+    def __init__(self, row: NotificationTemplate):
+        self.event_trigger = row.event_trigger
+        self.title_template = row.title_template or ""
+        self.body_template = row.body_template or ""
+        self.title_fields = _template_fields(self.title_template)
+        self.body_fields = _template_fields(self.body_template)
+
+    @staticmethod
+    def _render(template: str, fields: frozenset, data: Dict[str, Any]) -> str:
+        if not template:
+            return ""
+        if not fields:
+            return template.replace("{{", "{").replace("}}", "}")
+        if fields.issubset(data.keys()):
+            return _format_message(template, data)
+        logger.warning(
+            f"Placeholder {sorted(fields - data.keys())} tidak ada di data untuk template '{template[:50]}...'"
+        )
+        return template
+
+    def render(self, data: Dict[str, Any]) -> tuple[str, str]:
+        return (
+            self._render(self.title_template, self.title_fields, data),
+            self._render(self.body_template, self.body_fields, data),
+        )
+
+
+_template_cache: Dict[str, _CachedTemplate] = {}
+_template_cache_version: Optional[tuple] = None
+_template_cache_checked_at = 0.0
+_template_cache_loaded_at = 0.0
+_template_cache_lock = threading.Lock()
+
+
+def invalidate_template_cache() -> None:
+    """Paksa reload template pada lookup berikutnya (di proses ini)."""
+    global _template_cache_version, _template_cache_checked_at
+    with _template_cache_lock:
+        _template_cache_version = None
+        _template_cache_checked_at = 0.0
 
-    Return object dengan atribut:
-      - success_count: int
-      - failure_count: int
-      - responses: list objek yang punya .success: bool
-    """
-    # 1) Versi baru & paling umum
-    if hasattr(messaging, "send_multicast"):
-        return messaging.send_multicast(message) # type: ignore[attr-defined]
 
-    # 2) Ada di beberapa versi: kirim tiap item (namun tetap satu call)
-    if hasattr(messaging, "send_each_for_multicast"):
-        resp = messaging.send_each_for_multicast(message) # type: ignore[attr-defined]
-        success = sum(1 for r in resp.responses if getattr(r, "success", False))
-        failure = len(resp.responses) - success
+def _template_table_version(session: Session) -> tuple:
+    row = session.execute(
+        select(func.max(NotificationTemplate.updated_at), func.count(NotificationTemplate.id))
+    ).one()
+    return (row[0], row[1])
 
-        class _Compat:
-            def __init__(self, success_count, failure_count, responses):
-                self.success_count = success_count
-                self.failure_count = failure_count
-                self.responses = responses
 
-        return _Compat(success, failure, resp.responses)
+def _get_template(session: Session, event_trigger: str) -> _CachedTemplate | None:
+    global _template_cache, _template_cache_version, _template_cache_checked_at, _template_cache_loaded_at
+
+    ttl = float(_cfg("NOTIF_TEMPLATE_CACHE_TTL", 60))
+    now = time.monotonic()
+    if _template_cache_version is not None and now - _template_cache_checked_at < ttl:
+        return _template_cache.get(event_trigger)
+
+    with _template_cache_lock:
+        # Thread lain mungkin sudah me-refresh selagi kita menunggu lock
+        if _template_cache_version is not None and now - _template_cache_checked_at < ttl:
+            return _template_cache.get(event_trigger)
+
+        version = _template_table_version(session)
+        # Reload penuh juga dipaksa berkala: updated_at hanya beresolusi detik
+        stale = now - _template_cache_loaded_at > ttl * 10
+        if version != _template_cache_version or stale:
+            rows = (
+                session.query(NotificationTemplate)
+                .filter(NotificationTemplate.is_active.is_(True))
+                .all()
+            )
+            _template_cache = {r.event_trigger: _CachedTemplate(r) for r in rows if r.event_trigger}
+            _template_cache_version = version
+            _template_cache_loaded_at = now
+            logger.info(f"Cache template notifikasi dimuat ulang: {len(_template_cache)} template aktif")
+        _template_cache_checked_at = now
+        return _template_cache.get(event_trigger)
+
 
-    # 3) Versi lama: konstruksi messages dan gunakan send_all jika ada
-    common_kwargs = dict(
-        data=message.data,
-        android=message.android,
-        apns=message.apns,
-        webpush=getattr(message, "webpush", None),
-        fcm_options=getattr(message, "fcm_options", None),
-        notification=getattr(message, "notification", None), # biasanya None krn kita pakai data-only
+def _fcm_error_code(exc: Optional[BaseException]) -> str:
+    """Kode error FCM (gaya API v1) dari exception firebase_admin."""
+    if exc is None:
+        return "UNKNOWN"
+    for cls_name, code in (
+        ("UnregisteredError", "UNREGISTERED"),
+        ("SenderIdMismatchError", "SENDER_ID_MISMATCH"),
+        ("QuotaExceededError", "QUOTA_EXCEEDED"),
+        ("ThirdPartyAuthError", "THIRD_PARTY_AUTH_ERROR"),
+    ):
+        cls = getattr(messaging, cls_name, None)
+        if cls is not None and isinstance(exc, cls):
+            return code
+    return str(getattr(exc, "code", None) or "UNKNOWN").upper()
+
+
+# Tindakan terhadap device per kode error FCM:
+#   disable -> token mati (app di-uninstall / token milik project lain), langsung nonaktifkan
+#   count   -> kemungkinan token rusak, hitung ke failed_push_count (nonaktif di ambang batas)
+# Kode lain (UNAVAILABLE, INTERNAL, QUOTA_EXCEEDED, ...) dianggap sementara: tidak mengubah device.
+_TOKEN_ERROR_ACTIONS = {
+    "UNREGISTERED": "disable",
+    "NOT_FOUND": "disable",
+    "SENDER_ID_MISMATCH": "disable",
+    "INVALID_ARGUMENT": "count",
+}
+
+
+class _SendResult:
+    """Hasil kirim satu pesan FCM, seragam lintas versi firebase_admin."""
+
+    __slots__ = ("success", "exception", "error_code")
+
+    def __init__(self, success: bool, exception: Optional[BaseException] = None, error_code: Optional[str] = None):
+        self.success = success
+        self.exception = exception
+        self.error_code = None if success else (error_code or _fcm_error_code(exception))
+
+
+def _build_message(token: str, data: Dict[str, str]) -> messaging.Message:
+    # DATA MESSAGE agar bisa diterima di background (Android/iOS)
+    return messaging.Message(
+        token=token,
+        data=data,
+        android=messaging.AndroidConfig(priority="high"),
+        apns=messaging.APNSConfig(
+            payload=messaging.APNSPayload(
+                aps=messaging.Aps(content_available=True)
+            )
+        ),
     )
-    messages = [messaging.Message(token=t, **common_kwargs) for t in tokens]
 
-    if hasattr(messaging, "send_all"):
-        resp = messaging.send_all(messages) # type: ignore[attr-defined]
 
-        class _Compat:
-            def __init__(self, success_count, failure_count, responses):
-                self.success_count = success_count
-                self.failure_count = failure_count
-                self.responses = responses
+def _send_each_compat(messages: List[messaging.Message]) -> List[_SendResult]:
+    """
+    Kirim sekumpulan pesan (maks FCM_BATCH_LIMIT) dengan kompatibilitas lintas
+    versi firebase_admin. Return satu _SendResult per pesan, urutan sama.
+    """
+    fb_app = get_firebase_app()
+    if fb_app is None:
+        raise RuntimeError("Firebase tidak terinisialisasi; push notification dinonaktifkan.")
+
+    # 1) Versi baru
+    if hasattr(messaging, "send_each"):
+        resp = messaging.send_each(messages, app=fb_app) # type: ignore[attr-defined]
+        return [_SendResult(bool(r.success), getattr(r, "exception", None)) for r in resp.responses]
 
-        return _Compat(resp.success_count, resp.failure_count, resp.responses)
+    # 2) Versi lama: batch API
+    if hasattr(messaging, "send_all"):
+        resp = messaging.send_all(messages, app=fb_app) # type: ignore[attr-defined]
+        return [_SendResult(bool(r.success), getattr(r, "exception", None)) for r in resp.responses]
 
-    # 4) Fallback terakhir: kirim satu-per-satu
-    responses = []
-    success = 0
+    # 3) Fallback terakhir: kirim satu-per-satu
+    results: List[_SendResult] = []
     for msg in messages:
         try:
-            messaging.send(msg)
-            class _R: success = True
-            responses.append(_R())
-            success += 1
+            messaging.send(msg, app=fb_app)
+            results.append(_SendResult(True))
         except Exception as e:
             # Log error saat mengirim individual message
             logger.warning(f"Gagal mengirim FCM ke token individual: {e}", exc_info=False)
-            class _R: success = False
-            responses.append(_R())
+            results.append(_SendResult(False, e))
+    return results
 
-    class _Compat:
-        def __init__(self, success_count, failure_count, responses):
-            self.success_count = success_count
-            self.failure_count = failure_count
-            self.responses = responses
 
-    return _Compat(success, len(messages) - success, responses)
+def _send_chunk(chunk: List[messaging.Message]) -> List[_SendResult]:
+    try:
+        return _send_each_compat(chunk)
+    except Exception as e:
+        logger.exception(f"Gagal total mengirim batch FCM ({len(chunk)} pesan): {e}")
+        return [_SendResult(False, e) for _ in chunk]
 
 
-# ---------- Public API ----------
+def _send_http(messages: List[messaging.Message]) -> List[_SendResult]:
+    """Kirim lewat FcmHttpTransport (FCM v1, HTTP/2, konkuren) — NOTIF_FCM_TRANSPORT=http."""
+    from .fcm_transport import get_http_transport  # httpx hanya wajib untuk mode ini
 
-def send_notification(event_trigger: str, user_id: str, dynamic_data: Dict[str, Any], session: Session) -> None:
-    """
-    Kirim notifikasi push untuk user tertentu berdasarkan NotificationTemplate.event_trigger.
-    - Simpan record ke tabel notifications (tanpa kolom event_trigger, karena memang tidak ada).
-    - Kirim FCM sebagai 'data message' agar andal di background.
-    """
-    # Pastikan Firebase Admin siap (tidak fatal kalau gagal)
     try:
-        initialize_firebase()
+        transport = get_http_transport(current_app.config)
+        outcomes = transport.send([(m.token, m.data or {}) for m in messages])
     except Exception as e:
-        # Ganti print dengan logger.warning
-        logger.warning(f"Gagal menginisialisasi Firebase saat mengirim notifikasi: {e}", exc_info=True) # exc_info=True untuk traceback
-
-    # Ambil template aktif
-    template: NotificationTemplate | None = (
-        session.query(NotificationTemplate)
-        .filter(
-            NotificationTemplate.event_trigger == event_trigger,
-            NotificationTemplate.is_active.is_(True),
+        logger.exception(f"Gagal total mengirim FCM via HTTP transport ({len(messages)} pesan): {e}")
+        return [_SendResult(False, e) for _ in messages]
+    return [
+        _SendResult(True) if ok else _SendResult(False, RuntimeError(msg or code), code)
+        for ok, code, msg in outcomes
+    ]
+
+
+@traced("fcm.send")
+def _send_messages(messages: List[messaging.Message]) -> List[_SendResult]:
+    """
+    Pecah pesan per FCM_BATCH_LIMIT dan kirim chunk secara paralel
+    (NOTIF_FCM_MAX_WORKERS thread). Urutan hasil sama dengan urutan pesan.
+    Dengan NOTIF_FCM_TRANSPORT=http semua pesan dikirim via transport async.
+    """
+    if not messages:
+        return []
+    if str(_cfg("NOTIF_FCM_TRANSPORT", "sdk")).lower() == "http":
+        return _send_http(messages)
+    chunks = [messages[i:i + FCM_BATCH_LIMIT] for i in range(0, len(messages), FCM_BATCH_LIMIT)]
+    workers = min(len(chunks), int(_cfg("NOTIF_FCM_MAX_WORKERS", 4)))
+    if workers <= 1:
+        chunk_results = [_send_chunk(c) for c in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fcm-send") as ex:
+            chunk_results = list(ex.map(_send_chunk, chunks))
+    return [r for res in chunk_results for r in res]
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    """Backoff eksponensial dengan jitter: 10s, 20s, 40s, ... maks 10 menit."""
+    base = min(600, 10 * (2 ** max(0, attempts - 1)))
+    return timedelta(seconds=base * random.uniform(0.5, 1.0))
+
+
+# ---------- Outbox ----------
+
+def _claim_outbox(batch_size: int, outbox_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Klaim baris outbox yang siap kirim (pending & jatuh tempo, atau 'sending'
+    yang lease-nya habis karena worker mati). Transaksi hanya selama klaim.
+    Semua baris satu klaim memakai token claimed_by yang sama; lease
+    diperpanjang per gelombang kirim (_extend_lease) dan _finalize_outbox
+    hanya mengubah baris yang masih dipegang token tersebut.
+    """
+    lease = int(_cfg("NOTIF_OUTBOX_LEASE_SECONDS", 120))
+    token = str(uuid.uuid4())
+    with get_session() as s:
+        now = _now()
+        q = s.query(NotificationOutbox).filter(
+            or_(
+                and_(NotificationOutbox.status == OutboxStatus.pending, NotificationOutbox.available_at <= now),
+                and_(
+                    NotificationOutbox.status == OutboxStatus.sending,
+                    NotificationOutbox.claimed_at < now - timedelta(seconds=lease),
+                ),
+            )
+        )
+        if outbox_ids:
+            q = q.filter(NotificationOutbox.id_outbox.in_(outbox_ids))
+        rows = (
+            q.order_by(NotificationOutbox.available_at.asc())
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
         )
-        .one_or_none()
+
+        claimed: List[Dict[str, Any]] = []
+        for r in rows:
+            r.status = OutboxStatus.sending
+            r.claimed_at = now
+            r.claimed_by = token
+            r.attempts = (r.attempts or 0) + 1
+            try:
+                payload = json.loads(r.payload_json or "{}")
+            except ValueError:
+                payload = {}
+            claimed.append(
+                {
+                    "id_outbox": r.id_outbox,
+                    "id_user": r.id_user,
+                    "event_trigger": r.event_trigger,
+                    "payload": {k: str(v) for k, v in payload.items()},
+                    "attempts": r.attempts,
+                    "claimed_by": token,
+                }
+            )
+        s.commit()
+        return claimed
+
+
+def _held(q, c: Dict[str, Any]):
+    """Filter: baris masih dalam lease milik klaim ini (belum diambil worker lain)."""
+    return q.filter(
+        NotificationOutbox.claimed_by == c["claimed_by"],
+        NotificationOutbox.status == OutboxStatus.sending,
     )
-    if not template:
-        # Ganti print dengan logger.warning
-        logger.warning(f"Template notifikasi untuk event '{event_trigger}' tidak ditemukan/ tidak aktif.")
-        return
 
-    # Ambil token device aktif
-    devices = (
-        session.query(Device)
-        .filter(
-            Device.id_user == user_id,
-            Device.fcm_token.isnot(None),
-            Device.push_enabled.is_(True),
+
+def _extend_lease(claimed: List[Dict[str, Any]]) -> int:
+    """Perbarui claimed_at baris yang masih dipegang; return jumlah baris."""
+    if not claimed:
+        return 0
+    with get_session() as s:
+        n = _held(
+            s.query(NotificationOutbox).filter(NotificationOutbox.id_outbox.in_([c["id_outbox"] for c in claimed])),
+            claimed[0],
+        ).update({"claimed_at": _now()}, synchronize_session=False)
+        s.commit()
+    if n < len(claimed):
+        logger.warning(f"Lease outbox hilang untuk {len(claimed) - n} baris (dispatch melebihi NOTIF_OUTBOX_LEASE_SECONDS)")
+    return n
+
+
+def _load_tokens(user_ids: List[str]) -> Dict[str, List[str]]:
+    """Satu query IN untuk semua token FCM aktif milik user dalam batch."""
+    if not user_ids:
+        return {}
+    with get_session() as s:
+        rows = s.execute(
+            select(Device.id_user, Device.fcm_token).where(
+                Device.id_user.in_(set(user_ids)),
+                Device.fcm_token.isnot(None),
+                Device.push_enabled.is_(True),
+            )
+        ).all()
+    out: Dict[str, List[str]] = {}
+    for id_user, token in rows:
+        if token:
+            out.setdefault(id_user, []).append(token)
+    return out
+
+
+def _update_device_health(session: Session, tokens: List[str], results: List[_SendResult], now) -> Dict[str, int]:
+    """
+    Terapkan hasil FCM ke tabel device dengan UPDATE set-based (bukan per baris):
+    - token sukses: last_push_at = now, failed_push_count = 0
+    - token gagal (disable/count): failed_push_count + 1 dalam SATU UPDATE;
+      push_enabled = false untuk token mati atau yang mencapai ambang batas.
+    Device nonaktif tidak lagi ikut di-query _load_tokens.
+    """
+    threshold = int(_cfg("NOTIF_TOKEN_FAILURE_THRESHOLD", 3))
+    ok_tokens, dead, counted = set(), set(), set()
+    for token, res in zip(tokens, results):
+        if res.success:
+            ok_tokens.add(token)
+            continue
+        action = _TOKEN_ERROR_ACTIONS.get(res.error_code or "")
+        if action == "disable":
+            dead.add(token)
+        elif action == "count":
+            counted.add(token)
+
+    # Token yang sukses di pesan lain (duplikat) tidak dihukum
+    dead -= ok_tokens
+    counted -= ok_tokens | dead
+
+    if ok_tokens:
+        session.execute(
+            update(Device)
+            .where(Device.fcm_token.in_(ok_tokens))
+            .values(last_push_at=now, failed_push_count=0)
+            .execution_options(synchronize_session=False)
         )
-        .all()
+
+    failed = dead | counted
+    if failed:
+        whens = [(Device.failed_push_count + 1 >= threshold, False)]
+        if dead:
+            whens.insert(0, (Device.fcm_token.in_(dead), False))
+        # push_enabled dievaluasi lebih dulu supaya memakai nilai failed_push_count
+        # lama di semua dialek (MySQL memakai nilai baru untuk SET berikutnya).
+        session.execute(
+            update(Device)
+            .where(Device.fcm_token.in_(failed))
+            .ordered_values(
+                (Device.push_enabled, case(*whens, else_=Device.push_enabled)),
+                (Device.failed_push_count, Device.failed_push_count + 1),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        logger.warning(
+            f"Token FCM gagal: {len(dead)} mati (dinonaktifkan), {len(counted)} dihitung "
+            f"(nonaktif setelah {threshold} kegagalan)"
+        )
+    return {"ok": len(ok_tokens), "dead": len(dead), "counted": len(counted)}
+
+
+def _finalize_outbox(
+    claimed: List[Dict[str, Any]],
+    outcomes: List[Optional[str]],
+    tokens: Optional[List[str]] = None,
+    results: Optional[List[_SendResult]] = None,
+) -> Dict[str, int]:
+    """
+    outcomes[i] None = terkirim; selain itu pesan error untuk claimed[i].
+    Baris yang lease-nya sudah diambil worker lain tidak diubah (stats "lost").
+    """
+    max_attempts = int(_cfg("NOTIF_OUTBOX_MAX_ATTEMPTS", 5))
+    stats = {"sent": 0, "retry": 0, "failed": 0, "lost": 0}
+    now = _now()
+
+    sent_ids = [c["id_outbox"] for c, err in zip(claimed, outcomes) if err is None]
+    with get_session() as s:
+        if tokens:
+            _update_device_health(s, tokens, results or [], now)
+
+        if sent_ids:
+            n = _held(s.query(NotificationOutbox).filter(NotificationOutbox.id_outbox.in_(sent_ids)), claimed[0]).update(
+                {"status": OutboxStatus.sent, "sent_at": now, "last_error": None},
+                synchronize_session=False,
+            )
+            stats["sent"] = n
+            stats["lost"] += len(sent_ids) - n
+
+        for c, err in zip(claimed, outcomes):
+            if err is None:
+                continue
+            # Tidak ada device aktif: tidak ada gunanya dicoba ulang
+            permanent = c.get("no_tokens") or c["attempts"] >= max_attempts
+            values: Dict[str, Any] = {"last_error": err[:1000]}
+            if permanent:
+                values["status"] = OutboxStatus.failed
+            else:
+                values["status"] = OutboxStatus.pending
+                values["available_at"] = now + _retry_delay(c["attempts"])
+            n = _held(s.query(NotificationOutbox).filter(NotificationOutbox.id_outbox == c["id_outbox"]), c).update(
+                values, synchronize_session=False
+            )
+            if not n:
+                stats["lost"] += 1
+            else:
+                stats["failed" if permanent else "retry"] += 1
+        s.commit()
+    if stats["lost"]:
+        logger.warning(f"{stats['lost']} baris outbox tidak difinalisasi: lease sudah diambil worker lain")
+    return stats
+
+
+def dispatch_outbox(outbox_ids: Optional[List[str]] = None, batch_size: Optional[int] = None) -> Dict[str, int]:
+    """
+    Klaim satu batch outbox, kirim FCM secara bulk (send_each per 500 pesan,
+    chunk dikirim paralel), lalu tandai sent/retry/failed. Tidak ada transaksi DB yang terbuka selama
+    panggilan FCM berlangsung.
+    """
+    batch_size = batch_size or int(_cfg("NOTIF_OUTBOX_BATCH_SIZE", 100))
+    claimed = _claim_outbox(batch_size, outbox_ids)
+    stats = {"claimed": len(claimed), "sent": 0, "retry": 0, "failed": 0, "lost": 0}
+    if not claimed:
+        return stats
+
+    tokens_by_user = _load_tokens([c["id_user"] for c in claimed])
+
+    messages: List[messaging.Message] = []
+    owners: List[int] = []
+    msg_tokens: List[str] = []
+    for idx, c in enumerate(claimed):
+        tokens = tokens_by_user.get(c["id_user"], [])
+        if not tokens:
+            c["no_tokens"] = True
+        for t in tokens:
+            messages.append(_build_message(t, c["payload"]))
+            owners.append(idx)
+            msg_tokens.append(t)
+
+    # Kirim per gelombang (satu putaran chunk paralel); lease diperpanjang
+    # sebelum tiap gelombang berikutnya agar worker lain tidak mengklaim ulang
+    # baris yang sedang dikirim (push ganda).
+    wave = FCM_BATCH_LIMIT * max(1, int(_cfg("NOTIF_FCM_MAX_WORKERS", 4)))
+    results: List[_SendResult] = []
+    for i in range(0, len(messages), wave):
+        if i:
+            _extend_lease(claimed)
+        results.extend(_send_messages(messages[i:i + wave]))
+    observe_fcm(str(_cfg("NOTIF_FCM_TRANSPORT", "sdk")).lower(), results)
+
+    delivered = [False] * len(claimed)
+    errors: List[Optional[str]] = [None] * len(claimed)
+    for owner, res in zip(owners, results):
+        if res.success:
+            delivered[owner] = True
+        elif errors[owner] is None:
+            errors[owner] = f"{res.error_code}: {res.exception or 'FCM send gagal'}"
+
+    outcomes: List[Optional[str]] = []
+    for idx, c in enumerate(claimed):
+        if delivered[idx]:
+            outcomes.append(None)
+        elif c.get("no_tokens"):
+            outcomes.append("Tidak ada device/token FCM aktif")
+        else:
+            outcomes.append(errors[idx] or "FCM send gagal")
+
+    stats.update(_finalize_outbox(claimed, outcomes, msg_tokens, results))
+    observe_outbox(stats)
+    logger.info(
+        f"Outbox notifikasi: {stats['claimed']} diklaim, {stats['sent']} terkirim, "
+        f"{stats['retry']} dijadwalkan ulang, {stats['failed']} gagal, {stats['lost']} lease hilang "
+        f"({len(messages)} pesan FCM)"
     )
-    tokens = [d.fcm_token for d in devices if d.fcm_token]
-    if not tokens:
-        # Ganti print dengan logger.warning
-        logger.warning(f"Tidak ada device/token FCM aktif untuk user '{user_id}'.")
-        return
+    return stats
+
 
-    # Render judul & body dari template
-    title = _format_message(template.title_template or "", dynamic_data)
-    body = _format_message(template.body_template or "", dynamic_data)
+# ---------- Public API ----------
 
-    # Simpan record notifikasi ke DB (TANPA event_trigger, karena kolom itu tidak ada di model Notification)
-    notif = Notification(
-        id_user=user_id,
-        title=title,
-        body=body,
+def _notification_rows(
+    template: _CachedTemplate, event_trigger: str, user_id: str, dynamic_data: Dict[str, Any], now
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Susun nilai kolom Notification (inbox) dan NotificationOutbox untuk satu penerima."""
+    # Render judul & body dari template (placeholder sudah di-parse di cache)
+    title, body = template.render(dynamic_data)
+    notif_id = str(uuid.uuid4())
+
+    notif = {
+        "id_notification": notif_id,
+        "id_user": user_id,
+        "title": title,
+        "body": body,
         # Masukkan event_trigger & dynamic_data ke data_json supaya tetap terlacak di sisi server
-        data_json=json.dumps(
-            {"event_trigger": event_trigger, "meta": dynamic_data},
-            default=str
-        ),
-        # Optional: related_table/related_id bisa diisi oleh caller di masa depan
-        created_at=datetime.utcnow(),
-    )
-    try:
-        session.add(notif)
-        session.flush() # dapatkan id_notification untuk dipakai di payload
-        logger.info(f"Notification record created for user '{user_id}' with ID: {notif.id_notification}")
-    except Exception as e:
-        session.rollback()
-        logger.error(f"Gagal menyimpan record notifikasi ke DB untuk user '{user_id}': {e}", exc_info=True)
-        return # Hentikan proses jika gagal simpan ke DB
+        "data_json": json.dumps({"event_trigger": event_trigger, "meta": dynamic_data}, default=str),
+        "status": NotificationStatus.unread,
+        "created_at": now,
+        "updated_at": now,
+    }
 
-    # Susun payload FCM sebagai DATA MESSAGE agar bisa diterima di background (Android/iOS)
     data_payload: Dict[str, str] = {
         "title": title,
         "body": body,
-        "notification_id": str(notif.id_notification),
+        "notification_id": notif_id,
         "event_trigger": event_trigger,
         # Klien bisa parse 'meta' untuk detail tambahan (status_absensi, jam, dll)
         "meta": json.dumps(dynamic_data, default=str),
     }
+    outbox = {
+        "id_outbox": str(uuid.uuid4()),
+        "id_notification": notif_id,
+        "id_user": user_id,
+        "event_trigger": event_trigger,
+        "payload_json": json.dumps(data_payload),
+        "status": OutboxStatus.pending,
+        "attempts": 0,
+        "available_at": now,
+        "created_at": now,
+        "updated_at": now,
+    }
+    return notif, outbox
 
-    multicast = messaging.MulticastMessage(
-        tokens=tokens,
-        data=data_payload,
-        android=messaging.AndroidConfig(priority="high"),
-        apns=messaging.APNSConfig(
-            payload=messaging.APNSPayload(
-                aps=messaging.Aps(content_available=True)
-            )
-        ),
-    )
 
-    # Kirim notifikasi (kompatibel lintas versi Admin SDK)
+def stage_notification(event_trigger: str, user_id: str, dynamic_data: Dict[str, Any], session: Session) -> Optional[str]:
+    """
+    Tulis Notification (inbox) + baris NotificationOutbox 'pending' ke session
+    pemanggil TANPA commit, sehingga ikut transaksi perubahan data (mis. check-in).
+    Return id_outbox, atau None jika template tidak ada/tidak aktif.
+    """
     try:
-        response = _send_multicast_compat(multicast, tokens)
-        # Ganti print dengan logger.info
-        logger.info(
-            f"Notifikasi dikirim untuk user '{user_id}': "
-            f"{response.success_count} sukses, {response.failure_count} gagal"
-        )
-        if getattr(response, "failure_count", 0):
-            failed_tokens = []
-            for idx, resp in enumerate(getattr(response, "responses", []) or []):
-                if not getattr(resp, "success", False):
-                    failed_tokens.append(tokens[idx])
-            if failed_tokens:
-                 # Ganti print dengan logger.warning
-                logger.warning(f"Token FCM yang gagal untuk user '{user_id}': {failed_tokens}")
-                # TODO: tandai token gagal (disable / hapus) di DB bila diperlukan
+        template = _get_template(session, event_trigger)
+    except Exception as e:
+        logger.error(f"Gagal mengambil template notifikasi '{event_trigger}': {e}", exc_info=True)
+        return None
+    if not template:
+        logger.warning(f"Template notifikasi untuk event '{event_trigger}' tidak ditemukan/ tidak aktif.")
+        return None
+
+    notif, outbox = _notification_rows(template, event_trigger, user_id, dynamic_data, _now())
+    session.add(Notification(**notif))
+    session.add(NotificationOutbox(**outbox))
+    mark_unread_dirty(session, [user_id])
+    return outbox["id_outbox"]
+
+
+def send_notification(event_trigger: str, user_id: str, dynamic_data: Dict[str, Any], session: Session) -> None:
+    """
+    Kirim notifikasi push untuk user tertentu berdasarkan NotificationTemplate.event_trigger.
+    - Simpan Notification + outbox 'pending', commit.
+    - Baru setelah commit berhasil, kirim FCM untuk baris outbox tersebut.
+      Bila FCM gagal, baris tetap di outbox dan dicoba ulang oleh dispatcher.
+    """
+    outbox_id = stage_notification(event_trigger, user_id, dynamic_data, session)
+    if outbox_id is None:
+        return
+
+    try:
+        session.commit()
     except Exception as e:
-        # --- Ganti print dengan logger.exception ---
-        logger.exception(f"Gagal total mengirim notifikasi FCM untuk user '{user_id}': {e}")
-        # Rollback DB commit jika FCM gagal? Tergantung kebutuhan.
-        # Jika notifikasi di DB harus ada walau push gagal, jangan rollback.
-        # Jika notifikasi DB hanya relevan jika push berhasil, uncomment rollback di bawah.
-        # session.rollback()
-        # return # Hentikan jika FCM gagal
-
-    # Commit perubahan DB (jika tidak di-rollback di atas)
+        session.rollback()
+        logger.error(f"Gagal commit notifikasi ke DB untuk user '{user_id}': {e}", exc_info=True)
+        return
+
     try:
+        dispatch_outbox(outbox_ids=[outbox_id])
+    except Exception as e:
+        logger.exception(f"Gagal mengirim notifikasi FCM untuk user '{user_id}' (akan dicoba ulang): {e}")
+
+
+def send_notification_bulk(
+    event_trigger: str,
+    recipients: Iterable[Tuple[str, Dict[str, Any]]],
+    session: Session,
+    dispatch: bool = True,
+) -> Dict[str, int]:
+    """
+    Fan-out satu event ke banyak user (mis. NEW_SHIFT_PUBLISHED, broadcast).
+    recipients: iterable (user_id, dynamic_data).
+
+    Biaya tetap berapa pun jumlah penerima: satu lookup template (cache),
+    satu bulk INSERT Notification + satu bulk INSERT outbox, satu commit,
+    lalu dispatch dengan satu query device (IN) per batch dan FCM per 500
+    pesan secara paralel. Dengan dispatch=False baris hanya ditulis ke outbox
+    dan dikirim oleh dispatcher periodik.
+    """
+    recipients = [(uid, data or {}) for uid, data in recipients if uid]
+    stats = {"recipients": len(recipients), "claimed": 0, "sent": 0, "retry": 0, "failed": 0}
+    if not recipients:
+        return stats
+
+    template = _get_template(session, event_trigger)
+    if not template:
+        logger.warning(f"Template notifikasi untuk event '{event_trigger}' tidak ditemukan/ tidak aktif.")
+        return stats
+
+    now = _now()
+    notif_rows: List[Dict[str, Any]] = []
+    outbox_rows: List[Dict[str, Any]] = []
+    for user_id, data in recipients:
+        notif, outbox = _notification_rows(template, event_trigger, user_id, data, now)
+        notif_rows.append(notif)
+        outbox_rows.append(outbox)
+
+    try:
+        session.execute(insert(Notification), notif_rows)
+        session.execute(insert(NotificationOutbox), outbox_rows)
+        mark_unread_dirty(session, [uid for uid, _ in recipients])
         session.commit()
     except Exception as e:
         session.rollback()
-         # Ganti print dengan logger.error
-        logger.error(f"Gagal commit notifikasi ke DB untuk user '{user_id}': {e}", exc_info=True)
\ No newline at end of file
+        logger.error(f"Gagal menyimpan {len(notif_rows)} notifikasi '{event_trigger}': {e}", exc_info=True)
+        raise
+
+    if not dispatch:
+        return stats
+
+    batch = int(_cfg("NOTIF_BULK_DISPATCH_BATCH", 2000))
+    ids = [r["id_outbox"] for r in outbox_rows]
+    for i in range(0, len(ids), batch):
+        part = ids[i:i + batch]
+        try:
+            res = dispatch_outbox(outbox_ids=part, batch_size=len(part))
+        except Exception as e:
+            # Baris tetap pending dan akan diambil dispatcher periodik
+            logger.exception(f"Gagal dispatch bulk '{event_trigger}' ({len(part)} penerima): {e}")
+            continue
+        for key in ("claimed", "sent", "retry", "failed"):
+            stats[key] += res.get(key, 0)
+    return stats
@@ -0,0 +1,302 @@
+# app/services/schedule_cache.py
+"""
+Cache jadwal kerja efektif (ShiftKerja JOIN PolaKerja) per (user, tanggal).
+
+Dipakai check-in (status tepat/terlambat) dan validasi jendela istirahat,
+yang sebelumnya menjalankan query join yang sama di setiap event padahal
+jadwal berubah paling sering mingguan.
+
+Lapisan:
+  1. dict per proses, TTL SCHEDULE_CACHE_TTL (hasil "tidak ada jadwal" ikut
+     di-cache)
+  2. Redis opsional: satu key per (user, tanggal) sched:<id_user>:<tanggal>
+     dengan TTL sendiri, dibagi semua worker API/Celery. Nilainya dicap
+     dengan sched:epoch saat dibaca dari DB; cap yang tidak sama dengan
+     epoch sekarang dianggap miss.
+  3. DB
+
+Invalidasi (semuanya menaikkan sched:epoch):
+  - invalidate_schedule(user_ids) / invalidate_schedule() (semua) menghapus
+    cache lokal lalu menaikkan epoch, sehingga seluruh entri Redis usang
+    sekaligus (publish jadwal jarang; biaya isi ulang satu query per
+    user/tanggal). Proses lain melihat epoch baru (dicek paling sering sekali
+    per detik) dan mengosongkan cache lokalnya.
+  - Event notifikasi SCHEDULE_EVENTS (mis. NEW_SHIFT_PUBLISHED) memanggil
+    invalidasi untuk user penerima; sistem lain bisa memanggil task
+    absensi.invalidate_schedule_task.
+  - Cadangan bila perubahan ditulis langsung ke DB: versi tabel shift_kerja/
+    pola_kerja dicek paling sering sekali per SCHEDULE_VERSION_CHECK detik;
+    bila berubah, invalidate_schedule() dipanggil (lokal + Redis).
+  - Tanpa Redis (atau saat Redis mati) invalidasi hanya berlaku di proses
+    pemanggil; proses lain baru melihat perubahan lewat cek versi tabel atau
+    TTL. Setelah satu kegagalan Redis, Redis dilewati selama
+    _REDIS_BACKOFF_SECONDS agar outage tidak menambah timeout socket ke
+    setiap lookup check-in.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..db import get_read_session
+from ..db.models import PolaKerja, ShiftKerja
+from ..extensions import get_redis
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_EVENTS = frozenset({"NEW_SHIFT_PUBLISHED", "SHIFT_UPDATED"})
+
+_REDIS_KEY = "sched:{}:{}"
+_EPOCH_KEY = "sched:epoch"
+_REDIS_BACKOFF_SECONDS = 15.0
+_DT_FIELDS = ("jam_mulai", "jam_selesai", "jam_istirahat_mulai", "jam_istirahat_selesai")
+
+
+def _cfg(name: str, default: Any) -> Any:
+    try:
+        return current_app.config.get(name, default)
+    except RuntimeError:
+        return default
+
+
+class ScheduleEntry(NamedTuple):
+    """Snapshot jadwal efektif user pada satu tanggal (lepas dari session)."""
+
+    id_shift_kerja: str
+    id_pola_kerja: str
+    status: Optional[str]
+    jam_mulai: Optional[datetime]
+    jam_selesai: Optional[datetime]
+    jam_istirahat_mulai: Optional[datetime]
+    jam_istirahat_selesai: Optional[datetime]
+    maks_jam_istirahat: Optional[int]
+
+    def to_json(self) -> str:
+        data = self._asdict()
+        for f in _DT_FIELDS:
+            data[f] = data[f].isoformat() if data[f] else None
+        return json.dumps(data, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, raw: str) -> Optional["ScheduleEntry"]:
+        data = json.loads(raw)
+        if data is None:
+            return None
+        for f in _DT_FIELDS:
+            data[f] = datetime.fromisoformat(data[f]) if data[f] else None
+        return cls(**data)
+
+
+_cache: Dict[Tuple[str, str], Tuple[float, Optional[ScheduleEntry]]] = {}
+_cache_lock = threading.Lock()
+_table_version: Optional[tuple] = None
+_version_checked_at = 0.0
+_epoch_seen: Optional[bytes] = None
+_epoch_checked_at = 0.0
+_redis_skip_until = 0.0
+_stats = {"hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0}
+
+
+def schedule_cache_stats() -> Dict[str, int]:
+    with _cache_lock:
+        return {**_stats, "entries": len(_cache)}
+
+
+def _redis():
+    """Client Redis, atau None bila tidak dikonfigurasi / masih dalam backoff."""
+    if time.monotonic() < _redis_skip_until:
+        return None
+    return get_redis()
+
+
+def _redis_failed(op: str, e: Exception) -> None:
+    global _redis_skip_until
+    _redis_skip_until = time.monotonic() + _REDIS_BACKOFF_SECONDS
+    logger.warning(f"Redis {op} jadwal gagal, Redis dilewati {_REDIS_BACKOFF_SECONDS:.0f} detik: {e}")
+
+
+# ---------- Invalidasi ----------
+
+def invalidate_schedule(user_ids: Optional[Iterable[str]] = None) -> None:
+    """
+    Hapus cache jadwal user tertentu (None = semua user). Proses lain ikut
+    lewat sched:epoch hanya bila Redis tersedia; tanpa Redis hanya cache
+    proses ini yang dihapus (proses lain menunggu cek versi tabel/TTL).
+    """
+    uids = None if user_ids is None else {u for u in user_ids if u}
+    if uids is not None and not uids:
+        return
+    with _cache_lock:
+        if uids is None:
+            _cache.clear()
+        else:
+            for key in [k for k in _cache if k[0] in uids]:
+                _cache.pop(key, None)
+        _stats["invalidations"] += 1
+
+    r = get_redis()
+    if r is None:
+        return
+    try:
+        r.incr(_EPOCH_KEY)
+    except Exception as e:
+        # TTL / cek versi tabel tetap membatasi umur cache basi
+        _redis_failed("invalidasi", e)
+
+
+def _shift_table_version(session: Session) -> tuple:
+    return tuple(
+        session.execute(
+            select(
+                select(func.count()).select_from(ShiftKerja).scalar_subquery(),
+                select(func.max(ShiftKerja.updated_at)).scalar_subquery(),
+                select(func.max(ShiftKerja.deleted_at)).scalar_subquery(),
+                select(func.max(PolaKerja.updated_at)).scalar_subquery(),
+            )
+        ).one()
+    )
+
+
+def _check_epoch(r, now: float) -> None:
+    """Kosongkan cache lokal bila proses lain sudah menaikkan sched:epoch."""
+    global _epoch_seen, _epoch_checked_at
+    # paling sering sekali per detik agar cache hit tidak selalu round-trip Redis
+    if now - _epoch_checked_at < 1.0:
+        return
+    _epoch_checked_at = now
+    try:
+        epoch = r.get(_EPOCH_KEY)
+    except Exception as e:
+        _redis_failed("get epoch", e)
+        return
+    if epoch != _epoch_seen:
+        with _cache_lock:
+            if _epoch_seen is not None:
+                _cache.clear()
+            _epoch_seen = epoch
+
+
+def _check_table_version(session: Optional[Session], now: float) -> None:
+    global _table_version, _version_checked_at
+    with _cache_lock:
+        if now - _version_checked_at < float(_cfg("SCHEDULE_VERSION_CHECK", 30)):
+            return
+        _version_checked_at = now
+    if session is not None:
+        version = _shift_table_version(session)
+    else:
+        with get_read_session() as s:
+            version = _shift_table_version(s)
+    with _cache_lock:
+        changed = _table_version is not None and version != _table_version
+        _table_version = version
+    if changed:
+        logger.info("Cache jadwal dikosongkan: tabel shift/pola kerja berubah")
+        invalidate_schedule()
+
+
+# ---------- Lookup ----------
+
+def _load(session: Session, user_id: str, day: date) -> Optional[ScheduleEntry]:
+    row = session.execute(
+        select(
+            ShiftKerja.id_shift_kerja,
+            ShiftKerja.status,
+            PolaKerja.id_pola_kerja,
+            PolaKerja.jam_mulai,
+            PolaKerja.jam_selesai,
+            PolaKerja.jam_istirahat_mulai,
+            PolaKerja.jam_istirahat_selesai,
+            PolaKerja.maks_jam_istirahat,
+        )
+        .join(PolaKerja, ShiftKerja.id_pola_kerja == PolaKerja.id_pola_kerja)
+        .where(
+            ShiftKerja.id_user == user_id,
+            ShiftKerja.tanggal_mulai <= day,
+            ShiftKerja.tanggal_selesai >= day,
+        )
+        .limit(1)
+    ).first()
+    if row is None:
+        return None
+    return ScheduleEntry(
+        id_shift_kerja=row.id_shift_kerja,
+        id_pola_kerja=row.id_pola_kerja,
+        status=row.status.value if hasattr(row.status, "value") else row.status,
+        jam_mulai=row.jam_mulai,
+        jam_selesai=row.jam_selesai,
+        jam_istirahat_mulai=row.jam_istirahat_mulai,
+        jam_istirahat_selesai=row.jam_istirahat_selesai,
+        maks_jam_istirahat=row.maks_jam_istirahat,
+    )
+
+
+def resolve_schedule(session: Optional[Session], user_id: str, day: date) -> Optional[ScheduleEntry]:
+    """
+    Jadwal efektif user pada tanggal `day` (None bila tidak ada shift).
+    `session` hanya dipakai saat cache miss / cek versi; None = buka session
+    baca sendiri.
+    """
+    ttl = float(_cfg("SCHEDULE_CACHE_TTL", 300))
+    key = (user_id, day.isoformat())
+    now = time.monotonic()
+
+    r = _redis()
+    if r is not None:
+        _check_epoch(r, now)
+        r = _redis()  # None bila cek epoch barusan gagal (backoff)
+    _check_table_version(session, now)
+
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None and hit[0] > now:
+            _stats["hits"] += 1
+            return hit[1]
+
+    epoch = None
+    if r is not None:
+        try:
+            epoch, raw = r.mget(_EPOCH_KEY, _REDIS_KEY.format(user_id, key[1]))
+            epoch = epoch.decode() if isinstance(epoch, bytes) else epoch
+            if raw is not None:
+                cached = json.loads(raw)
+                if cached.get("e") == epoch:
+                    entry = ScheduleEntry.from_json(json.dumps(cached["v"])) if cached["v"] else None
+                    with _cache_lock:
+                        _cache[key] = (now + ttl, entry)
+                        _stats["redis_hits"] += 1
+                    return entry
+        except Exception as e:
+            _redis_failed("get", e)
+            r = None
+
+    if session is not None:
+        entry = _load(session, user_id, day)
+    else:
+        with get_read_session(user_id) as s:
+            entry = _load(s, user_id, day)
+
+    with _cache_lock:
+        _cache[key] = (now + ttl, entry)
+        _stats["misses"] += 1
+        if len(_cache) > int(_cfg("SCHEDULE_CACHE_MAX_ENTRIES", 50000)):
+            for k in [k for k, (exp, _) in _cache.items() if exp <= now]:
+                _cache.pop(k, None)
+    if r is not None:
+        try:
+            # Cap epoch yang dibaca SEBELUM query: invalidasi di tengah jalan
+            # membuat entri ini langsung usang, bukan menimpa data baru
+            value = {"e": epoch, "v": json.loads(entry.to_json()) if entry else None}
+            r.set(_REDIS_KEY.format(user_id, key[1]), json.dumps(value, separators=(",", ":")), ex=max(1, int(ttl)))
+        except Exception as e:
+            _redis_failed("set", e)
+    return entry
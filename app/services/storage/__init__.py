@@ -0,0 +1,35 @@
+# app/services/storage/__init__.py
+"""
+Pilih backend storage lewat STORAGE_BACKEND: supabase (default) atau local
+(filesystem di STORAGE_LOCAL_DIR, untuk dev/benchmark/load test).
+"""
+
+from flask import current_app
+
+from . import local_storage, supabase_storage
+from .supabase_storage import build_catatan_path
+
+
+def _backend():
+    if str(current_app.config.get("STORAGE_BACKEND", "supabase")).lower() == "local":
+        return local_storage
+    return supabase_storage
+
+
+def upload_bytes(path: str, data: bytes, content_type: str) -> str:
+    return _backend().upload_bytes(path, data, content_type)
+
+
+def signed_url(path: str, expires_in: int = None) -> str:
+    return _backend().signed_url(path, expires_in)
+
+
+def download(path: str) -> bytes:
+    return _backend().download(path)
+
+
+def list_objects(prefix: str):
+    return _backend().list_objects(prefix)
+
+
+__all__ = ["upload_bytes", "signed_url", "download", "list_objects", "build_catatan_path"]
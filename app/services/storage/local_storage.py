@@ -0,0 +1,56 @@
+from ...metrics import timed_storage
+from ...tracing import traced
+from flask import current_app
+import os
+from urllib.parse import quote
+
+# Backend storage di filesystem lokal (STORAGE_BACKEND=local) untuk dev,
+# benchmark, dan load test. API sama dengan supabase_storage.
+
+def _root() -> str:
+    return os.path.abspath(current_app.config.get("STORAGE_LOCAL_DIR") or "storage_local")
+
+def _full_path(path: str) -> str:
+    root = _root()
+    full = os.path.abspath(os.path.join(root, path.lstrip("/")))
+    if os.path.commonpath([root, full]) != root:
+        raise ValueError(f"Path storage tidak valid: {path}")
+    return full
+
+@traced("storage.upload", backend="local")
+@timed_storage("upload", backend="local")
+def upload_bytes(path: str, data: bytes, content_type: str) -> str:
+    full = _full_path(path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    tmp = f"{full}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, full)  # upsert atomik
+    return path
+
+@traced("storage.signed_url", backend="local")
+@timed_storage("signed_url", backend="local")
+def signed_url(path: str, expires_in: int = None) -> str:
+    base = current_app.config.get("STORAGE_LOCAL_BASE_URL")
+    if base:
+        return f"{base.rstrip('/')}/{quote(path.lstrip('/'))}"
+    return f"file://{quote(_full_path(path))}"
+
+@traced("storage.download", backend="local")
+@timed_storage("download", backend="local")
+def download(path: str) -> bytes:
+    with open(_full_path(path), "rb") as fh:
+        return fh.read()
+
+@traced("storage.list", backend="local")
+@timed_storage("list", backend="local")
+def list_objects(prefix: str):
+    directory = _full_path(prefix)
+    if not os.path.isdir(directory):
+        return []
+    prefix = prefix.strip("/")
+    return [
+        {"name": name, "path": f"{prefix}/{name}"}
+        for name in sorted(os.listdir(directory))
+        if os.path.isfile(os.path.join(directory, name)) and ".tmp-" not in name
+    ]
@@ -1,10 +1,14 @@
 from ...extensions import get_supabase
+from ...metrics import timed_storage
+from ...tracing import traced
 from flask import current_app
 import os
 import re
 from datetime import datetime
 from uuid import uuid4
 
+@traced("storage.upload", backend="supabase")
+@timed_storage("upload")
 def upload_bytes(path: str, data: bytes, content_type: str) -> str:
     sb = get_supabase()
     assert sb is not None, "Supabase not configured"
@@ -14,6 +18,8 @@ def upload_bytes(path: str, data: bytes, content_type: str) -> str:
     })
     return path
 
+@traced("storage.signed_url", backend="supabase")
+@timed_storage("signed_url")
 def signed_url(path: str, expires_in: int = None) -> str:
     sb = get_supabase()
     assert sb is not None, "Supabase not configured"
@@ -22,11 +28,15 @@ def signed_url(path: str, expires_in: int = None) -> str:
     res = sb.storage.from_(current_app.config["SUPABASE_BUCKET"]).create_signed_url(path, expires_in)
     return res["signedURL"] if isinstance(res, dict) and "signedURL" in res else str(res)
 
+@traced("storage.download", backend="supabase")
+@timed_storage("download")
 def download(path: str) -> bytes:
     sb = get_supabase()
     assert sb is not None, "Supabase not configured"
     return sb.storage.from_(current_app.config["SUPABASE_BUCKET"]).download(path)
 
+@traced("storage.list", backend="supabase")
+@timed_storage("list")
 def list_objects(prefix: str):
     sb = get_supabase()
     assert sb is not None, "Supabase not configured"
@@ -0,0 +1,89 @@
+# app/tasks/notification_tasks.py
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.extensions import celery
+from app.db import get_db
+from app.services.notification_service import send_notification, send_notification_bulk, dispatch_outbox
+from app.services.notification_retention import purge_notifications
+from app.services.schedule_cache import SCHEDULE_EVENTS, invalidate_schedule
+
+logger = logging.getLogger(__name__)
+
+
+@celery.task(name="notifications.send_notification_task", bind=True, ignore_result=True)
+def send_notification_task(self, event_trigger: str, user_id: str, dynamic_data: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Kirim notifikasi di worker queue 'notifications'.
+    Dipakai oleh pemanggil yang tidak punya transaksi DB sendiri (mis. enroll);
+    task absensi menulis outbox langsung di transaksinya (stage_notification).
+    """
+    if event_trigger in SCHEDULE_EVENTS:
+        invalidate_schedule([user_id])
+    s = get_db()
+    send_notification(
+        event_trigger=event_trigger,
+        user_id=user_id,
+        dynamic_data=dynamic_data or {},
+        session=s,
+    )
+
+
+@celery.task(name="notifications.send_notification_bulk_task", bind=True, ignore_result=True)
+def send_notification_bulk_task(self, event_trigger: str, recipients: List[List[Any]]) -> Dict[str, int]:
+    """
+    Fan-out satu event ke banyak user. recipients: [[user_id, dynamic_data], ...]
+    (list, bukan tuple, karena payload Celery berformat JSON).
+    Event jadwal (SCHEDULE_EVENTS) sekaligus menghapus cache jadwal penerima.
+    """
+    if event_trigger in SCHEDULE_EVENTS:
+        invalidate_schedule(r[0] for r in recipients)
+    s = get_db()
+    return send_notification_bulk(
+        event_trigger,
+        [(r[0], r[1] if len(r) > 1 else {}) for r in recipients],
+        session=s,
+    )
+
+
+@celery.task(name="notifications.dispatch_outbox_task", bind=True, ignore_result=True)
+def dispatch_outbox_task(self, outbox_ids: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Kirim baris outbox yang pending. Dipanggil langsung setelah commit
+    (dengan outbox_ids) dan periodik oleh celery beat untuk retry/sisa batch.
+    """
+    return dispatch_outbox(outbox_ids=outbox_ids)
+
+
+@celery.task(name="notifications.purge_notifications_task", bind=True, ignore_result=True)
+def purge_notifications_task(self) -> Dict[str, Any]:
+    """
+    Retensi harian (celery beat): arsipkan/hapus notifikasi read yang lebih tua
+    dari NOTIF_RETENTION_DAYS. Jika masih ada sisa setelah batas batch per run,
+    task dijadwalkan ulang sebentar lagi supaya backlog lama tetap habis bertahap.
+    """
+    stats = purge_notifications()
+    if not stats.get("done", True):
+        self.apply_async(countdown=60)
+    return stats
+
+
+def enqueue_notification(event_trigger: str, user_id: str, dynamic_data: Dict[str, Any]) -> None:
+    """Enqueue send_notification_task; kegagalan broker tidak menggagalkan pemanggil."""
+    try:
+        send_notification_task.delay(event_trigger, user_id, dynamic_data)
+    except Exception as e:
+        logger.warning(f"Gagal enqueue notifikasi '{event_trigger}' untuk user '{user_id}': {e}", exc_info=True)
+
+
+def kick_outbox_dispatcher(outbox_ids: Optional[List[str]] = None) -> None:
+    """
+    Minta dispatcher segera mengirim outbox tertentu. Jika broker bermasalah,
+    baris tetap 'pending' dan akan diambil oleh jadwal periodik.
+    """
+    try:
+        dispatch_outbox_task.delay(outbox_ids)
+    except Exception as e:
+        logger.warning(f"Gagal enqueue dispatch outbox {outbox_ids}: {e}", exc_info=True)
@@ -0,0 +1,252 @@
+# app/tracing.py
+"""
+Tracing OpenTelemetry (opsional): request Flask -> enqueue Celery -> task ->
+DB / storage / FCM dalam satu trace.
+
+- Context W3C (traceparent) dari header request diteruskan ke header pesan
+  Celery (before_task_publish) dan dipulihkan di worker (FlaskContextTask).
+- Span: request HTTP, publish & eksekusi task, tiap statement SQL,
+  decode_image, get_embedding, operasi Supabase, kirim FCM.
+- Exporter (TRACING_EXPORTER): otlp (OTEL_EXPORTER_OTLP_ENDPOINT, http/protobuf),
+  file (JSON Lines ke TRACING_FILE) atau console.
+
+Aktif bila TRACING_ENABLED dan paket opentelemetry-sdk terpasang; selain itu
+traced()/span() tidak melakukan apa-apa.
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from flask import Flask, request
+
+logger = logging.getLogger(__name__)
+
+try:
+    from opentelemetry import context as otel_context
+    from opentelemetry import propagate, trace
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:  # pragma: no cover - paket opsional
+    trace = None
+
+_tracer = None
+_init_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def _build_exporter(kind: str, path: str):
+    if kind == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter()  # endpoint/header dari env OTEL_EXPORTER_OTLP_*
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    if kind == "file":
+        fh = open(path, "a", encoding="utf-8", buffering=1)
+        return ConsoleSpanExporter(out=fh, formatter=lambda s: s.to_json(indent=None) + "\n")
+    return ConsoleSpanExporter()
+
+
+def init_tracing(app: Flask) -> None:
+    """Siapkan TracerProvider sekali per proses (dipanggil dari init_app)."""
+    global _tracer
+    if _tracer is not None or not app.config.get("TRACING_ENABLED"):
+        return
+    if trace is None:
+        logger.warning("TRACING_ENABLED tetapi opentelemetry tidak terpasang; tracing dimatikan.")
+        return
+    with _init_lock:
+        if _tracer is not None:
+            return
+        try:
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+            provider = TracerProvider(
+                resource=Resource.create({"service.name": app.config.get("OTEL_SERVICE_NAME", "api-absensi")}),
+                sampler=ParentBased(TraceIdRatioBased(float(app.config.get("TRACING_SAMPLE_RATIO", 1.0)))),
+            )
+            exporter = _build_exporter(
+                str(app.config.get("TRACING_EXPORTER", "otlp")).lower(),
+                app.config.get("TRACING_FILE", "traces.jsonl"),
+            )
+            # BatchSpanProcessor membuat ulang thread ekspornya setelah fork
+            provider.add_span_processor(BatchSpanProcessor(exporter))
+            trace.set_tracer_provider(provider)
+            _tracer = trace.get_tracer("api-absensi")
+        except Exception:
+            logger.exception("Gagal inisialisasi tracing; tracing dimatikan.")
+
+
+# ---------- Span manual ----------
+
+@contextmanager
+def span(name: str, attributes: Optional[Dict[str, Any]] = None, kind=None):
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name, kind=kind or SpanKind.INTERNAL, attributes=attributes) as sp:
+        yield sp
+
+
+def traced(name: str, **attributes):
+    """Decorator: bungkus fungsi dalam satu span (exception dicatat di span)."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return fn(*args, **kwargs)
+            with span(name, attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+# ---------- SQL ----------
+
+def instrument_engine(engine) -> None:
+    """Span per statement SQL (dipanggil saat engine dibuat)."""
+    if _tracer is None:
+        return
+    from sqlalchemy import event
+
+    system = engine.dialect.name
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        sp = _tracer.start_span(
+            f"sql {statement.split(None, 1)[0].upper() if statement else 'SQL'}",
+            kind=SpanKind.CLIENT,
+            attributes={"db.system": system, "db.statement": " ".join(statement.split())[:1000]},
+        )
+        conn.info.setdefault("_trace_spans", []).append(sp)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("_trace_spans")
+        if spans:
+            spans.pop().end()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("_trace_spans") if conn is not None else None
+        if spans:
+            sp = spans.pop()
+            sp.record_exception(exception_context.original_exception)
+            sp.set_status(Status(StatusCode.ERROR))
+            sp.end()
+
+
+# ---------- Flask ----------
+
+_ENV_KEY = "tracing.span"
+
+
+def _before_request():
+    ctx = propagate.extract(request.headers)
+    token = otel_context.attach(ctx)
+    sp = _tracer.start_span(
+        f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+        kind=SpanKind.SERVER,
+        attributes={"http.method": request.method, "http.target": request.path},
+    )
+    span_token = otel_context.attach(trace.set_span_in_context(sp))
+    request.environ[_ENV_KEY] = (sp, span_token, token)
+
+
+def _after_request(response):
+    entry = request.environ.get(_ENV_KEY)
+    if entry is not None:
+        entry[0].set_attribute("http.status_code", response.status_code)
+        if response.status_code >= 500:
+            entry[0].set_status(Status(StatusCode.ERROR))
+    return response
+
+
+def _teardown_request(exc=None):
+    entry = request.environ.pop(_ENV_KEY, None)
+    if entry is None:
+        return
+    sp, span_token, token = entry
+    if exc is not None:
+        sp.record_exception(exc)
+        sp.set_status(Status(StatusCode.ERROR))
+    sp.end()
+    otel_context.detach(span_token)
+    otel_context.detach(token)
+
+
+# ---------- Celery ----------
+
+_publish_spans: Dict[str, Any] = {}
+
+
+def _before_publish(sender=None, headers=None, **kwargs):
+    if headers is None:
+        return
+    task_id = headers.get("id")
+    sp = _tracer.start_span(f"celery.publish {sender}", kind=SpanKind.PRODUCER, attributes={"celery.task_id": str(task_id)})
+    # Header pesan protokol 2 menjadi atribut task.request di worker
+    propagate.inject(headers, context=trace.set_span_in_context(sp))
+    if task_id:
+        _publish_spans[task_id] = sp
+    else:
+        sp.end()
+
+
+def _after_publish(sender=None, headers=None, **kwargs):
+    sp = _publish_spans.pop((headers or {}).get("id"), None)
+    if sp is not None:
+        sp.end()
+
+
+class _RequestGetter:
+    def get(self, carrier, key):
+        value = getattr(carrier, key, None)
+        if value is None and isinstance(getattr(carrier, "headers", None), dict):
+            value = carrier.headers.get(key)
+        return [value] if isinstance(value, str) else value
+
+    def keys(self, carrier):
+        return []
+
+
+@contextmanager
+def task_span(task):
+    """Span eksekusi task, anak dari span publish di proses pengirim."""
+    if _tracer is None:
+        yield None
+        return
+    ctx = propagate.extract(task.request, getter=_RequestGetter())
+    token = otel_context.attach(ctx)
+    try:
+        with _tracer.start_as_current_span(
+            f"celery.run {task.name}", kind=SpanKind.CONSUMER, attributes={"celery.task_id": str(task.request.id)}
+        ) as sp:
+            yield sp
+    finally:
+        otel_context.detach(token)
+
+
+def init_app(app: Flask) -> None:
+    init_tracing(app)
+    if _tracer is None:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    from celery import signals
+
+    signals.before_task_publish.connect(_before_publish, weak=False)
+    signals.after_task_publish.connect(_after_publish, weak=False)
@@ -1,11 +1,66 @@
 import math
 
-def haversine_m(x1, y1, x2, y2):
-    R = 6371000.0
-    phi1 = math.radians(y1)
-    phi2 = math.radians(y2)
-    dphi = math.radians(y2 - y1)
-    dlmb = math.radians(x2 - x1)
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Jarak great-circle dalam meter. Urutan argumen: (lat1, lon1, lat2, lon2)."""
+    R = EARTH_RADIUS_M
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlmb = math.radians(lon2 - lon1)
     a = math.sin(dphi/2.0)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlmb/2.0)**2
     c = 2*math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R * c
+
+
+def to_unit_xyz(lat, lon):
+    """Koordinat (lat, lon) derajat -> titik (x, y, z) di unit sphere."""
+    phi = math.radians(lat)
+    lmb = math.radians(lon)
+    cos_phi = math.cos(phi)
+    return (cos_phi * math.cos(lmb), cos_phi * math.sin(lmb), math.sin(phi))
+
+
+def meters_to_chord(distance_m):
+    """Jarak great-circle (meter) -> panjang chord di unit sphere (monoton naik)."""
+    angle = min(max(distance_m, 0.0) / EARTH_RADIUS_M, math.pi)
+    return 2.0 * math.sin(angle / 2.0)
+
+
+# ---------- Versi vektor (NumPy) ----------
+# Untuk menghitung banyak jarak sekaligus (endpoint lokasi, laporan jarak
+# check-in). Input boleh skalar, list, atau ndarray; hasil selalu float64.
+
+def haversine_many(lat, lon, lats, lons):
+    """Jarak (meter) dari satu titik (lat, lon) ke banyak titik; shape = shape(lats)."""
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    phi1 = math.radians(lat)
+    a = (
+        np.sin((lats - phi1) / 2.0) ** 2
+        + math.cos(phi1) * np.cos(lats) * np.sin((lons - math.radians(lon)) / 2.0) ** 2
+    )
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_pairwise(lats1, lons1, lats2, lons2):
+    """Matriks jarak (meter) shape (n, m) antara n titik pertama dan m titik kedua."""
+    phi1 = np.radians(np.asarray(lats1, dtype=np.float64)).reshape(-1, 1)
+    lmb1 = np.radians(np.asarray(lons1, dtype=np.float64)).reshape(-1, 1)
+    phi2 = np.radians(np.asarray(lats2, dtype=np.float64)).reshape(1, -1)
+    lmb2 = np.radians(np.asarray(lons2, dtype=np.float64)).reshape(1, -1)
+    a = np.sin((phi2 - phi1) / 2.0) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin((lmb2 - lmb1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_elementwise(lats1, lons1, lats2, lons2):
+    """Jarak (meter) per pasangan indeks yang sama: titik1[i] -> titik2[i]."""
+    phi1 = np.radians(np.asarray(lats1, dtype=np.float64))
+    phi2 = np.radians(np.asarray(lats2, dtype=np.float64))
+    dlmb = np.radians(np.asarray(lons2, dtype=np.float64) - np.asarray(lons1, dtype=np.float64))
+    a = np.sin((phi2 - phi1) / 2.0) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
@@ -0,0 +1,252 @@
+# benchmarks/face_pipeline.py
+"""
+Benchmark pipeline wajah: decode_image, get_embedding, verify_user dan
+enroll_user_task, per resolusi gambar.
+
+Korpus dibuat deterministik: gambar sumber (default: sampel "t1" bawaan
+paket insightface, atau --images DIR berisi foto berlisensi sendiri)
+di-resize ke tiap resolusi (sisi terpanjang) lalu di-encode JPEG q=90. Hash
+korpus dicetak di laporan; bandingkan baseline hanya bila hash-nya sama.
+
+Storage memakai backend lokal (STORAGE_BACKEND=local, direktori sementara)
+dan broker Celery in-memory, jadi tidak perlu Supabase/Redis. Yang diukur
+murni biaya decode/inferensi/IO lokal.
+
+Laporan JSON: throughput (op/detik), latency p50/p95/p99 (ms), peak RSS,
+tingkat deteksi, dan skor verify (untuk menilai pergantian model).
+
+Contoh:
+    python -m benchmarks.face_pipeline --iterations 30 --save-baseline bench_face.json
+    python -m benchmarks.face_pipeline --iterations 30 --baseline bench_face.json --fail-on-regression
+    python -m benchmarks.face_pipeline --images ./corpus --resolutions 640,1280 --stages decode,embed
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+STAGES = ("decode", "embed", "verify", "enroll")
+_IMAGE_EXT = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(pct / 100.0 * (len(values) - 1)))))
+    return values[k]
+
+
+def _peak_rss_mb() -> float:
+    # Linux: KiB, macOS: byte
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def _load_sources(images_dir: str | None) -> list:
+    import cv2
+
+    if images_dir:
+        names = sorted(n for n in os.listdir(images_dir) if n.lower().endswith(_IMAGE_EXT))
+        imgs = [cv2.imread(os.path.join(images_dir, n), cv2.IMREAD_COLOR) for n in names]
+        imgs = [im for im in imgs if im is not None]
+        if not imgs:
+            raise SystemExit(f"Tidak ada gambar terbaca di {images_dir}")
+        return imgs
+    from insightface.data import get_image
+
+    return [get_image("t1")]
+
+
+def _build_corpus(sources: list, long_side: int) -> tuple[list[bytes], str]:
+    import cv2
+
+    out = []
+    digest = hashlib.sha256()
+    for img in sources:
+        h, w = img.shape[:2]
+        scale = long_side / float(max(h, w))
+        resized = cv2.resize(
+            img, (max(1, round(w * scale)), max(1, round(h * scale))),
+            interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC,
+        )
+        ok, buf = cv2.imencode(".jpg", resized, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
+        if not ok:
+            raise RuntimeError("Gagal encode JPEG korpus")
+        data = buf.tobytes()
+        digest.update(data)
+        out.append(data)
+    return out, digest.hexdigest()[:16]
+
+
+def _summary(latencies: list[float], extra: dict | None = None) -> dict:
+    total = sum(latencies)
+    res = {
+        "n": len(latencies),
+        "ops_per_sec": round(len(latencies) / total, 2) if total else None,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50) * 1000, 2),
+            "p95": round(_percentile(latencies, 95) * 1000, 2),
+            "p99": round(_percentile(latencies, 99) * 1000, 2),
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+    if extra:
+        res.update(extra)
+    return res
+
+
+def _timeit(fn, items: list, iterations: int, warmup: int) -> tuple[list[float], list]:
+    for i in range(warmup):
+        fn(items[i % len(items)])
+    lat, results = [], []
+    for i in range(iterations):
+        item = items[i % len(items)]
+        t0 = time.perf_counter()
+        results.append(fn(item))
+        lat.append(time.perf_counter() - t0)
+    return lat, results
+
+
+def _make_app(storage_dir: str):
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["STORAGE_LOCAL_DIR"] = storage_dir
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(storage_dir, 'bench.db')}")
+    # enroll_user_task meng-enqueue notifikasi; broker in-memory agar tidak butuh Redis
+    os.environ["CELERY_BROKER_URL"] = "memory://"
+    os.environ["CELERY_RESULT_BACKEND"] = "cache+memory://"
+    from app import create_app
+
+    return create_app()
+
+
+def run(args) -> dict:
+    storage_dir = tempfile.mkdtemp(prefix="bench_face_")
+    app = _make_app(storage_dir)
+
+    from app.extensions import init_face_engine
+    from app.services.face_service import decode_image, enroll_user_task, get_embedding, verify_user
+
+    stages = [s for s in args.stages.split(",") if s]
+    sources = _load_sources(args.images)
+
+    report: dict = {
+        "model": app.config.get("MODEL_NAME"),
+        "iterations": args.iterations,
+        "sources": len(sources),
+        "resolutions": {},
+    }
+    with app.app_context():
+        t0 = time.perf_counter()
+        init_face_engine(app)
+        report["engine_init_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        report["rss_after_init_mb"] = _peak_rss_mb()
+
+        for res in [int(r) for r in args.resolutions.split(",") if r]:
+            corpus, corpus_hash = _build_corpus(sources, res)
+            decoded = [decode_image(b) for b in corpus]
+            out: dict = {"corpus_sha256": corpus_hash, "bytes_avg": sum(map(len, corpus)) // len(corpus)}
+
+            if "decode" in stages:
+                lat, _ = _timeit(decode_image, corpus, args.iterations, args.warmup)
+                out["decode"] = _summary(lat)
+
+            if "embed" in stages:
+                lat, embs = _timeit(get_embedding, decoded, args.iterations, args.warmup)
+                found = sum(1 for e in embs if e is not None)
+                out["embed"] = _summary(lat, {"detection_rate": round(found / len(embs), 3) if embs else 0.0})
+
+            user_id = f"bench-{res}"
+            if "enroll" in stages or "verify" in stages:
+                enroll_iters = max(1, args.iterations // 5) if "enroll" in stages else 1
+                batch = [corpus[i % len(corpus)] for i in range(args.enroll_images)]
+                lat, results = _timeit(
+                    lambda b: enroll_user_task(user_id, "Bench", b), [batch], enroll_iters, 0
+                )
+                ok_count = sum(1 for r in results if r.get("status") == "success")
+                if "enroll" in stages:
+                    out["enroll"] = _summary(lat, {"images_per_task": len(batch), "success": ok_count})
+                if not ok_count:
+                    out["note"] = "enroll gagal (tidak ada wajah terdeteksi); verify dilewati"
+
+            if "verify" in stages and "note" not in out:
+                lat, results = _timeit(lambda b: verify_user(user_id, b), corpus, args.iterations, args.warmup)
+                scores = [r["score"] for r in results]
+                out["verify"] = _summary(lat, {
+                    "score_p50": round(_percentile(scores, 50), 4),
+                    "match_rate": round(sum(1 for r in results if r["match"]) / len(results), 3),
+                })
+
+            report["resolutions"][str(res)] = out
+
+    report["peak_rss_mb"] = _peak_rss_mb()
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> dict:
+    """Bandingkan p50/p95 per stage & resolusi; regresi bila > baseline x (1 + tolerance)."""
+    rows, regressions = [], 0
+    for res, cur in report["resolutions"].items():
+        base = baseline.get("resolutions", {}).get(res)
+        if not base:
+            continue
+        if base.get("corpus_sha256") != cur.get("corpus_sha256"):
+            rows.append({"resolution": res, "skipped": "hash korpus berbeda"})
+            continue
+        for stage in STAGES:
+            if stage not in cur or stage not in base:
+                continue
+            for pct in ("p50", "p95"):
+                b = base[stage]["latency_ms"][pct]
+                c = cur[stage]["latency_ms"][pct]
+                ratio = round(c / b, 3) if b else None
+                regressed = ratio is not None and ratio > 1 + tolerance
+                regressions += int(regressed)
+                rows.append({"resolution": res, "stage": stage, "pct": pct, "baseline_ms": b,
+                             "current_ms": c, "ratio": ratio, "regressed": regressed})
+    return {"tolerance": tolerance, "regressions": regressions, "rows": rows}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--images", default=None, help="direktori gambar wajah (default: sampel insightface)")
+    ap.add_argument("--resolutions", default="480,720,1080", help="sisi terpanjang (px), dipisah koma")
+    ap.add_argument("--stages", default=",".join(STAGES), help=f"subset dari {','.join(STAGES)}")
+    ap.add_argument("--iterations", type=int, default=30)
+    ap.add_argument("--warmup", type=int, default=3)
+    ap.add_argument("--enroll-images", type=int, default=3, help="jumlah gambar per enroll_user_task")
+    ap.add_argument("--baseline", default=None, help="file JSON hasil run sebelumnya untuk dibandingkan")
+    ap.add_argument("--save-baseline", default=None, help="simpan laporan run ini sebagai baseline")
+    ap.add_argument("--tolerance", type=float, default=0.10, help="toleransi regresi latency (0.10 = 10%%)")
+    ap.add_argument("--fail-on-regression", action="store_true")
+    args = ap.parse_args(argv)
+
+    unknown = set(s for s in args.stages.split(",") if s) - set(STAGES)
+    if unknown:
+        ap.error(f"stage tidak dikenal: {', '.join(sorted(unknown))}")
+
+    report = run(args)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            report["comparison"] = compare(report, json.load(fh), args.tolerance)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as fh:
+            json.dump({k: v for k, v in report.items() if k != "comparison"}, fh, indent=2)
+
+    print(json.dumps(report, indent=2))
+    if args.fail_on_regression and report.get("comparison", {}).get("regressions"):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
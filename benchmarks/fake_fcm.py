@@ -0,0 +1,152 @@
+# benchmarks/fake_fcm.py
+"""
+Server FCM HTTP v1 palsu untuk uji lokal dan benchmark transport.
+
+Menerima POST /v1/projects/<project>/messages:send dan membalas seperti FCM:
+  - token berawalan "dead-" -> 404 UNREGISTERED
+  - token berawalan "bad-"  -> 400 INVALID_ARGUMENT
+  - sebagian request acak (--error-rate) -> 429 (Retry-After) atau 503
+  - selain itu 200 {"name": "projects/<project>/messages/<id>"}
+
+Contoh:
+    python -m benchmarks.fake_fcm --port 8099 --latency-ms 40
+    NOTIF_FCM_TRANSPORT=http FCM_API_BASE_URL=http://127.0.0.1:8099 \\
+        FCM_ACCESS_TOKEN_OVERRIDE=fake FIREBASE_PROJECT_ID=demo flask run
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class FakeFcmServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, latency_s: float = 0.0, error_rate: float = 0.0, retry_after: float = 0.0):
+        super().__init__(addr, _Handler)
+        self.latency_s = latency_s
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.counter = itertools.count(1)
+        self.stats = {"requests": 0, "ok": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+
+    def bump(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats[key] += 1
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def _error(status: int, code: str, message: str) -> dict:
+    return {
+        "error": {
+            "code": status,
+            "message": message,
+            "status": code if status != 404 else "NOT_FOUND",
+            "details": [{"@type": "type.googleapis.com/google.firebase.fcm.v1.FcmError", "errorCode": code}],
+        }
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive agar koneksi dipakai ulang
+    server: FakeFcmServer
+
+    def log_message(self, format, *args):  # noqa: A002 - signature dari BaseHTTPRequestHandler
+        pass
+
+    def _reply(self, status: int, body: dict, headers: Optional[dict] = None) -> None:
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_POST(self):  # noqa: N802
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = self.rfile.read(length)
+        srv = self.server
+
+        if srv.latency_s:
+            time.sleep(srv.latency_s)
+
+        if not self.path.startswith("/v1/projects/") or not self.path.endswith("/messages:send"):
+            srv.bump("errors")
+            return self._reply(404, _error(404, "NOT_FOUND", "unknown path"))
+        if not (self.headers.get("Authorization") or "").startswith("Bearer "):
+            srv.bump("errors")
+            return self._reply(401, _error(401, "UNAUTHENTICATED", "missing bearer token"))
+
+        try:
+            token = json.loads(payload)["message"]["token"]
+        except (ValueError, KeyError, TypeError):
+            srv.bump("errors")
+            return self._reply(400, _error(400, "INVALID_ARGUMENT", "bad message"))
+
+        if token.startswith("dead-"):
+            srv.bump("errors")
+            return self._reply(404, _error(404, "UNREGISTERED", "Requested entity was not found."))
+        if token.startswith("bad-"):
+            srv.bump("errors")
+            return self._reply(400, _error(400, "INVALID_ARGUMENT", "The registration token is not valid"))
+        if srv.error_rate and random.random() < srv.error_rate:
+            srv.bump("errors")
+            if random.random() < 0.5:
+                return self._reply(429, _error(429, "QUOTA_EXCEEDED", "quota"), {"Retry-After": str(srv.retry_after)})
+            return self._reply(503, _error(503, "UNAVAILABLE", "try again"))
+
+        srv.bump("ok")
+        project = self.path.split("/")[3]
+        self._reply(200, {"name": f"projects/{project}/messages/{next(srv.counter)}"})
+
+
+def start_fake_fcm(host: str = "127.0.0.1", port: int = 0, **kwargs) -> FakeFcmServer:
+    """Jalankan server di thread latar (port 0 = port acak); panggil .shutdown() setelah selesai."""
+    server = FakeFcmServer((host, port), **kwargs)
+    threading.Thread(target=server.serve_forever, name="fake-fcm", daemon=True).start()
+    return server
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraksi request yang dibalas 429/503")
+    ap.add_argument("--retry-after", type=float, default=0.0)
+    args = ap.parse_args(argv)
+
+    server = FakeFcmServer(
+        (args.host, args.port),
+        latency_s=args.latency_ms / 1000.0,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+    )
+    print(f"Fake FCM listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,123 @@
+# benchmarks/fcm_transport.py
+"""
+Benchmark messages/detik FcmHttpTransport terhadap server FCM palsu lokal.
+
+Server palsu (benchmarks.fake_fcm) dijalankan di proses yang sama dengan
+latensi per request (--latency-ms) sehingga efek konkurensi terlihat jelas.
+Pembanding "serial" mengirim satu request per token berurutan (seperti
+jalur send_each pada sebagian versi SDK).
+
+Contoh:
+    python -m benchmarks.fcm_transport --messages 2000 --concurrency 64
+    python -m benchmarks.fcm_transport --messages 2000 --error-rate 0.05 --dead-rate 0.02
+    python -m benchmarks.fcm_transport --base-url http://127.0.0.1:8099   # server terpisah
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def _messages(count: int, dead_rate: float) -> list[tuple[str, dict]]:
+    dead_every = int(1 / dead_rate) if dead_rate > 0 else 0
+    out = []
+    for i in range(count):
+        prefix = "dead-" if dead_every and i % dead_every == 0 else "tok-"
+        out.append((f"{prefix}{i}", {"title": "Bench", "body": f"pesan {i}", "event_trigger": "BENCH"}))
+    return out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--messages", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--rate", type=float, default=0.0, help="rate limit pesan/detik (0 = tanpa batas)")
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="latensi server palsu per request")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraksi request 429/503 dari server palsu")
+    ap.add_argument("--dead-rate", type=float, default=0.0, help="fraksi token UNREGISTERED")
+    ap.add_argument("--serial-sample", type=int, default=100, help="jumlah pesan untuk pembanding serial (0 = lewati)")
+    ap.add_argument("--base-url", default=None, help="pakai server FCM (palsu) yang sudah berjalan")
+    args = ap.parse_args(argv)
+
+    from app.services.fcm_transport import FcmHttpTransport
+    from benchmarks.fake_fcm import start_fake_fcm
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server = start_fake_fcm(latency_s=args.latency_ms / 1000.0, error_rate=args.error_rate)
+        base_url = server.base_url
+
+    messages = _messages(args.messages, args.dead_rate)
+    report: dict = {
+        "messages": args.messages,
+        "concurrency": args.concurrency,
+        "rate_limit": args.rate,
+        "latency_ms": args.latency_ms,
+        "error_rate": args.error_rate,
+    }
+
+    def make(concurrency: int) -> FcmHttpTransport:
+        return FcmHttpTransport(
+            project_id="bench",
+            access_token=lambda: "fake",
+            base_url=base_url,
+            concurrency=concurrency,
+            rate_per_sec=args.rate,
+            backoff_base=0.05,
+            backoff_cap=1.0,
+        )
+
+    try:
+        transport = make(args.concurrency)
+        transport.send(messages[:1])  # buka koneksi dulu
+        transport.stats.update(requests=0, sent=0, failed=0, retries=0)
+
+        t0 = time.perf_counter()
+        outcomes = transport.send(messages)
+        elapsed = time.perf_counter() - t0
+        errors: dict = {}
+        for ok, code, _ in outcomes:
+            if not ok:
+                errors[code] = errors.get(code, 0) + 1
+        report["concurrent"] = {
+            "seconds": round(elapsed, 3),
+            "messages_per_sec": round(len(messages) / elapsed, 1),
+            "stats": dict(transport.stats),
+            "errors": errors,
+        }
+        transport.close()
+
+        if args.serial_sample:
+            serial = make(1)
+            sample = messages[: args.serial_sample]
+            serial.send(sample[:1])
+            t0 = time.perf_counter()
+            serial.send(sample)
+            elapsed = time.perf_counter() - t0
+            report["serial"] = {
+                "messages": len(sample),
+                "seconds": round(elapsed, 3),
+                "messages_per_sec": round(len(sample) / elapsed, 1),
+            }
+            report["speedup"] = round(
+                report["concurrent"]["messages_per_sec"] / report["serial"]["messages_per_sec"], 1
+            )
+            serial.close()
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
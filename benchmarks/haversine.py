@@ -0,0 +1,86 @@
+# benchmarks/haversine.py
+"""
+Micro-benchmark haversine: loop skalar (math) vs NumPy tervektorisasi.
+
+Mengukur satu-titik-ke-banyak (haversine_many) dan matriks pairwise
+(haversine_pairwise), serta memverifikasi selisih hasil terhadap versi skalar.
+
+Contoh:
+    python -m benchmarks.haversine --points 10000 --repeat 20
+    python -m benchmarks.haversine --points 2000 --pairwise 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--points", type=int, default=10000)
+    ap.add_argument("--pairwise", type=int, default=500, help="ukuran n untuk matriks n x n")
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args(argv)
+
+    import numpy as np
+
+    from app.utils.geo import haversine_m, haversine_many, haversine_pairwise
+
+    rnd = random.Random(args.seed)
+    lats = [rnd.uniform(-11.0, 6.0) for _ in range(args.points)]
+    lons = [rnd.uniform(95.0, 141.0) for _ in range(args.points)]
+    lats_np, lons_np = np.asarray(lats), np.asarray(lons)
+    lat0, lon0 = -8.65, 115.21
+
+    scalar_one = _best_of(lambda: [haversine_m(lat0, lon0, a, b) for a, b in zip(lats, lons)], args.repeat)
+    vector_one = _best_of(lambda: haversine_many(lat0, lon0, lats_np, lons_np), args.repeat)
+
+    ref = np.asarray([haversine_m(lat0, lon0, a, b) for a, b in zip(lats, lons)])
+    max_err_m = float(np.max(np.abs(ref - haversine_many(lat0, lon0, lats_np, lons_np))))
+
+    n = min(args.pairwise, args.points)
+    pl, po = lats[:n], lons[:n]
+    scalar_pair = _best_of(
+        lambda: [[haversine_m(a, b, c, d) for c, d in zip(pl, po)] for a, b in zip(pl, po)],
+        max(1, args.repeat // 5),
+    )
+    vector_pair = _best_of(lambda: haversine_pairwise(pl, po, pl, po), args.repeat)
+
+    report = {
+        "one_to_many": {
+            "points": args.points,
+            "scalar_ms": round(scalar_one * 1000, 3),
+            "numpy_ms": round(vector_one * 1000, 3),
+            "speedup": round(scalar_one / vector_one, 1),
+            "max_abs_error_m": max_err_m,
+        },
+        "pairwise": {
+            "n": n,
+            "scalar_ms": round(scalar_pair * 1000, 3),
+            "numpy_ms": round(vector_pair * 1000, 3),
+            "speedup": round(scalar_pair / vector_pair, 1),
+        },
+    }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,386 @@
+# benchmarks/load_checkin.py
+"""
+Load test end-to-end alur absensi dengan stand-in lokal.
+
+Satu proses menjalankan:
+  - app Flask (create_app) di server HTTP werkzeug ber-thread
+  - worker Celery in-process (pool threads) dengan broker in-memory, melayani
+    semua queue (absensi, notifications, face, default)
+  - DB SQLite sementara (atau --database-url, mis. MySQL lokal)
+  - storage lokal (STORAGE_BACKEND=local), server FCM palsu (benchmarks.fake_fcm)
+    lewat transport HTTP, Redis opsional (fakeredis / URL lokal / tanpa)
+  - verifikasi wajah diganti stand-in berlatensi tetap (--face-latency-ms);
+    biaya inferensi sebenarnya diukur benchmarks.face_pipeline
+
+Generator beban (asyncio + httpx) mensimulasikan puncak pagi: waktu
+kedatangan user mengikuti kurva lonceng di sekitar jam masuk (ditambah
+sebagian kecil kedatangan merata), dikompres ke --window detik. Tiap user:
+checkin -> poll /status sampai baris terlihat -> (sebagian) istirahat
+start/status/end -> checkout -> poll sampai selesai.
+
+Run diulang untuk tiap --scales (pengali jumlah user) dan melaporkan per
+langkah: latency per endpoint (p50/p95/p99), latency penyelesaian task
+(202 diterima -> baris terlihat di /status), error rate, serta "knee":
+langkah pertama yang p95 check-in-nya > --knee-factor x langkah pertama
+atau error rate > 1%.
+
+Contoh:
+    python -m benchmarks.load_checkin --users 200 --scales 0.5,1,2,4 --window 60
+    python -m benchmarks.load_checkin --database-url mysql+pymysql://u:p@localhost/db_load \\
+        --create-schema --redis redis://localhost:6379/1 --workers 16
+
+SQLite hanya mengizinkan satu penulis: angka di atas beberapa puluh check-in/detik
+akan didominasi "database is locked". Gunakan MySQL lokal untuk mencari knee sebenarnya.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+LAT, LNG = -8.670458, 115.212631  # titik kantor sintetis
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(pct / 100.0 * (len(values) - 1)))))
+    return values[k]
+
+
+def _lat_summary(values: list[float]) -> dict:
+    return {
+        "n": len(values),
+        "p50_ms": round(_percentile(values, 50) * 1000, 1),
+        "p95_ms": round(_percentile(values, 95) * 1000, 1),
+        "p99_ms": round(_percentile(values, 99) * 1000, 1),
+    }
+
+
+# ---------- Lingkungan ----------
+
+def _make_app(args, storage_dir: str, fcm_url: str):
+    os.environ.update(
+        DATABASE_URL=args.database_url,
+        STORAGE_BACKEND="local",
+        STORAGE_LOCAL_DIR=storage_dir,
+        CELERY_BROKER_URL="memory://",
+        CELERY_RESULT_BACKEND="cache+memory://",
+        NOTIF_FCM_TRANSPORT="http",
+        FCM_API_BASE_URL=fcm_url,
+        FCM_ACCESS_TOKEN_OVERRIDE="fake",
+        FIREBASE_PROJECT_ID="load-test",
+        NOTIF_OUTBOX_POLL_SECONDS="3600",
+    )
+    if args.redis not in ("none", "fakeredis"):
+        os.environ["REDIS_URL"] = args.redis
+    from app import create_app
+
+    app = create_app()
+    if args.redis == "fakeredis":
+        import fakeredis
+
+        from app import extensions
+
+        extensions._redis = fakeredis.FakeRedis()
+        extensions._redis_resolved = True
+    return app
+
+
+def _seed(app, total_users: int, create_schema: bool) -> tuple[str, list[str]]:
+    from app.db import Base, get_engine, get_session
+    from app.db.models import (
+        Absensi,
+        AbsensiReportRecipient,
+        AgendaKerja,
+        Catatan,
+        Device,
+        Istirahat,
+        Location,
+        Notification,
+        NotificationOutbox,
+        NotificationTemplate,
+        PolaKerja,
+        Role,
+        ShiftKerja,
+        ShiftStatus,
+        User,
+    )
+
+    with app.app_context():
+        if create_schema:
+            # Hanya tabel alur check-in: nama index di models tidak unik
+            # (idx_sp_id_user) sehingga create_all penuh gagal di SQLite.
+            Base.metadata.create_all(get_engine(), tables=[
+                m.__table__ for m in (
+                    Location, User, Device, PolaKerja, ShiftKerja, Absensi, AgendaKerja, Catatan,
+                    AbsensiReportRecipient, Istirahat, Notification, NotificationOutbox, NotificationTemplate,
+                )
+            ])
+        with get_session() as s:
+            loc = Location(nama_kantor="Kantor Load Test", latitude=LAT, longitude=LNG, radius=200)
+            day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            # Jendela istirahat sepanjang hari agar /istirahat/start tidak ditolak jam uji
+            pola = PolaKerja(
+                nama_pola_kerja="Load Test",
+                jam_mulai=day.replace(hour=8),
+                jam_selesai=day.replace(hour=17),
+                jam_istirahat_mulai=day,
+                jam_istirahat_selesai=day.replace(hour=23, minute=59),
+            )
+            s.add_all([loc, pola])
+            for trigger, title in (("SUCCESS_CHECK_IN", "Check-in {jam_masuk}"), ("SUCCESS_CHECK_OUT", "Check-out {jam_pulang}")):
+                if s.query(NotificationTemplate).filter_by(event_trigger=trigger).one_or_none() is None:
+                    s.add(NotificationTemplate(event_trigger=trigger, description="load test", title_template=title, body_template=title))
+            s.flush()
+            ids = []
+            for i in range(total_users):
+                uid = str(uuid.uuid4())
+                s.add(User(id_user=uid, nama_pengguna=f"Load {i}", email=f"{uid}@example.test",
+                           password_hash="x", role=Role.KARYAWAN, id_location=loc.id_location))
+                s.add(Device(id_user=uid, fcm_token=f"tok-{uid}", push_enabled=True, failed_push_count=0))
+                s.add(ShiftKerja(id_user=uid, tanggal_mulai=day.date(), tanggal_selesai=day.date(),
+                                 hari_kerja="SENIN", status=ShiftStatus.KERJA, id_pola_kerja=pola.id_pola_kerja))
+                ids.append(uid)
+            s.commit()
+            return loc.id_location, ids
+
+
+def _install_fake_face(latency_s: float) -> None:
+    from app.blueprints.absensi import routes
+
+    def fake_verify(user_id, probe_file, metric="cosine", threshold=0.45):
+        probe_file.read()
+        time.sleep(latency_s)
+        return {"user_id": user_id, "metric": metric, "threshold": threshold, "score": 0.9, "match": True}
+
+    routes.verify_user = fake_verify
+
+
+def _start_http(app):
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-http", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+# ---------- Kurva kedatangan ----------
+
+def _arrivals(n: int, window: float, peak_at: float, spread: float, uniform_share: float, rnd: random.Random) -> list[float]:
+    """Offset detik kedatangan: lonceng di peak_at*window (sigma spread*window) + sebagian merata."""
+    out = []
+    for _ in range(n):
+        if rnd.random() < uniform_share:
+            out.append(rnd.uniform(0, window))
+        else:
+            while True:
+                t = rnd.gauss(peak_at * window, spread * window)
+                if 0 <= t <= window:
+                    out.append(t)
+                    break
+    return sorted(out)
+
+
+# ---------- Skenario user ----------
+
+class _Recorder:
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.completion = defaultdict(list)
+        self.timeouts = defaultdict(int)
+
+    async def call(self, client, method: str, name: str, url: str, ok_status=(200, 202), **kwargs):
+        t0 = time.perf_counter()
+        try:
+            resp = await client.request(method, url, **kwargs)
+        except Exception:
+            self.errors[name] += 1
+            self.latency[name].append(time.perf_counter() - t0)
+            return None
+        self.latency[name].append(time.perf_counter() - t0)
+        if resp.status_code not in ok_status:
+            self.errors[name] += 1
+            return None
+        return resp
+
+
+async def _wait_mode(rec: _Recorder, client, base: str, user_id: str, want: str, kind: str, args) -> None:
+    t0 = time.perf_counter()
+    deadline = t0 + args.task_timeout
+    while time.perf_counter() < deadline:
+        resp = await rec.call(client, "GET", "status", f"{base}/api/absensi/status", params={"user_id": user_id})
+        if resp is not None and resp.json().get("mode") == want:
+            rec.completion[kind].append(time.perf_counter() - t0)
+            return
+        await asyncio.sleep(args.poll_ms / 1000.0)
+    rec.timeouts[kind] += 1
+
+
+async def _user_flow(rec: _Recorder, client, base: str, user_id: str, loc_id: str, image: bytes, args, rnd) -> None:
+    form = {"user_id": user_id, "location_id": loc_id, "lat": str(LAT), "lng": str(LNG)}
+    resp = await rec.call(client, "POST", "checkin", f"{base}/api/absensi/checkin",
+                          data=form, files={"image": ("probe.jpg", image, "image/jpeg")})
+    if resp is None:
+        return
+    await _wait_mode(rec, client, base, user_id, "checkout", "checkin", args)
+
+    if rnd.random() < args.break_share:
+        await rec.call(client, "POST", "istirahat_start", f"{base}/api/absensi/istirahat/start",
+                       data={"user_id": user_id, "start_istirahat_latitude": str(LAT), "start_istirahat_longitude": str(LNG)})
+        await rec.call(client, "GET", "istirahat_status", f"{base}/api/absensi/istirahat/status", params={"user_id": user_id})
+        await rec.call(client, "POST", "istirahat_end", f"{base}/api/absensi/istirahat/end",
+                       data={"user_id": user_id, "end_istirahat_latitude": str(LAT), "end_istirahat_longitude": str(LNG)})
+
+    if args.no_checkout:
+        return
+    resp = await rec.call(client, "POST", "checkout", f"{base}/api/absensi/checkout",
+                          data=form, files={"image": ("probe.jpg", image, "image/jpeg")})
+    if resp is not None:
+        await _wait_mode(rec, client, base, user_id, "done", "checkout", args)
+
+
+async def _run_step(base: str, user_ids: list[str], loc_id: str, args, rnd: random.Random) -> dict:
+    import httpx
+
+    rec = _Recorder()
+    image = os.urandom(args.image_kb * 1024)
+    offsets = _arrivals(len(user_ids), args.window, args.peak_at, args.spread, args.uniform_share, rnd)
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(timeout=args.http_timeout, limits=limits) as client:
+        t_start = time.perf_counter()
+
+        async def launch(uid, offset):
+            await asyncio.sleep(max(0.0, t_start + offset - time.perf_counter()))
+            await _user_flow(rec, client, base, uid, loc_id, image, args, rnd)
+
+        await asyncio.gather(*(launch(uid, off) for uid, off in zip(user_ids, offsets)))
+        wall = time.perf_counter() - t_start
+
+    # Laju kedatangan puncak: kedatangan terbanyak dalam jendela 1 detik
+    peak_rate = max((sum(1 for o in offsets if s <= o < s + 1) for s in range(int(args.window) + 1)), default=0)
+    total_req = sum(len(v) for v in rec.latency.values())
+    total_err = sum(rec.errors.values())
+    return {
+        "users": len(user_ids),
+        "peak_arrivals_per_sec": peak_rate,
+        "wall_seconds": round(wall, 2),
+        "requests": total_req,
+        "error_rate": round(total_err / total_req, 4) if total_req else 0.0,
+        "endpoints": {
+            name: {**_lat_summary(vals), "errors": rec.errors.get(name, 0)}
+            for name, vals in sorted(rec.latency.items())
+        },
+        "task_completion": {
+            kind: {**_lat_summary(vals), "timeouts": rec.timeouts.get(kind, 0)}
+            for kind, vals in sorted(rec.completion.items())
+        },
+    }
+
+
+def _find_knee(steps: list[dict], factor: float) -> float | None:
+    if not steps:
+        return None
+    base = steps[0]["endpoints"].get("checkin", {}).get("p95_ms") or 0.0
+    for st in steps:
+        p95 = st["endpoints"].get("checkin", {}).get("p95_ms") or 0.0
+        if st["error_rate"] > 0.01 or (base and p95 > factor * base):
+            return st["scale"]
+    return None
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--database-url", default=None, help="default: SQLite file sementara")
+    ap.add_argument("--create-schema", action="store_true", help="jalankan create_all pada --database-url")
+    ap.add_argument("--users", type=int, default=200, help="jumlah user pada scale 1")
+    ap.add_argument("--scales", default="0.5,1,2,4", help="pengali jumlah user per langkah")
+    ap.add_argument("--window", type=float, default=60.0, help="durasi puncak pagi yang dikompres (detik)")
+    ap.add_argument("--peak-at", type=float, default=0.7, help="posisi puncak dalam jendela (0..1)")
+    ap.add_argument("--spread", type=float, default=0.15, help="sigma kurva relatif terhadap jendela")
+    ap.add_argument("--uniform-share", type=float, default=0.15, help="fraksi kedatangan merata")
+    ap.add_argument("--break-share", type=float, default=0.3, help="fraksi user yang memakai istirahat")
+    ap.add_argument("--no-checkout", action="store_true")
+    ap.add_argument("--workers", type=int, default=8, help="thread worker Celery in-process")
+    ap.add_argument("--face-latency-ms", type=float, default=30.0)
+    ap.add_argument("--fcm-latency-ms", type=float, default=40.0)
+    ap.add_argument("--redis", default="fakeredis", help="fakeredis | none | redis://... lokal")
+    ap.add_argument("--poll-ms", type=float, default=250.0)
+    ap.add_argument("--task-timeout", type=float, default=30.0)
+    ap.add_argument("--http-timeout", type=float, default=30.0)
+    ap.add_argument("--max-connections", type=int, default=200)
+    ap.add_argument("--image-kb", type=int, default=60)
+    ap.add_argument("--knee-factor", type=float, default=3.0)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args(argv)
+
+    tmp = tempfile.mkdtemp(prefix="load_checkin_")
+    if not args.database_url:
+        args.database_url = f"sqlite:///{os.path.join(tmp, 'load.db')}"
+        args.create_schema = True
+
+    from benchmarks.fake_fcm import start_fake_fcm
+
+    fcm = start_fake_fcm(latency_s=args.fcm_latency_ms / 1000.0)
+    app = _make_app(args, os.path.join(tmp, "storage"), fcm.base_url)
+    _install_fake_face(args.face_latency_ms / 1000.0)
+
+    scales = [float(x) for x in args.scales.split(",") if x]
+    counts = [max(1, int(round(args.users * sc))) for sc in scales]
+    loc_id, user_ids = _seed(app, sum(counts), args.create_schema)
+
+    from celery.contrib.testing.worker import start_worker
+
+    from app.extensions import celery
+
+    queues = sorted({app.config.get(k) for k in ("CELERY_FACE_QUEUE", "CELERY_ABSENSI_QUEUE",
+                                                 "CELERY_NOTIFICATIONS_QUEUE", "CELERY_DEFAULT_QUEUE")})
+    server, base = _start_http(app)
+    rnd = random.Random(args.seed)
+    steps = []
+    try:
+        with start_worker(celery, pool="threads", concurrency=args.workers, queues=queues,
+                          perform_ping_check=False, shutdown_timeout=30, loglevel="WARNING"):
+            offset = 0
+            for scale, n in zip(scales, counts):
+                step = asyncio.run(_run_step(base, user_ids[offset:offset + n], loc_id, args, rnd))
+                step["scale"] = scale
+                steps.append(step)
+                offset += n
+                print(json.dumps({"scale": scale, "users": n, "error_rate": step["error_rate"],
+                                  "checkin": step["endpoints"].get("checkin")}), file=sys.stderr)
+    finally:
+        server.shutdown()
+        fcm.shutdown()
+
+    report = {
+        "database": args.database_url.split("://", 1)[0],
+        "redis": args.redis,
+        "celery_workers": args.workers,
+        "face_latency_ms": args.face_latency_ms,
+        "fcm_latency_ms": args.fcm_latency_ms,
+        "window_seconds": args.window,
+        "steps": steps,
+        "knee_scale": _find_knee(steps, args.knee_factor),
+        "fake_fcm": dict(fcm.stats),
+    }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
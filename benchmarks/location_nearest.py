@@ -0,0 +1,99 @@
+# benchmarks/location_nearest.py
+"""
+Benchmark /api/location/nearest: scan penuh haversine vs LocationIndex (KD-tree).
+
+Lokasi sintetis disebar acak di wilayah Indonesia; tiap query memakai titik
+acak di dekat salah satu lokasi. Tanpa database: yang diukur hanya biaya
+pencarian (build index dicatat terpisah).
+
+Contoh:
+    python -m benchmarks.location_nearest --locations 10000 --queries 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def _scan(entries, lat, lng, k, radius_m):
+    from app.utils.geo import haversine_m
+
+    pairs = [(e, haversine_m(lat, lng, e.latitude, e.longitude)) for e in entries]
+    pairs.sort(key=lambda x: x[1])
+    if radius_m is not None:
+        pairs = [p for p in pairs if p[1] <= radius_m]
+    return pairs[:k]
+
+
+def _time_per_query(fn, queries) -> float:
+    t0 = time.perf_counter()
+    for q in queries:
+        fn(*q)
+    return (time.perf_counter() - t0) / len(queries)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--locations", type=int, default=10000)
+    ap.add_argument("--queries", type=int, default=2000)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--radius-m", type=float, default=5000.0)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args(argv)
+
+    from app.services.location_index import LocationEntry, LocationIndex
+
+    rnd = random.Random(args.seed)
+    entries = [
+        LocationEntry(str(uuid.uuid4()), f"Kantor {i}", rnd.uniform(-11.0, 6.0), rnd.uniform(95.0, 141.0), 100)
+        for i in range(args.locations)
+    ]
+
+    t0 = time.perf_counter()
+    index = LocationIndex(entries)
+    build_ms = (time.perf_counter() - t0) * 1000
+
+    queries = []
+    for _ in range(args.queries):
+        e = rnd.choice(entries)
+        queries.append((e.latitude + rnd.uniform(-0.05, 0.05), e.longitude + rnd.uniform(-0.05, 0.05)))
+
+    # Sanity check: hasil index harus sama dengan scan penuh
+    for lat, lng in queries[:50]:
+        a = [e.id_location for e, _ in index.nearest(lat, lng, k=args.k)]
+        b = [e.id_location for e, _ in _scan(entries, lat, lng, args.k, None)]
+        if a != b:
+            print("Hasil index berbeda dengan scan penuh", file=sys.stderr)
+            return 1
+
+    scan_sample = queries[: max(1, min(len(queries), 200))]  # scan penuh lambat
+    report = {
+        "locations": args.locations,
+        "queries": args.queries,
+        "index_build_ms": round(build_ms, 1),
+        "scan_us": {
+            "k1": round(_time_per_query(lambda la, lo: _scan(entries, la, lo, 1, None), scan_sample) * 1e6, 1),
+            "radius": round(_time_per_query(lambda la, lo: _scan(entries, la, lo, args.k, args.radius_m), scan_sample) * 1e6, 1),
+        },
+        "index_us": {
+            "k1": round(_time_per_query(lambda la, lo: index.nearest(la, lo, k=1), queries) * 1e6, 1),
+            f"k{args.k}": round(_time_per_query(lambda la, lo: index.nearest(la, lo, k=args.k), queries) * 1e6, 1),
+            "radius": round(_time_per_query(lambda la, lo: index.nearest(la, lo, k=args.k, radius_m=args.radius_m), queries) * 1e6, 1),
+            "within": round(_time_per_query(lambda la, lo: index.within(la, lo, args.radius_m), queries) * 1e6, 1),
+        },
+    }
+    report["speedup_k1"] = round(report["scan_us"]["k1"] / report["index_us"]["k1"], 1)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
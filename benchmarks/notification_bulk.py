@@ -0,0 +1,132 @@
+# benchmarks/notification_bulk.py
+"""
+Benchmark fan-out notifikasi: send_notification per user vs send_notification_bulk.
+
+Database SQLite sementara diisi N user (masing-masing 1 device) dan satu
+template. Panggilan FCM diganti pengirim lokal yang hanya mensimulasikan
+latensi jaringan per batch (--fcm-latency-ms) supaya angka yang terlihat
+adalah biaya DB + fan-out, bukan koneksi ke Google.
+
+Contoh:
+    python -m benchmarks.notification_bulk --recipients 1000
+    python -m benchmarks.notification_bulk --recipients 1000 --fcm-latency-ms 150 --skip-single
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+EVENT = "BENCH_BULK_EVENT"
+
+
+def _make_app(database_url: str):
+    os.environ["DATABASE_URL"] = database_url
+    from app import create_app
+
+    return create_app()
+
+
+def _seed(count: int) -> list[str]:
+    from app.db import Base, get_engine, get_session
+    from app.db.models import Device, Notification, NotificationOutbox, NotificationTemplate, Role, User
+
+    # Hanya tabel yang dipakai fan-out; nama index di models tidak unik
+    # (idx_sp_id_user) sehingga create_all penuh gagal di SQLite.
+    Base.metadata.create_all(get_engine(), tables=[
+        m.__table__ for m in (User, Device, NotificationTemplate, Notification, NotificationOutbox)
+    ])
+    ids: list[str] = []
+    with get_session() as s:
+        s.add(
+            NotificationTemplate(
+                event_trigger=EVENT,
+                description="benchmark",
+                title_template="Jadwal baru {periode_mulai}",
+                body_template="Halo {nama_karyawan}, jadwal {periode_mulai} - {periode_selesai} sudah terbit.",
+            )
+        )
+        for i in range(count):
+            uid = str(uuid.uuid4())
+            s.add(User(id_user=uid, nama_pengguna=f"User {i}", email=f"{uid}@example.test", password_hash="x", role=Role.KARYAWAN))
+            s.add(Device(id_user=uid, fcm_token=f"tok-{uid}", push_enabled=True, failed_push_count=0))
+            ids.append(uid)
+        s.commit()
+    return ids
+
+
+def _install_fake_sender(latency_s: float) -> dict:
+    """Ganti pengirim FCM dengan stand-in lokal; kembalikan counter panggilan."""
+    from app.services import notification_service as ns
+
+    counter = {"calls": 0, "messages": 0}
+
+    def fake_send_each(messages):
+        counter["calls"] += 1
+        counter["messages"] += len(messages)
+        time.sleep(latency_s)
+        return [ns._SendResult(True) for _ in messages]
+
+    ns._send_each_compat = fake_send_each
+    return counter
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--recipients", type=int, default=1000)
+    ap.add_argument("--fcm-latency-ms", type=float, default=80.0, help="latensi simulasi per panggilan FCM batch")
+    ap.add_argument("--skip-single", action="store_true", help="lewati pengukuran send_notification per user")
+    args = ap.parse_args(argv)
+
+    tmp = tempfile.mkdtemp(prefix="bench_notif_")
+    app = _make_app(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+
+    from app.db import get_session
+    from app.services.notification_service import send_notification, send_notification_bulk
+
+    report: dict = {"recipients": args.recipients, "fcm_latency_ms": args.fcm_latency_ms}
+    with app.app_context():
+        user_ids = _seed(args.recipients)
+        counter = _install_fake_sender(args.fcm_latency_ms / 1000.0)
+        data = {"nama_karyawan": "Bench", "periode_mulai": "2024-01-01", "periode_selesai": "2024-01-07"}
+
+        if not args.skip_single:
+            t0 = time.perf_counter()
+            for uid in user_ids:
+                with get_session() as s:
+                    send_notification(EVENT, uid, data, session=s)
+            elapsed = time.perf_counter() - t0
+            report["single"] = {
+                "seconds": round(elapsed, 3),
+                "per_sec": round(len(user_ids) / elapsed, 1),
+                "fcm_calls": counter["calls"],
+            }
+            counter.update(calls=0, messages=0)
+
+        t0 = time.perf_counter()
+        with get_session() as s:
+            stats = send_notification_bulk(EVENT, [(uid, data) for uid in user_ids], session=s)
+        elapsed = time.perf_counter() - t0
+        report["bulk"] = {
+            "seconds": round(elapsed, 3),
+            "per_sec": round(len(user_ids) / elapsed, 1),
+            "fcm_calls": counter["calls"],
+            "fcm_messages": counter["messages"],
+            "stats": stats,
+        }
+
+    if "single" in report:
+        report["speedup"] = round(report["single"]["seconds"] / report["bulk"]["seconds"], 1)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
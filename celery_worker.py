@@ -1,24 +1,130 @@
 # celery_worker.py
-# Jalankan:
-#   celery -A celery_worker:app worker --loglevel=INFO --pool=solo
+# Jalankan (satu worker per queue, lihat init_celery di app/extensions.py):
+#
+#   # Inferensi wajah (enroll 1..10 gambar, multi-detik per task, CPU-bound).
+#   # Prefork: satu child = satu proses dengan face engine sendiri. Thread
+#   # onnxruntime per child otomatis dibatasi ke (jumlah core / concurrency)
+#   # kecuali FACE_ORT_INTRA_OP_THREADS di-set. Thread OpenCV/BLAS dibatasi
+#   # lewat env saat start (numpy/cv2 sudah ter-import sebelum signal worker):
+#   OMP_NUM_THREADS=1 celery -A celery_worker:app worker -Q face -n face@%h \
+#       --loglevel=INFO --pool=prefork --concurrency=4 --prefetch-multiplier=1
+#
+#   # Penulisan check-in/check-out ke DB (I/O-bound, harus tetap cepat
+#   # walau sedang ada onboarding massal di queue face). Tidak memuat model.
+#   celery -A celery_worker:app worker -Q absensi,default -n absensi@%h \
+#       --loglevel=INFO --pool=threads --concurrency=16 --prefetch-multiplier=4
+#   #   (alternatif: --pool=gevent --concurrency=100, PyMySQL kompatibel gevent)
+#
+#   # Push notification (FCM). Lambatnya FCM tidak menahan queue absensi.
+#   celery -A celery_worker:app worker -Q notifications -n notifications@%h \
+#       --loglevel=INFO --pool=threads --concurrency=8 --prefetch-multiplier=8
+#
+#   # Jadwal periodik (dispatcher outbox notifikasi untuk retry/sisa batch).
+#   # Jalankan TEPAT SATU instance beat.
+#   celery -A celery_worker:app beat --loglevel=INFO
+#
+# Untuk lingkungan dev satu proses, semua queue bisa dilayani sekaligus:
+#   celery -A celery_worker:app worker -Q face,absensi,notifications,default --loglevel=INFO --pool=solo
+#
+# Throughput check-in per core bisa diukur dengan:
+#   python -m benchmarks.checkin_throughput --help
+# dan perilaku end-to-end saat puncak pagi (API + worker + FCM palsu) dengan:
+#   python -m benchmarks.load_checkin --help
 
+import os
 import logging
+
+from celery import signals
+from celery.concurrency import get_implementation
+
 from app import create_app
-from app.extensions import celery
+from app.db import dispose_engine
+from app.extensions import celery, init_face_engine
 
 # Siapkan Flask app dari factory
 flask_app = create_app()
 logger = logging.getLogger(__name__)
 
-# Panaskan face engine (kalau tersedia)
-try:
-    from app.extensions import init_face_engine
-    with flask_app.app_context():
-        # >>> PERBAIKAN: kirim flask_app sebagai argumen
-        init_face_engine(flask_app)
-        logger.info("[celery_worker] InsightFace engine initialized.")
-except Exception as e:
-    logger.warning("[celery_worker] init_face_engine gagal saat startup: %s", e)
+# Diisi di celeryd_init (proses utama), diwarisi child prefork saat fork.
+_warm_face_engine = True
+_pool_name = "prefork"
+
+
+def _pool_kind(pool) -> str:
+    """
+    Nama modul implementasi pool ("prefork", "thread", "solo", "gevent", ...).
+    options["pool_cls"] dari CLI sudah berupa kelas TaskPool (namanya sama
+    untuk semua pool), jadi yang dibandingkan adalah modulnya.
+    """
+    try:
+        impl = get_implementation(pool)
+    except Exception:
+        return str(pool).lower()
+    return getattr(impl, "__module__", "").rsplit(".", 1)[-1]
+
+
+def _as_list(value) -> list[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [q.strip() for q in value.split(",") if q.strip()]
+    return [str(q) for q in value]
+
+
+@signals.celeryd_init.connect
+def _configure_worker(sender=None, conf=None, options=None, **kwargs):
+    """
+    Dipanggil sekali di proses utama worker, sebelum pool dibuat.
+    - Tentukan apakah worker ini melayani queue face (hanya worker itu yang
+      perlu memuat model; worker absensi/notifications tetap ringan).
+    - Koordinasikan thread onnxruntime dengan jumlah child prefork.
+    """
+    global _warm_face_engine, _pool_name
+    options = options or {}
+
+    pool = options.get("pool_cls") or options.get("pool") or getattr(conf, "worker_pool", None) or "prefork"
+    _pool_name = _pool_kind(pool)
+
+    queues = _as_list(options.get("queues"))
+    face_queue = flask_app.config.get("CELERY_FACE_QUEUE", "face")
+    _warm_face_engine = not queues or face_queue in queues
+
+    if _pool_name == "prefork" and not flask_app.config.get("FACE_ORT_INTRA_OP_THREADS"):
+        concurrency = int(options.get("concurrency") or os.cpu_count() or 1)
+        threads = max(1, (os.cpu_count() or 1) // max(1, concurrency))
+        flask_app.config["FACE_ORT_INTRA_OP_THREADS"] = threads
+        logger.info("[celery_worker] prefork concurrency=%s -> ORT intra_op_threads=%s", concurrency, threads)
+
+
+@signals.worker_process_init.connect
+def _init_child(**kwargs):
+    """Prefork: tiap child memuat face engine sendiri setelah fork."""
+    # Jangan pakai koneksi DB warisan proses utama (juga dijaga os.register_at_fork)
+    dispose_engine(close=False)
+    if not _warm_face_engine:
+        return
+    try:
+        with flask_app.app_context():
+            init_face_engine(flask_app)
+    except Exception as e:
+        logger.warning("[celery_worker] init_face_engine gagal di child pid=%s: %s", os.getpid(), e)
+
+
+@signals.worker_ready.connect
+def _init_non_prefork(**kwargs):
+    """
+    Pool solo/threads/gevent tidak memanggil worker_process_init; muat engine
+    sekali di proses worker. (Jika gagal, get_face_engine() tetap lazy-init.)
+    """
+    if not _warm_face_engine or _pool_name == "prefork":
+        return
+    try:
+        with flask_app.app_context():
+            init_face_engine(flask_app)
+            logger.info("[celery_worker] InsightFace engine initialized (pool=%s).", _pool_name)
+    except Exception as e:
+        logger.warning("[celery_worker] init_face_engine gagal saat startup: %s", e)
+
 
 # Entry point Celery
 app = celery
@@ -0,0 +1,31 @@
+# gunicorn.conf.py
+# Jalankan: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Setiap worker gunicorn punya pool SQLAlchemy sendiri (DB_POOL_SIZE +
+# DB_MAX_OVERFLOW koneksi maksimum). Sesuaikan jumlah worker/thread dengan
+# max_connections MySQL bersama worker Celery.
+#
+# Metrics multi-worker: set PROMETHEUS_MULTIPROC_DIR ke direktori kosong
+# (dibersihkan setiap start) agar /metrics menggabungkan semua worker.
+
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+# preload: model & app dimuat sekali di master lalu di-fork ke worker
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() in ("1", "true", "yes")
+
+
+def post_fork(server, worker):
+    # Koneksi DB milik master tidak boleh dipakai bersama oleh worker
+    from app.db import dispose_engine
+
+    dispose_engine(close=False)
+
+
+def child_exit(server, worker):
+    from app.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
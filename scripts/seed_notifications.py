@@ -8,7 +8,9 @@ from sqlalchemy.exc import NoSuchTableError
 
 from app import create_app
 from app.db import get_session
-from app.db.models import NotificationTemplate
+from app.db.models import Notification, NotificationArchive, NotificationTemplate, NotificationOutbox
+from app.services.notification_service import invalidate_template_cache
+from app.utils.timez import now_local
 
 
 # Daftar template notifikasi default
@@ -246,12 +248,45 @@ def ensure_notification_template_schema(session) -> None:
         session.commit()
 
 
+def ensure_notification_retention_index(session) -> None:
+    """Tambahkan idx_n_status_created_at ke tabel notifications bila belum ada."""
+    inspector = inspect(session.bind)
+    try:
+        indexes = {index["name"] for index in inspector.get_indexes("notifications")}
+    except NoSuchTableError:
+        return
+    for index in Notification.__table__.indexes:
+        if index.name == "idx_n_status_created_at" and index.name not in indexes:
+            print("Menambahkan indeks idx_n_status_created_at pada tabel notifications...")
+            index.create(session.bind)
+
+
+def ensure_outbox_schema(session) -> None:
+    """Buat tabel notification_outbox, atau tambahkan kolom claimed_by pada tabel lama."""
+    NotificationOutbox.__table__.create(session.bind, checkfirst=True)
+    columns = {column["name"] for column in inspect(session.bind).get_columns("notification_outbox")}
+    if "claimed_by" not in columns:
+        print("Kolom 'claimed_by' belum ada. Menambahkan ke tabel notification_outbox...")
+        session.execute(text("ALTER TABLE notification_outbox ADD COLUMN claimed_by CHAR(36) NULL"))
+        session.commit()
+
+
 def seed_notifications() -> None:
     """Seed the notification_templates table with default templates."""
 
     print("Memulai seeding template notifikasi...")
     with get_session() as session:
         ensure_notification_template_schema(session)
+        # Tabel outbox dipakai dispatcher push notification
+        ensure_outbox_schema(session)
+        # Tabel arsip + index untuk job retensi notifikasi
+        NotificationArchive.__table__.create(session.bind, checkfirst=True)
+        ensure_notification_retention_index(session)
+
+        # Semua template yang di-upsert mendapat updated_at baru agar versi tabel
+        # (max(updated_at)) berubah dan cache template di API/worker dimuat ulang,
+        # termasuk saat isi template sama persis dengan sebelumnya.
+        seeded_at = now_local().replace(tzinfo=None)
 
         for template_data in notification_templates:
             # Baris ini sekarang tidak menyebabkan KeyError karena
@@ -274,9 +309,11 @@ def seed_notifications() -> None:
                 exists.body_template = template_data["body_template"]
                 exists.placeholders = template_data.get("placeholders")
                 exists.is_active = template_data.get("is_active", exists.is_active)
+                exists.updated_at = seeded_at
                 print(f"Template sudah ada, diperbarui: {template_data['event_trigger']}")
 
         session.commit()
+    invalidate_template_cache()
     print("Seeding template notifikasi selesai.")
 
 